@@ -1,16 +1,34 @@
+import atexit
+import logging
 import os
 from dotenv import load_dotenv
 from flask import Flask, redirect, url_for
+from app.logging_config import configure_logging
 from app.models.database import db
-from app.routes.webhook import webhook_bp
+from app.routes.webhook import conversation_handler, webhook_bp
 from app.routes.auth import auth_bp
 from app.routes.admin import admin_bp
+from app.routes.metrics import metrics_bp
+from app.services.background_jobs import BackgroundJobQueue
+from app.services.calendar_mirror import CalendarSyncWorker, calendar_mirror, mirror_enabled
+from app.services.google_calendar import GoogleCalendarService
+from app.services.inbound_messages import InboundMessageQueue, async_webhook_enabled
+from app.services.outbound_sender import OutboundSender
 
 # Load environment variables
 load_dotenv()
 
-def create_app():
-    """Create and configure the Flask application"""
+logger = logging.getLogger(__name__)
+
+def create_app(config=None):
+    """Create and configure the Flask application.
+
+    config overrides the settings read from the environment. Under TESTING no
+    worker threads are started: tests drain the queues with run_pending().
+    """
+    config = config or {}
+    # Before Flask touches app.logger, which is the same 'app' logger the modules log under
+    configure_logging(background=not config.get('TESTING'))
     app = Flask(__name__)
     
     # Configure the SQLAlchemy database
@@ -22,6 +40,7 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.secret_key = os.urandom(24)
+    app.config.update(config)
     
     # Initialize extensions
     db.init_app(app)
@@ -30,6 +49,7 @@ def create_app():
     app.register_blueprint(webhook_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
     
     # Add a root route to redirect to admin dashboard
     @app.route('/')
@@ -41,6 +61,58 @@ def create_app():
     with app.app_context():
         # Create tables if they don't exist
         db.create_all()
-        print("Database tables created successfully")
+        logger.info('Database tables created successfully')
+    
+    # Keep the local calendar mirror fresh in the background
+    if mirror_enabled():
+        worker = CalendarSyncWorker(
+            app,
+            calendar_mirror,
+            GoogleCalendarService(),
+            interval_seconds=int(os.getenv('CALENDAR_SYNC_INTERVAL', 300))
+        )
+        app.extensions['calendar_sync_worker'] = worker
+    
+    # Calendar events for confirmed interviews are created off the webhook reply path
+    job_queue = BackgroundJobQueue(
+        app,
+        workers=int(os.getenv('BACKGROUND_JOB_WORKERS', 2)),
+        max_attempts=int(os.getenv('BACKGROUND_JOB_MAX_ATTEMPTS', 5))
+    )
+    app.extensions['background_jobs'] = job_queue
+    
+    # WhatsApp replies are paced per sender number and retried by their own workers
+    outbound_sender = OutboundSender.for_app(app)
+    app.extensions['outbound_sender'] = outbound_sender
     
+    # Optionally acknowledge webhooks at once and handle the messages on their own workers
+    if async_webhook_enabled():
+        inbound_queue = BackgroundJobQueue(app, workers=int(os.getenv('WEBHOOK_WORKERS', 4)), max_attempts=1)
+        app.extensions['inbound_messages'] = InboundMessageQueue(inbound_queue, conversation_handler.handle_message)
+    
+    if not app.testing:
+        start_workers(app)
+        atexit.register(stop_workers, app)
+    
+    # Calendar events left pending when a process stopped are created by retry_calendar_events.py, run from a
+    # single place: every process that creates the app (each web worker, the reloader, the scripts) would race for them
     return app
+
+def _workers(app):
+    """Return the app's background workers, the ones feeding others first"""
+    inbound_messages = app.extensions.get('inbound_messages')
+    workers = [inbound_messages.job_queue if inbound_messages else None,
+               app.extensions.get('calendar_sync_worker'),
+               app.extensions.get('background_jobs'),
+               app.extensions.get('outbound_sender')]
+    return [worker for worker in workers if worker is not None]
+
+def start_workers(app):
+    """Start the worker threads of the app's background queues"""
+    for worker in _workers(app):
+        worker.start()
+
+def stop_workers(app):
+    """Stop the app's worker threads once they finish their current job"""
+    for worker in _workers(app):
+        worker.stop()
@@ -0,0 +1,84 @@
+import atexit
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Drains the log queue on its own thread; None until configure_logging() ran
+_listener = None
+
+class SamplingFilter(logging.Filter):
+    """Let through one of every `every` DEBUG records per call site; other levels always pass"""
+
+    def __init__(self, every=1):
+        """Initialize the filter"""
+        super().__init__()
+        self.every = every
+        self._counters = {}
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno > logging.DEBUG:
+            return True
+        site = (record.pathname, record.lineno)
+        counter = self._counters.get(site)
+        if counter is None:
+            counter = self._counters.setdefault(site, itertools.count())
+        return next(counter) % self.every == 0
+
+def parse_levels(spec):
+    """Parse 'module=LEVEL,module=LEVEL' into {module: level}"""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def queue_handler_for(stream, sample_every=1):
+    """Return a sampling QueueHandler and the (not yet started) QueueListener that writes its records to stream"""
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_every))
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    return queue_handler, logging.handlers.QueueListener(log_queue, output)
+
+def configure_logging(background=True):
+    """Send the app's log records through a queue to a background thread that writes them to stdout.
+
+    Request threads only put records on an in-memory queue, so they never
+    block on terminal or pipe I/O. LOG_LEVEL sets the level of every app
+    module, LOG_LEVELS overrides it per module (for example
+    'app.services.google_calendar=DEBUG'), and LOG_DEBUG_SAMPLE_EVERY keeps
+    only one of every N DEBUG lines of each call site. Safe to call again;
+    later calls only apply the levels. Without background, such as under
+    tests, only the levels are applied and records go to the root logger.
+    """
+    global _listener
+    app_logger = logging.getLogger('app')
+    app_logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(os.getenv('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _listener is not None or not background:
+        return
+
+    queue_handler, _listener = queue_handler_for(sys.stdout, int(os.getenv('LOG_DEBUG_SAMPLE_EVERY', 1)))
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    app_logger.addHandler(queue_handler)
+    # The queue handler is the only output; records must not reach the root logger's handlers as well
+    app_logger.propagate = False
+
+def mask_phone(phone_number):
+    """Hide all but the last four digits of a phone number, for log lines"""
+    phone_number = phone_number or ''
+    if len(phone_number) <= 4:
+        return '*' * len(phone_number)
+    return '*' * (len(phone_number) - 4) + phone_number[-4:]
@@ -1,4 +1,91 @@
+import logging
+import threading
 from flask_sqlalchemy import SQLAlchemy
 
+logger = logging.getLogger(__name__)
+
 # Initialize SQLAlchemy
-db = SQLAlchemy() 
\ No newline at end of file
+db = SQLAlchemy()
+
+# The unit of work open on each thread, if any
+_units = threading.local()
+
+class UnitOfWork:
+    """One database transaction spanning a whole request, such as an inbound message.
+
+    Inside a unit of work, commit() only flushes (so generated IDs are
+    available) and the single real commit happens when the block exits; any
+    exception rolls everything back instead. Callbacks registered with
+    after_commit() run once the commit succeeded, and after_rollback()
+    callbacks when it did not. Nested units join the outermost one.
+    """
+
+    def __init__(self):
+        """Initialize the unit of work"""
+        self.after_commit_callbacks = []
+        self.after_rollback_callbacks = []
+        self._outer = None
+
+    def __enter__(self):
+        current = getattr(_units, 'current', None)
+        if current is not None:
+            self._outer = current
+            return current
+        _units.current = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._outer is not None:
+            self._outer = None
+            return False
+
+        _units.current = None
+        if exc_type is not None:
+            db.session.rollback()
+            self._run(self.after_rollback_callbacks)
+            return False
+
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self._run(self.after_rollback_callbacks)
+            raise
+        self._run(self.after_commit_callbacks)
+        return False
+
+    def _run(self, callbacks):
+        for func, args in callbacks:
+            try:
+                func(*args)
+            except Exception as e:
+                logger.exception('Error in unit of work callback %s: %s', getattr(func, '__name__', func), e)
+
+def unit_of_work():
+    """Return a unit of work to use as a context manager"""
+    return UnitOfWork()
+
+def in_unit_of_work():
+    """Return whether the current thread is inside a unit of work"""
+    return getattr(_units, 'current', None) is not None
+
+def commit():
+    """Commit the session, or just flush it when a unit of work will commit later"""
+    if in_unit_of_work():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+def after_commit(func, *args):
+    """Call func(*args) once the current unit of work commits, or right away outside of one"""
+    unit = getattr(_units, 'current', None)
+    if unit is None:
+        func(*args)
+    else:
+        unit.after_commit_callbacks.append((func, args))
+
+def after_rollback(func, *args):
+    """Call func(*args) if the current unit of work rolls back; does nothing outside of one"""
+    unit = getattr(_units, 'current', None)
+    if unit is not None:
+        unit.after_rollback_callbacks.append((func, args))
@@ -58,6 +58,10 @@ class Interview(db.Model):
     status = db.Column(db.String(50), default='scheduled')  # scheduled, completed, cancelled
     calendar_event_id = db.Column(db.String(200))
     calendar_url = db.Column(db.String(500))  # Store the calendar URL
+    meet_link = db.Column(db.String(500))  # Google Meet link returned when the event was created
+    calendar_status = db.Column(db.String(20))  # pending, creating, synced, failed
+    calendar_attempts = db.Column(db.Integer, default=0)
+    calendar_error = db.Column(db.String(500))  # Last error from creating the calendar event
     
     # Foreign keys
     candidate_id = db.Column(db.Integer, db.ForeignKey('candidate.id'), nullable=False)
@@ -76,15 +80,49 @@ class Interview(db.Model):
 class ConversationState(db.Model):
     """Model to track conversation state with candidates"""
     id = db.Column(db.Integer, primary_key=True)
-    phone_number = db.Column(db.String(20), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=False, unique=True, index=True)  # E.164, one row per number
     current_state = db.Column(db.String(50), default='initial')
     context = db.Column(db.JSON, default={})
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped by every write
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
-        return f'<ConversationState {self.phone_number}: {self.current_state}>' 
-    
+        return f'<ConversationState {self.phone_number}: {self.current_state}>'
 
+class CalendarBusyBlock(db.Model):
+    """Model for busy intervals mirrored from a recruiter's Google Calendar"""
+    id = db.Column(db.Integer, primary_key=True)
+    calendar_id = db.Column(db.String(200), nullable=False, index=True)
+    event_id = db.Column(db.String(1024), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)  # UTC
+    end_time = db.Column(db.DateTime, nullable=False)  # UTC
+    
+    __table_args__ = (db.UniqueConstraint('calendar_id', 'event_id', name='uq_busy_block_event'),)
+    
+    def __repr__(self):
+        return f'<CalendarBusyBlock {self.calendar_id}: {self.start_time} - {self.end_time}>'
 
+class CalendarSyncState(db.Model):
+    """Model to track incremental sync progress of a mirrored calendar"""
+    id = db.Column(db.Integer, primary_key=True)
+    calendar_id = db.Column(db.String(200), nullable=False, unique=True)
+    sync_token = db.Column(db.String(500))
+    last_synced_at = db.Column(db.DateTime)
+    channel_id = db.Column(db.String(200), index=True)  # Push notification channel, if watched
+    resource_id = db.Column(db.String(200))
+    channel_expires_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<CalendarSyncState {self.calendar_id}>'
 
+class ProcessedMessage(db.Model):
+    """Model for inbound messages already answered, so that redelivered webhooks get the same reply"""
+    id = db.Column(db.Integer, primary_key=True)
+    message_sid = db.Column(db.String(64), nullable=False, unique=True, index=True)  # Twilio MessageSid
+    phone_number = db.Column(db.String(20))
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ProcessedMessage {self.message_sid}>'
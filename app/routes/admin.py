@@ -1,9 +1,13 @@
+import logging
+from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app.models.database import db
 from app.models.models import Candidate, Recruiter, Interview
-from app.services.scheduling_service import SchedulingService
+from app.services.scheduling_service import SchedulingService, calendar_event_id
 from app.services.google_calendar import GoogleCalendarService
 
+logger = logging.getLogger(__name__)
+
 # Create blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -58,7 +62,7 @@ def add_recruiter():
 @admin_bp.route('/recruiters/edit/<int:recruiter_id>', methods=['GET', 'POST'])
 def edit_recruiter(recruiter_id):
     """Edit a recruiter"""
-    recruiter = Recruiter.query.get_or_404(recruiter_id)
+    recruiter = db.get_or_404(Recruiter, recruiter_id)
     
     if request.method == 'POST':
         name = request.form.get('name')
@@ -84,7 +88,7 @@ def edit_recruiter(recruiter_id):
 @admin_bp.route('/recruiters/delete/<int:recruiter_id>', methods=['POST'])
 def delete_recruiter(recruiter_id):
     """Delete a recruiter"""
-    recruiter = Recruiter.query.get_or_404(recruiter_id)
+    recruiter = db.get_or_404(Recruiter, recruiter_id)
     
     # Delete recruiter
     db.session.delete(recruiter)
@@ -103,12 +107,142 @@ def candidates():
 def interviews():
     """List all interviews"""
     interviews = Interview.query.order_by(Interview.start_time.desc()).all()
-    return render_template('admin/interviews.html', interviews=interviews)
+    recruiters = Recruiter.query.order_by(Recruiter.name).all()
+    return render_template('admin/interviews.html', interviews=interviews, recruiters=recruiters)
+
+@admin_bp.route('/interviews/bulk/cancel', methods=['POST'])
+def bulk_cancel_interviews():
+    """Cancel all of a recruiter's scheduled interviews in a date range"""
+    recruiter_id = request.form.get('recruiter_id', type=int)
+    try:
+        start_date = datetime.strptime(request.form.get('start_date', ''), '%Y-%m-%d')
+        end_date = datetime.strptime(request.form.get('end_date', ''), '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        flash('Please provide a valid start and end date', 'error')
+        return redirect(url_for('admin.interviews'))
+    
+    recruiter = db.session.get(Recruiter, recruiter_id) if recruiter_id else None
+    if not recruiter:
+        flash('Please select a recruiter', 'error')
+        return redirect(url_for('admin.interviews'))
+    
+    interviews = Interview.query.filter(
+        Interview.recruiter_id == recruiter.id,
+        Interview.status == 'scheduled',
+        Interview.start_time >= start_date,
+        Interview.start_time < end_date
+    ).all()
+    
+    # Delete the calendar events in batches, then cancel every interview whose event is gone
+    calendar_id = recruiter.calendar_id or 'primary'
+    with_event = [interview for interview in interviews if interview.calendar_event_id]
+    events = {interview.id: (calendar_id, interview.calendar_event_id) for interview in with_event}
+    results = {}
+    if events:
+        try:
+            results = GoogleCalendarService().delete_events_batch(events)
+        except Exception as e:
+            flash(f'Error cancelling calendar events: {str(e)}', 'error')
+            return redirect(url_for('admin.interviews'))
+    
+    cancelled = 0
+    failed = 0
+    for interview in with_event:
+        deleted, exception = results[interview.id]
+        if deleted:
+            interview.status = 'cancelled'
+            cancelled += 1
+        else:
+            logger.error('Error cancelling calendar event for interview %s: %s', interview.id, exception)
+            failed += 1
+    
+    db.session.commit()
+    
+    # Interviews whose event is being created right now are left alone, or the job would leave an orphan event
+    without_event = [interview.id for interview in interviews if not interview.calendar_event_id]
+    cancelled_without_event = scheduling_service.cancel_interviews_without_event(without_event)
+    cancelled += len(cancelled_without_event)
+    in_flight = len(without_event) - len(cancelled_without_event)
+    
+    flash(f'{cancelled} interview(s) cancelled', 'success')
+    if failed:
+        flash(f'{failed} calendar event(s) could not be cancelled', 'error')
+    if in_flight:
+        flash(f'{in_flight} interview(s) are having their calendar event created; please try again in a moment',
+              'warning')
+    return redirect(url_for('admin.interviews'))
+
+@admin_bp.route('/interviews/bulk/create_calendar_events', methods=['POST'])
+def bulk_create_calendar_events():
+    """Create calendar events for all scheduled interviews whose event failed or predates the calendar job"""
+    interviews = Interview.query.filter(
+        Interview.status == 'scheduled',
+        Interview.calendar_event_id.is_(None),
+        # Pending events are still being created by the background queue
+        db.or_(Interview.calendar_status.is_(None), Interview.calendar_status == 'failed')
+    ).all()
+    
+    # Claim each interview first, so that the job queue and the retry script leave it alone
+    claimed = []
+    for interview in interviews:
+        if scheduling_service.claim_calendar_event(interview.id, statuses=('failed', None)):
+            db.session.refresh(interview)
+            claimed.append(interview)
+    
+    events = {}
+    for interview in claimed:
+        events[interview.id] = {
+            'calendar_id': interview.recruiter.calendar_id or 'primary',
+            'summary': f"Interview: {interview.candidate.name} for {interview.candidate.position_applied}",
+            'description': f"Interview with {interview.candidate.name} for the {interview.candidate.position_applied} position.",
+            'start_time': interview.start_time,
+            'end_time': interview.end_time,
+            'attendees': [
+                {'email': interview.candidate.email, 'responseStatus': 'needsAction'},
+                {'email': interview.recruiter.email, 'responseStatus': 'accepted'}
+            ],
+            # A job that timed out after Google accepted its insert already created this event
+            'event_id': calendar_event_id(interview)
+        }
+    
+    results = {}
+    if events:
+        try:
+            results = GoogleCalendarService().create_events_batch(events)
+        except Exception as e:
+            for interview in claimed:
+                scheduling_service.mark_calendar_event_failed(e, interview.id)
+            flash(f'Error creating calendar events: {str(e)}', 'error')
+            return redirect(url_for('admin.interviews'))
+    
+    created = 0
+    failed = 0
+    for interview in claimed:
+        event, exception = results[interview.id]
+        if event is not None:
+            interview.calendar_event_id = event.get('id')
+            interview.calendar_url = event.get('htmlLink')
+            interview.meet_link = event.get('hangoutLink')
+            interview.calendar_status = 'synced'
+            interview.calendar_error = None
+            created += 1
+        else:
+            logger.error('Error creating calendar event for interview %s: %s', interview.id, exception)
+            interview.calendar_status = 'failed'
+            interview.calendar_error = str(exception)[:500]
+            failed += 1
+    
+    db.session.commit()
+    
+    flash(f'{created} calendar event(s) created', 'success')
+    if failed:
+        flash(f'{failed} calendar event(s) could not be created', 'error')
+    return redirect(url_for('admin.interviews'))
 
 @admin_bp.route('/interviews/<int:interview_id>', methods=['GET', 'POST'])
 def interview_details(interview_id):
     """View interview details"""
-    interview = Interview.query.get(interview_id)
+    interview = db.session.get(Interview, interview_id)
     
     # If interview doesn't exist, redirect to interviews page with a message
     if not interview:
@@ -130,58 +264,42 @@ def interview_details(interview_id):
             flash('Interview marked as completed', 'success')
             
         elif action == 'cancel':
+            if not interview.calendar_event_id:
+                # Cancelled unless a job is creating the event right now
+                if scheduling_service.cancel_interviews_without_event([interview.id]):
+                    flash('Interview cancelled', 'success')
+                elif interview.calendar_status == 'creating':
+                    flash('The calendar event of this interview is being created; please try again in a moment',
+                          'warning')
+                return redirect(url_for('admin.interview_details', interview_id=interview.id))
+            
             interview.status = 'cancelled'
             
             # Cancel the calendar event
-            if interview.calendar_event_id:
-                calendar_service = GoogleCalendarService()
-                try:
-                    # Use 'primary' as default calendar ID if not set
-                    calendar_id = interview.recruiter.calendar_id or 'primary'
-                    calendar_service.delete_event(
-                        calendar_id,
-                        interview.calendar_event_id
-                    )
-                    flash('Interview and calendar event cancelled successfully', 'success')
-                except Exception as e:
-                    flash(f'Error cancelling calendar event: {str(e)}', 'error')
+            calendar_service = GoogleCalendarService()
+            try:
+                # Use 'primary' as default calendar ID if not set
+                calendar_id = interview.recruiter.calendar_id or 'primary'
+                calendar_service.delete_event(
+                    calendar_id,
+                    interview.calendar_event_id
+                )
+                flash('Interview and calendar event cancelled successfully', 'success')
+            except Exception as e:
+                flash(f'Error cancelling calendar event: {str(e)}', 'error')
             
             db.session.commit()
             flash('Interview cancelled', 'success')
         
         elif action == 'create_calendar_event':
-            # Create calendar event
-            calendar_service = GoogleCalendarService()
+            # Same claim and event ID as the background job, so a retry never creates a second event
             try:
-                # Create event summary and description
-                event_summary = f"Interview: {interview.candidate.name} for {interview.candidate.position_applied}"
-                event_description = f"Interview with {interview.candidate.name} for the {interview.candidate.position_applied} position."
-                
-                # Create attendees list
-                attendees = [
-                    {'email': interview.candidate.email, 'responseStatus': 'needsAction'},
-                    {'email': interview.recruiter.email, 'responseStatus': 'accepted'}
-                ]
-                
-                # Create the calendar event
-                event = calendar_service.create_event(
-                    interview.recruiter.calendar_id or 'primary',
-                    event_summary,
-                    event_description,
-                    interview.start_time,
-                    interview.end_time,
-                    attendees
-                )
-                
-                # Update the interview with the calendar event ID and URL
-                interview.calendar_event_id = event.get('id')
-                interview.calendar_url = f"https://calendar.google.com/calendar/event?eid={event.get('id')}"
-                db.session.commit()
-                
-                flash('Calendar event created successfully', 'success')
+                if scheduling_service.retry_calendar_event(interview.id) is None:
+                    flash('This interview already has a calendar event, or it is being created', 'warning')
+                else:
+                    flash('Calendar event created successfully', 'success')
             except Exception as e:
-                import traceback
-                traceback.print_exc()
+                logger.exception('Error creating calendar event for interview %s: %s', interview.id, e)
                 flash(f'Error creating calendar event: {str(e)}', 'error')
         
         return redirect(url_for('admin.interview_details', interview_id=interview.id))
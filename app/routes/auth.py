@@ -5,6 +5,7 @@ from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 import pickle
+from app.services.calendar_client import calendar_client
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__)
@@ -65,6 +66,9 @@ def oauth2callback():
     with open(TOKEN_FILE, 'wb') as token:
         pickle.dump(credentials, token)
     
+    # Make the shared calendar client pick up the new token
+    calendar_client.reset()
+    
     return redirect(url_for('admin.dashboard'))
 
 @auth_bp.route('/revoke')
@@ -93,5 +97,6 @@ def revoke():
         
         # Delete token file
         os.remove(TOKEN_FILE)
+        calendar_client.reset()
     
     return redirect(url_for('admin.dashboard')) 
\ No newline at end of file
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response
+from app.services.metrics import metrics
+
+# Create blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Expose this process's stage latencies and API call counters in the Prometheus text format"""
+    if not metrics.enabled:
+        return Response("Metrics are disabled", status=404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,15 @@
-from flask import Blueprint, request, Response, jsonify
+import logging
+import os
+from flask import Blueprint, request, Response, jsonify, current_app
 from twilio.twiml.messaging_response import MessagingResponse
 from app.services.conversation_handler import ConversationHandler
+from app.services.calendar_mirror import calendar_mirror
+from app.services.google_calendar import GoogleCalendarService
+from app.services.metrics import metrics
+from app.services.twilio_service import is_signed_by_twilio
+from app.logging_config import mask_phone
+
+logger = logging.getLogger(__name__)
 
 # Create blueprint
 webhook_bp = Blueprint('webhook', __name__)
@@ -8,32 +17,54 @@ webhook_bp = Blueprint('webhook', __name__)
 # Initialize conversation handler
 conversation_handler = ConversationHandler()
 
+def webhook_url():
+    """The URL Twilio signed: TWILIO_WEBHOOK_URL when set, as behind a proxy request.url is not the public one"""
+    return os.getenv('TWILIO_WEBHOOK_URL') or request.url
+
 @webhook_bp.route('/webhook', methods=['POST'])
 def webhook():
     """Handle incoming messages (both Twilio and JSON formats)"""
     try:
-        # Check if the request is JSON
-        if request.is_json:
-            data = request.get_json()
-            from_number = data.get('from', '')
-            body = data.get('message', '')
-        else:
-            # Handle Twilio format (form-encoded)
-            from_number = request.values.get('From', '')
-            body = request.values.get('Body', '')
-            # Extended logging for Twilio format
-            print(f"Received Twilio message with params: {dict(request.values)}")
+        with metrics.stage('webhook_parse'):
+            # Check if the request is JSON
+            if request.is_json:
+                data = request.get_json()
+                from_number = data.get('from', '')
+                body = data.get('message', '')
+                message_sid = data.get('message_sid')
+            else:
+                # Handle Twilio format (form-encoded)
+                from_number = request.values.get('From', '')
+                body = request.values.get('Body', '')
+                # Twilio redelivers a message with the same MessageSid when we answer too slowly
+                message_sid = request.values.get('MessageSid')
+                # Extended logging for Twilio format
+                logger.debug('Received Twilio message with params: %s', dict(request.values))
         
-        print(f"Received message from {from_number}: '{body}'")
+            logger.debug("Received message from %s: '%s'", from_number, body)
+        
+        # In async mode the message is only queued; the reply goes out through the Twilio API
+        inbound_messages = current_app.extensions.get('inbound_messages')
+        if inbound_messages is not None:
+            # Replies are sent to the posted number at our expense, so only signed Twilio requests are queued
+            if request.is_json:
+                return jsonify({'error': 'JSON messages are not accepted while WEBHOOK_ASYNC is on'}), 400
+            if not is_signed_by_twilio(webhook_url(), request.form.to_dict(), request.headers.get('X-Twilio-Signature')):
+                logger.warning('Rejected webhook without a valid Twilio signature from %s', mask_phone(from_number))
+                return Response("Invalid signature", status=403)
+            if not from_number:
+                return Response("Missing sender", status=400)
+            inbound_messages.submit(from_number, body, message_sid)
+            return Response(str(MessagingResponse()), mimetype='text/xml')
         
         # Special handling for greeting messages to ensure they always work
         if body and body.lower().strip() in ['hi', 'hello', 'hey', 'start']:
-            print("Greeting detected, ensuring conversation reset")
+            logger.debug('Greeting detected, ensuring conversation reset')
             # Handle the greeting message directly
-            response_text = conversation_handler.handle_message(from_number, body)
+            response_text = conversation_handler.handle_message(from_number, body, message_sid)
         else:
             # Handle regular messages
-            response_text = conversation_handler.handle_message(from_number, body)
+            response_text = conversation_handler.handle_message(from_number, body, message_sid)
         
         # If it's a JSON request, return JSON response
         if request.is_json:
@@ -46,14 +77,12 @@ def webhook():
         resp = MessagingResponse()
         resp.message(response_text)
         
-        print(f"Sending response: '{response_text}'")
+        logger.debug("Sending response: '%s'", response_text)
         
         return Response(str(resp), mimetype='text/xml')
     except Exception as e:
         # Log the error
-        import traceback
-        print(f"Error in webhook: {str(e)}")
-        traceback.print_exc()
+        logger.exception('Error in webhook: %s', e)
         
         # Always send a response even if there's an error
         error_message = "I'm sorry, there was an error processing your message. Please try again by sending 'hi' or 'hello'."
@@ -66,4 +95,30 @@ def webhook():
         
         resp = MessagingResponse()
         resp.message(error_message)
-        return Response(str(resp), mimetype='text/xml') 
\ No newline at end of file
+        return Response(str(resp), mimetype='text/xml')
+
+@webhook_bp.route('/webhook/calendar', methods=['POST'])
+def calendar_notification():
+    """Handle Google Calendar push notifications by syncing the local calendar mirror"""
+    channel_id = request.headers.get('X-Goog-Channel-ID', '')
+    resource_state = request.headers.get('X-Goog-Resource-State', '')
+    
+    calendar_id = calendar_mirror.calendar_for_channel(channel_id)
+    if not calendar_id:
+        logger.info('Ignoring notification for unknown channel: %s', channel_id)
+        return Response(status=200)
+    
+    # The initial 'sync' message only confirms the channel was created
+    if resource_state == 'sync':
+        return Response(status=200)
+    
+    worker = current_app.extensions.get('calendar_sync_worker')
+    if worker:
+        worker.request_sync(calendar_id)
+    else:
+        try:
+            GoogleCalendarService().sync_calendar(calendar_id)
+        except Exception as e:
+            logger.error('Error syncing calendar %s after notification: %s', calendar_id, e)
+    
+    return Response(status=200)
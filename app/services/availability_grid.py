@@ -0,0 +1,165 @@
+from datetime import timedelta
+import numpy as np
+
+MINUTE = timedelta(minutes=1)
+MINUTES_PER_DAY = 24 * 60
+
+# Rows of the busy grid built at once by free_slots_many, to bound memory on long horizons
+ROW_CHUNK = 64
+
+def find_runs(mask):
+    """Return (rows, starts, ends) of every run of True values along the last axis of a mask"""
+    mask = np.atleast_2d(mask)
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    # Every run starts with a +1 edge and ends with a -1 edge in the same row, so in
+    # row-major order the edges alternate start, end, start, end...
+    rows, cells = np.nonzero(np.diff(padded, axis=1))
+    return rows[0::2], cells[0::2], cells[1::2]
+
+def pack_slots(starts, ends, duration):
+    """Pack back-to-back slots of `duration` cells from the start of every run.
+
+    Returns the index of each run a slot belongs to and the slot start cells.
+    """
+    counts = (ends - starts) // duration
+    counts[counts < 0] = 0
+    total = int(counts.sum())
+    run_index = np.repeat(np.arange(len(starts)), counts)
+    first_slot = np.cumsum(counts) - counts
+    offsets = np.arange(total) - np.repeat(first_slot, counts)
+    return run_index, starts[run_index] + offsets * duration
+
+def cover(rows, firsts, lasts, height, width):
+    """Mask of shape (height, width) that is True on [first, last) of each row's intervals"""
+    keep = firsts < lasts
+    counts = np.zeros((height, width + 1), dtype=np.int32)
+    # Difference array: +1 where an interval starts, -1 where it ends, then a running sum
+    np.add.at(counts, (rows[keep], firsts[keep]), 1)
+    np.add.at(counts, (rows[keep], lasts[keep]), -1)
+    return np.cumsum(counts, axis=1, dtype=np.int32)[:, :width] > 0
+
+class AvailabilityGrid:
+    """Minute-resolution view of a time horizon where schedules are NumPy boolean masks.
+
+    Cell i covers the minute starting at origin + i minutes. Working hours,
+    busy blocks and candidate windows become masks, combined with & and ~,
+    and slot search is a run-length scan over the result.
+    """
+
+    def __init__(self, start_time, end_time):
+        """Initialize a grid over [start_time, end_time), rounded inwards to whole minutes"""
+        origin = start_time.replace(second=0, microsecond=0)
+        if origin < start_time:
+            origin += MINUTE
+        self.origin = origin
+        self.size = max(0, (end_time - origin) // MINUTE)
+
+    def time_at(self, cell):
+        """Return the datetime at the start of a cell"""
+        return self.origin + timedelta(minutes=int(cell))
+
+    def times_at(self, cells):
+        """Return the datetimes at the start of an array of cells"""
+        if self.origin.tzinfo is None:
+            # NumPy converts naive datetimes in bulk
+            return (np.datetime64(self.origin, 'us') + cells.astype('timedelta64[m]')).tolist()
+        return [self.time_at(cell) for cell in cells.tolist()]
+
+    def working_hours_mask(self, working_hours=(9, 17), weekdays_only=True):
+        """Mask of the minutes inside working hours (Monday to Friday unless weekdays_only is False)"""
+        # Build one week of minutes starting on Monday and repeat it over the horizon
+        minute_of_day = np.arange(MINUTES_PER_DAY)
+        day = (minute_of_day >= working_hours[0] * 60) & (minute_of_day < working_hours[1] * 60)
+        week = np.tile(day, 7)
+        if weekdays_only:
+            week[5 * MINUTES_PER_DAY:] = False
+        offset = self.origin.weekday() * MINUTES_PER_DAY + self.origin.hour * 60 + self.origin.minute
+        return np.resize(np.roll(week, -offset), self.size)
+
+    def intervals_mask(self, intervals, expand=True):
+        """Mask of the minutes covered by (start, end) intervals.
+
+        Busy blocks expand to every minute they touch; pass expand=False for
+        free windows so they only cover minutes they contain completely.
+        """
+        rows, firsts, lasts = self._interval_cells([intervals], expand)
+        return cover(rows, firsts, lasts, 1, self.size)[0]
+
+    def slots(self, mask, duration_minutes):
+        """Pack back-to-back slots of duration_minutes into every run of free minutes"""
+        _, starts, ends = find_runs(mask)
+        _, slot_starts = pack_slots(starts, ends, duration_minutes)
+        return list(zip(self.times_at(slot_starts), self.times_at(slot_starts + duration_minutes)))
+
+    def free_slots(self, busy_periods, duration_minutes=60, working_hours=(9, 17)):
+        """Find free slots of one schedule within working hours"""
+        return self.free_slots_many({None: busy_periods}, duration_minutes, working_hours)[None]
+
+    def free_slots_many(self, busy_by_key, duration_minutes=60, working_hours=(9, 17), windows=None):
+        """Find free slots for many schedules at once, keyed like busy_by_key.
+
+        When windows (a list of (start, end) free windows, e.g. the candidate's
+        availability) is given, slots must also fall inside one of them.
+        """
+        allowed = self.working_hours_mask(working_hours)
+        if windows is not None:
+            allowed &= self.intervals_mask(windows, expand=False)
+
+        # Only allowed minutes can hold a slot, so the search runs on a grid of just those
+        # minutes, with a closed separator column wherever two of them are not adjacent
+        # (nights, weekends) so that runs never join across the gap
+        cells = np.flatnonzero(allowed)
+        separators = np.concatenate(([0], np.cumsum(np.diff(cells) > 1)))
+        positions = np.arange(len(cells)) + separators
+        width = int(positions[-1]) + 1 if len(cells) else 0
+        position_of = np.append(positions, width)
+        cell_at = np.zeros(width, dtype=np.int64)
+        cell_at[positions] = cells
+        is_open = np.zeros(width, dtype=bool)
+        is_open[positions] = True
+
+        keys = list(busy_by_key)
+        slots = {}
+        for chunk_start in range(0, len(keys), ROW_CHUNK):
+            chunk = keys[chunk_start:chunk_start + ROW_CHUNK]
+            rows, firsts, lasts = self._interval_cells([busy_by_key[key] for key in chunk])
+            firsts = position_of[np.searchsorted(cells, firsts)]
+            lasts = position_of[np.searchsorted(cells, lasts)]
+            free = ~cover(rows, firsts, lasts, len(chunk), width) & is_open
+
+            run_rows, starts, ends = find_runs(free)
+            run_index, slot_positions = pack_slots(starts, ends, duration_minutes)
+            slot_starts = cell_at[slot_positions]
+
+            # Slots come out grouped by row, so split them at the row boundaries
+            pairs = list(zip(self.times_at(slot_starts), self.times_at(slot_starts + duration_minutes)))
+            bounds = np.searchsorted(run_rows[run_index], np.arange(len(chunk) + 1)).tolist()
+            for row, key in enumerate(chunk):
+                slots[key] = pairs[bounds[row]:bounds[row + 1]]
+        return slots
+
+    def _interval_cells(self, intervals_per_row, expand=True):
+        """Convert intervals to (rows, first cells, end cells) arrays, clipped to the grid"""
+        rows, offsets = [], []
+        for row, intervals in enumerate(intervals_per_row):
+            if not intervals:
+                continue
+            # Offsets from the origin in (fractional) minutes
+            offsets.append(np.array([((start - self.origin) / MINUTE, (end - self.origin) / MINUTE)
+                                     for start, end in intervals]))
+            rows.append(np.full(len(intervals), row))
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        rows = np.concatenate(rows)
+        offsets = np.concatenate(offsets)
+        # Busy blocks round outwards to whole minutes, free windows inwards
+        if expand:
+            firsts, lasts = np.floor(offsets[:, 0]), np.ceil(offsets[:, 1])
+        else:
+            firsts, lasts = np.ceil(offsets[:, 0]), np.floor(offsets[:, 1])
+        firsts = np.clip(firsts, 0, self.size).astype(np.int64)
+        lasts = np.clip(lasts, 0, self.size).astype(np.int64)
+        return rows, firsts, lasts
@@ -0,0 +1,223 @@
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+WEEKDAYS = {
+    'monday': 0, 'mon': 0,
+    'tuesday': 1, 'tues': 1, 'tue': 1,
+    'wednesday': 2, 'weds': 2, 'wed': 2,
+    'thursday': 3, 'thurs': 3, 'thur': 3, 'thu': 3,
+    'friday': 4, 'fri': 4,
+    'saturday': 5, 'sat': 5,
+    'sunday': 6, 'sun': 6,
+}
+
+MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4,
+    'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
+    'september': 9, 'sept': 9, 'sep': 9, 'october': 10, 'oct': 10, 'november': 11, 'nov': 11,
+    'december': 12, 'dec': 12,
+}
+
+RELATIVE_DAYS = {'today': 0, 'tomorrow': 1, 'tmrw': 1, 'tmr': 1}
+
+# Times of day named instead of given as a range
+PERIODS = {
+    'morning': (time(9), time(12)),
+    'afternoon': (time(13), time(17)),
+    'evening': (time(17), time(19)),
+}
+
+# Range used for a day that is mentioned without any time
+DEFAULT_RANGE = (time(14), time(16))
+
+def _alternatives(words):
+    # Longest first, so that 'tuesday' is not read as 'tue' followed by 'sday'
+    return '|'.join(sorted(words, key=len, reverse=True))
+
+# Only full names take a plural 's' ("mondays"); on abbreviations it would read "thus" as Thursday
+FULL_WEEKDAYS = [name for name in WEEKDAYS if name.endswith('day')]
+WEEKDAY = rf"(?:(?:{_alternatives(FULL_WEEKDAYS)})s|{_alternatives(WEEKDAYS)})\b\.?"
+RELATIVE_DAY = rf"(?:{_alternatives(RELATIVE_DAYS)})\b"
+MONTH = rf"(?:{_alternatives(MONTHS)})\b\.?"
+ORDINAL = r"\d{1,2}(?:st|nd|rd|th)?\b"
+MONTH_DAY = rf"(?:{MONTH}\s*{ORDINAL}|{ORDINAL}\s*(?:of\s+)?{MONTH}|\d{{1,2}}/\d{{1,2}}\b)"
+DAY = rf"(?:{WEEKDAY}|{RELATIVE_DAY}|{MONTH_DAY})"
+TIME = r"(?:noon|midday|midnight|\d{1,2}(?::\d{2})?(?:\s*(?:[ap]m\b|[ap]\.m\.|[ap]\b))?)"
+
+# One day, with the part that was matched in a named group
+DAY_PATTERN = re.compile(
+    rf"\b(?:(?P<weekday>{WEEKDAY})|(?P<relative>{RELATIVE_DAY})"
+    rf"|(?P<month_first>{MONTH})\s*(?P<month_first_day>\d{{1,2}})(?:st|nd|rd|th)?\b"
+    rf"|(?P<day_first>\d{{1,2}})(?:st|nd|rd|th)?\s*(?:of\s+)?(?P<day_first_month>{MONTH})"
+    rf"|(?P<numeric_month>\d{{1,2}})/(?P<numeric_day>\d{{1,2}})\b)"
+)
+
+# One or more days followed by a time range: "monday 2pm-4pm", "tue and thu from 10 to 11:30am"
+RANGE_PATTERN = re.compile(
+    rf"\b(?P<days>{DAY}(?:\s*(?:,|&|/|\band\b|\bor\b)\s*{DAY})*)\s*,?\s*"
+    rf"(?:(?:from|between|at)\s+)?(?P<start>{TIME})\s*(?:-|to\b|until\b|till\b|and\b)\s*(?P<end>{TIME})"
+)
+
+TIME_PATTERN = re.compile(
+    r"(?:(?P<named>noon|midday|midnight)"
+    r"|(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?:(?P<meridiem>[ap])(?:m|\.m\.)?)?)"
+)
+
+PERIOD_PATTERN = re.compile(rf"\b({_alternatives(PERIODS)})s?\b")
+
+DASHES = re.compile(r"[‐-―−]")
+WHITESPACE = re.compile(r"\s+")
+
+NAMED_TIMES = {'noon': (12, 0, 'p'), 'midday': (12, 0, 'p'), 'midnight': (12, 0, 'a')}
+
+def normalize_text(text):
+    """Lowercase the text, turn typographic dashes into '-' and collapse whitespace"""
+    return WHITESPACE.sub(' ', DASHES.sub('-', text.lower())).strip()
+
+def parse_availability(text, now=None):
+    """Parse free-text availability into (start, end) datetimes that have not ended yet.
+
+    Understands day and time ranges such as "Monday 2pm-4pm, Tuesday
+    10:30-12", several days sharing a range ("Tue and Thu 9am to 11am"),
+    "today"/"tomorrow", dates ("July 15", "15th of July", "7/15"), and
+    named times of day ("Friday afternoon"). Weekdays mean their next
+    occurrence; one whose range has already passed today means next week.
+    """
+    now = now or datetime.now()
+    slots = []
+    for start, end, weekly in _parse_slots(normalize_text(text or ''), now.date()):
+        if end <= now:
+            if not weekly:
+                continue
+            start, end = start + timedelta(days=7), end + timedelta(days=7)
+        slots.append((start, end))
+    return slots
+
+@lru_cache(maxsize=1024)
+def _parse_slots(text, today):
+    """Parse normalized text relative to a date; returns ((start, end, weekly), ...) and is cached"""
+    slots = []
+    matched = False
+    for match in RANGE_PATTERN.finditer(text):
+        matched = True
+        times = _time_range(match.group('start'), match.group('end'))
+        if times is None:
+            # An impossible time such as "25-26" is dropped, not guessed
+            continue
+        for day, weekly in _days(match.group('days'), today):
+            midnight = datetime.combine(day, time())
+            slots.append((midnight + times[0], midnight + times[1], weekly))
+    if matched:
+        return tuple(slots)
+    return tuple(_named_slots(text, today))
+
+def _named_slots(text, today):
+    """Slots for text without time ranges: named times of day, plain days, or both"""
+    days = list(_days(text, today))
+    periods = [PERIODS[period] for period in PERIOD_PATTERN.findall(text)]
+    if not days and periods:
+        # The next three days, skipping weekends
+        days = [(today + timedelta(days=offset), False) for offset in range(1, 4)
+                if (today + timedelta(days=offset)).weekday() < 5]
+    for day, weekly in days:
+        for start, end in periods or [DEFAULT_RANGE]:
+            yield datetime.combine(day, start), datetime.combine(day, end), weekly
+
+def _days(text, today):
+    """Yield (date, weekly) for each day mentioned in the text"""
+    for match in DAY_PATTERN.finditer(text):
+        if match.group('weekday'):
+            weekday = _weekday(match.group('weekday'))
+            yield today + timedelta(days=(weekday - today.weekday()) % 7), True
+        elif match.group('relative'):
+            yield today + timedelta(days=RELATIVE_DAYS[match.group('relative')]), False
+        else:
+            if match.group('month_first'):
+                month, day = MONTHS[match.group('month_first').rstrip('.')], match.group('month_first_day')
+            elif match.group('day_first'):
+                month, day = MONTHS[match.group('day_first_month').rstrip('.')], match.group('day_first')
+            else:
+                month, day = int(match.group('numeric_month')), match.group('numeric_day')
+            found = _upcoming_date(today, month, int(day))
+            if found is not None:
+                yield found, False
+
+def _weekday(word):
+    """Weekday number of a matched name such as 'tue.', 'tues' or 'mondays'"""
+    word = word.rstrip('.')
+    return WEEKDAYS[word] if word in WEEKDAYS else WEEKDAYS[word[:-1]]
+
+def _upcoming_date(today, month, day):
+    """The next date with this month and day, this year or next; None for impossible dates"""
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = date(year, month, day)
+        except ValueError:
+            return None
+        if candidate >= today:
+            return candidate
+    return None
+
+def _time_range(start_text, end_text):
+    """Return (start, end) offsets from midnight for a range, or None when it is not a valid time"""
+    start, end = _clock_time(start_text), _clock_time(end_text)
+    if start is None or end is None:
+        return None
+    (start_hour, start_minute, start_meridiem), (end_hour, end_minute, end_meridiem) = start, end
+
+    if start_meridiem and end_meridiem:
+        start_value = _to_minutes(start_hour, start_minute, start_meridiem)
+        end_value = _to_minutes(end_hour, end_minute, end_meridiem)
+    elif end_meridiem:
+        # "2-4pm" shares the end's am/pm, unless that puts the start after the end ("11-1pm")
+        end_value = _to_minutes(end_hour, end_minute, end_meridiem)
+        start_value = _to_minutes(start_hour, start_minute, end_meridiem)
+        if start_value is not None and end_value is not None and start_value >= end_value:
+            start_value = _to_minutes(start_hour, start_minute, 'a' if end_meridiem == 'p' else 'p')
+    elif start_meridiem:
+        # "11am-1" ends at 1pm, "9am-11" at 11am
+        start_value = _to_minutes(start_hour, start_minute, start_meridiem)
+        end_value = _to_minutes(end_hour, end_minute, start_meridiem)
+        if start_value is not None and end_value is not None and end_value <= start_value:
+            end_value = _to_minutes(end_hour, end_minute, 'a' if start_meridiem == 'p' else 'p')
+    else:
+        start_value = _to_minutes(start_hour, start_minute, _business_meridiem(start_hour))
+        end_value = _to_minutes(end_hour, end_minute, _business_meridiem(end_hour))
+
+    if start_value is None or end_value is None:
+        return None
+    if end_value <= start_value:
+        # Ranges across midnight, such as "10pm-1am"
+        end_value += 24 * 60
+    return timedelta(minutes=start_value), timedelta(minutes=end_value)
+
+def _clock_time(text):
+    """Split a time into (hour, minute, 'a'/'p'/None), or None when it is out of range"""
+    match = TIME_PATTERN.fullmatch(text.strip())
+    if match is None:
+        return None
+    if match.group('named'):
+        return NAMED_TIMES[match.group('named')]
+    hour, minute = int(match.group('hour')), int(match.group('minute') or 0)
+    meridiem = match.group('meridiem')
+    if hour > 23 or minute > 59 or (meridiem and not 1 <= hour <= 12):
+        return None
+    return hour, minute, meridiem
+
+def _business_meridiem(hour):
+    """am/pm for an hour given without one: 8-11 are mornings, 12-7 afternoons, anything else is 24-hour"""
+    if 8 <= hour <= 11:
+        return 'a'
+    if hour == 12 or 1 <= hour <= 7:
+        return 'p'
+    return None
+
+def _to_minutes(hour, minute, meridiem):
+    """Minutes after midnight, or None when the hour does not fit the meridiem"""
+    if meridiem is None or hour > 12:
+        # 24-hour times ignore any am/pm borrowed from the other end of the range
+        return hour * 60 + minute if hour <= 23 else None
+    if hour == 0:
+        return minute if meridiem == 'a' else None
+    return ((hour % 12) + (12 if meridiem == 'p' else 0)) * 60 + minute
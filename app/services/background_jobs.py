@@ -0,0 +1,148 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from flask import current_app, has_app_context
+from app.models.database import after_commit, db
+
+logger = logging.getLogger(__name__)
+
+class BackgroundJobQueue:
+    """Small in-process job queue with a pool of worker threads and retry with backoff.
+
+    Jobs run inside an application context. A job that raises is retried with
+    exponential backoff (with jitter) until max_attempts is reached, then its
+    on_failure callback is called with the last exception. When retry_on is
+    given, only exceptions it returns true for are retried. With zero workers
+    nothing runs in the background and run_pending() drains the queue instead.
+    """
+
+    def __init__(self, app, workers=2, max_attempts=5, base_delay=2.0, max_delay=300.0, clock=time.monotonic,
+                 retry_on=None):
+        """Initialize the queue"""
+        self.app = app
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.retry_on = retry_on
+
+        self._condition = threading.Condition()
+        self._heap = []  # (due_at, sequence, job)
+        self._sequence = itertools.count()
+        self._threads = []
+        self._stopped = False
+
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker threads"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"background-job-{len(self._threads) + 1}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def stop(self):
+        """Stop the worker threads once they finish their current job"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def submit(self, func, *args, on_failure=None, delay=0):
+        """Queue func(*args) to run in the background"""
+        job = {'func': func, 'args': args, 'on_failure': on_failure, 'attempt': 0}
+        self._schedule(job, delay)
+
+    def pending_count(self):
+        """Return the number of queued jobs, including those waiting for a retry"""
+        with self._condition:
+            return len(self._heap)
+
+    def run_pending(self):
+        """Run every job that is due in the calling thread and return how many ran"""
+        ran = 0
+        while True:
+            with self._condition:
+                if not self._heap or self._heap[0][0] > self.clock():
+                    return ran
+                _, _, job = heapq.heappop(self._heap)
+            self._execute(job)
+            ran += 1
+
+    def _schedule(self, job, delay):
+        with self._condition:
+            heapq.heappush(self._heap, (self.clock() + delay, next(self._sequence), job))
+            self._condition.notify()
+
+    def _next_delay(self, attempt):
+        """Exponential backoff with jitter for the retry after `attempt` failed attempts"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _execute(self, job):
+        job['attempt'] += 1
+        try:
+            with self.app.app_context():
+                try:
+                    job['func'](*job['args'])
+                finally:
+                    db.session.remove()
+            self.completed += 1
+        except Exception as e:
+            name = getattr(job['func'], '__name__', repr(job['func']))
+            if job['attempt'] < self.max_attempts and (self.retry_on is None or self.retry_on(e)):
+                delay = self._next_delay(job['attempt'])
+                logger.warning('Background job %s failed (attempt %s), retrying in %.1fs: %s', name, job['attempt'], delay, e)
+                self.retried += 1
+                self._schedule(job, delay)
+                return
+
+            logger.exception('Background job %s failed after %s attempts: %s', name, job['attempt'], e)
+            self.failed += 1
+            if job['on_failure'] is not None:
+                with self.app.app_context():
+                    try:
+                        job['on_failure'](e, *job['args'])
+                    except Exception as callback_error:
+                        logger.error('Error in failure callback of background job %s: %s', name, callback_error)
+                    finally:
+                        db.session.remove()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._heap and self._heap[0][0] <= self.clock():
+                        break
+                    timeout = self._heap[0][0] - self.clock() if self._heap else None
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+            self._execute(job)
+
+def submit_job(func, *args, on_failure=None):
+    """Queue a job on the application's background queue, or run it right away when there is none.
+
+    Inside a unit of work the job is submitted only once the transaction
+    commits, so it never runs before the rows it reads exist.
+    """
+    after_commit(_submit_job, func, args, on_failure)
+
+def _submit_job(func, args, on_failure):
+    queue = current_app.extensions.get('background_jobs') if has_app_context() else None
+    if queue is not None:
+        queue.submit(func, *args, on_failure=on_failure)
+        return
+
+    try:
+        func(*args)
+    except Exception as e:
+        logger.error('Error running job %s: %s', getattr(func, '__name__', func), e)
+        if on_failure is not None:
+            on_failure(e, *args)
@@ -0,0 +1,36 @@
+from bisect import bisect_left, bisect_right
+
+class BusyIndex:
+    """Sorted, merged index of busy intervals with bisect lookups"""
+
+    def __init__(self, busy_periods=()):
+        """Build the index from (start, end) tuples in any order"""
+        self._starts = []
+        self._ends = []
+
+        # Sort by start time and merge overlapping or touching intervals
+        for start, end in sorted(busy_periods):
+            if end <= start:
+                continue
+            if self._ends and start <= self._ends[-1]:
+                if end > self._ends[-1]:
+                    self._ends[-1] = end
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def overlapping(self, start, end):
+        """Return the busy intervals overlapping [start, end), clipped to it"""
+        # Blocks are disjoint and sorted, so both their starts and their ends are sorted
+        first = bisect_right(self._ends, start)
+        last = bisect_left(self._starts, end)
+        return [
+            (max(self._starts[i], start), min(self._ends[i], end))
+            for i in range(first, last)
+        ]
@@ -0,0 +1,99 @@
+import os
+import pickle
+import threading
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from app.services.metrics import metrics
+
+# Define the scopes
+SCOPES = [
+    'https://www.googleapis.com/auth/calendar',
+    'https://www.googleapis.com/auth/calendar.events'
+]
+
+def request_method(request):
+    """Return the Calendar API method of a request, such as 'events.insert'"""
+    return getattr(request, 'methodId', 'calendar.unknown').partition('.')[2]
+
+def execute(request):
+    """Execute a Calendar API request, timing and counting it by method"""
+    with metrics.api_call('google_calendar', request_method(request)):
+        return request.execute()
+
+def execute_batch(batch, requests):
+    """Execute a BatchHttpRequest holding `requests`; each one is counted, as each one uses quota"""
+    for request in requests:
+        metrics.count_api_call('google_calendar', request_method(request))
+    with metrics.stage('google_calendar_batch'):
+        batch.execute()
+
+class CalendarClient:
+    """Process-wide Google Calendar client shared by every GoogleCalendarService.
+
+    Credentials and the discovery document are loaded once per process and kept
+    in memory; token refreshes happen under a lock. httplib2 is not thread-safe,
+    so each thread gets its own service object with its own HTTP transport,
+    which it keeps (with its warm connections) for the life of the thread.
+    """
+
+    def __init__(self, token_path='token.pickle', client_secret_file='client-secret.json', scopes=SCOPES):
+        """Initialize the client"""
+        self.token_path = token_path
+        self.client_secret_file = client_secret_file
+        self.scopes = scopes
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._credentials = None
+        self._discovery_doc = None
+        self._generation = 0
+
+    def get_credentials(self):
+        """Return valid credentials, loading them once and refreshing them under the lock"""
+        with self._lock:
+            if self._credentials is None and os.path.exists(self.token_path):
+                with open(self.token_path, 'rb') as token:
+                    self._credentials = pickle.load(token)
+
+            if not self._credentials or not self._credentials.valid:
+                if self._credentials and self._credentials.expired and self._credentials.refresh_token:
+                    self._credentials.refresh(Request())
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_file, self.scopes)
+                    self._credentials = flow.run_local_server(port=0)
+                    self._generation += 1
+
+                # Save the credentials for the next run
+                with open(self.token_path, 'wb') as token:
+                    pickle.dump(self._credentials, token)
+
+            return self._credentials
+
+    def get_discovery_document(self):
+        """Return the Calendar v3 discovery document, read from disk only once"""
+        with self._lock:
+            if self._discovery_doc is None:
+                self._discovery_doc = get_static_doc('calendar', 'v3')
+            return self._discovery_doc
+
+    def get_service(self):
+        """Return this thread's calendar service, building it on first use"""
+        credentials = self.get_credentials()
+        local = self._local
+        if getattr(local, 'service', None) is None or local.generation != self._generation:
+            http = AuthorizedHttp(credentials, http=httplib2.Http())
+            local.service = build_from_document(self.get_discovery_document(), http=http)
+            local.generation = self._generation
+        return local.service
+
+    def reset(self):
+        """Forget cached credentials, e.g. after the OAuth flow wrote a new token file"""
+        with self._lock:
+            self._credentials = None
+            self._generation += 1
+
+# Shared by every GoogleCalendarService in the process
+calendar_client = CalendarClient()
@@ -0,0 +1,291 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from googleapiclient.errors import HttpError
+from app.models.database import db
+from app.models.models import CalendarBusyBlock, CalendarSyncState
+from app.services.calendar_client import execute
+from app.services.busy_index import BusyIndex
+
+logger = logging.getLogger(__name__)
+
+# Mirrored events that ended more than this long ago are not kept
+MIRROR_RETENTION = timedelta(days=1)
+
+class SyncTokenExpired(Exception):
+    """Raised when Google rejects a sync token with 410 Gone"""
+
+def _to_utc_naive(value):
+    """Parse an event start/end ({'dateTime': ...} or {'date': ...}) into naive UTC"""
+    if 'dateTime' in value:
+        parsed = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    # All-day events block the whole day
+    return datetime.fromisoformat(value['date'])
+
+def _is_busy(event):
+    """Check whether an event blocks time the way free/busy would report it"""
+    if event.get('status') == 'cancelled':
+        return False
+    if event.get('transparency') == 'transparent':
+        return False
+    for attendee in event.get('attendees', []):
+        if attendee.get('self') and attendee.get('responseStatus') == 'declined':
+            return False
+    return 'start' in event and 'end' in event
+
+class CalendarMirror:
+    """Local mirror of recruiter calendars kept fresh with incremental sync tokens.
+
+    Busy intervals are stored in the calendar_busy_block table and served from an
+    in-memory BusyIndex per calendar, so availability lookups do not need a
+    freebusy round trip. The index is reloaded when another process has synced
+    the calendar since it was built. A calendar this process has just written
+    events to is not answered from until its next sync.
+    """
+
+    def __init__(self, refresh_seconds=5):
+        """Initialize the mirror"""
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._indexes = {}  # calendar_id -> (BusyIndex, last_synced_at, checked_at)
+        self._stale = set()  # Calendars written to since their last sync
+
+    def is_mirrored(self, calendar_id):
+        """Check whether a calendar has completed at least one full sync"""
+        return self._get_index(calendar_id) is not None
+
+    def busy_periods(self, calendar_id, start_time, end_time):
+        """Return mirrored busy periods (naive UTC) overlapping [start_time, end_time)"""
+        busy_index = self._get_index(calendar_id)
+        if busy_index is None:
+            return None
+        return busy_index.overlapping(start_time, end_time)
+
+    def sync(self, service, calendar_id):
+        """Bring the mirror of one calendar up to date and return the number of changed events.
+
+        Uses the stored sync token for an incremental sync, and falls back to a
+        full resync when there is none or Google answers 410 Gone.
+        """
+        sync_state = CalendarSyncState.query.filter_by(calendar_id=calendar_id).first()
+        if sync_state is None:
+            sync_state = CalendarSyncState(calendar_id=calendar_id)
+            db.session.add(sync_state)
+
+        changed = None
+        if sync_state.sync_token:
+            try:
+                changed = self._apply_changes(service, calendar_id, sync_state, full=False)
+            except SyncTokenExpired:
+                logger.info('Sync token for calendar %s expired, running a full resync', calendar_id)
+                db.session.rollback()
+                sync_state = CalendarSyncState.query.filter_by(calendar_id=calendar_id).first()
+
+        if changed is None:
+            CalendarBusyBlock.query.filter_by(calendar_id=calendar_id).delete()
+            sync_state.sync_token = None
+            changed = self._apply_changes(service, calendar_id, sync_state, full=True)
+
+        sync_state.last_synced_at = datetime.utcnow()
+        db.session.commit()
+
+        with self._lock:
+            self._indexes.pop(calendar_id, None)
+            self._stale.discard(calendar_id)
+        return changed
+
+    def mark_stale(self, calendar_id):
+        """Stop answering for a calendar until it is synced again, after an event was written to it"""
+        with self._lock:
+            self._indexes.pop(calendar_id, None)
+            self._stale.add(calendar_id)
+
+    def watch(self, service, calendar_id, address, ttl_seconds=7 * 24 * 3600):
+        """Register a push-notification channel that calls `address` when the calendar changes"""
+        channel_id = uuid.uuid4().hex
+        channel = execute(service.events().watch(
+            calendarId=calendar_id,
+            body={
+                'id': channel_id,
+                'type': 'web_hook',
+                'address': address,
+                'params': {'ttl': str(ttl_seconds)}
+            }
+        ))
+
+        sync_state = CalendarSyncState.query.filter_by(calendar_id=calendar_id).first()
+        if sync_state is None:
+            sync_state = CalendarSyncState(calendar_id=calendar_id)
+            db.session.add(sync_state)
+        sync_state.channel_id = channel_id
+        sync_state.resource_id = channel.get('resourceId')
+        if channel.get('expiration'):
+            sync_state.channel_expires_at = datetime.utcfromtimestamp(int(channel['expiration']) / 1000)
+        db.session.commit()
+        return channel
+
+    def calendar_for_channel(self, channel_id):
+        """Return the calendar ID watched by a push-notification channel"""
+        sync_state = CalendarSyncState.query.filter_by(channel_id=channel_id).first()
+        return sync_state.calendar_id if sync_state else None
+
+    def clear(self):
+        """Forget the in-memory indexes (the table is left untouched)"""
+        with self._lock:
+            self._indexes.clear()
+            self._stale.clear()
+
+    def _apply_changes(self, service, calendar_id, sync_state, full):
+        """Page through events().list and apply every event to the busy table"""
+        changed = 0
+        page_token = None
+        cutoff = datetime.utcnow() - MIRROR_RETENTION
+
+        while True:
+            params = {'calendarId': calendar_id, 'singleEvents': True, 'maxResults': 250}
+            if page_token:
+                params['pageToken'] = page_token
+            if not full:
+                params['syncToken'] = sync_state.sync_token
+
+            try:
+                response = execute(service.events().list(**params))
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise SyncTokenExpired(calendar_id)
+                raise
+
+            for event in response.get('items', []):
+                self._apply_event(calendar_id, event, cutoff, full)
+                changed += 1
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                sync_state.sync_token = response.get('nextSyncToken')
+                return changed
+
+    def _apply_event(self, calendar_id, event, cutoff, full):
+        """Insert, update or remove the busy block of one event"""
+        block = None
+        if not full:
+            block = CalendarBusyBlock.query.filter_by(calendar_id=calendar_id, event_id=event['id']).first()
+
+        if not _is_busy(event):
+            if block is not None:
+                db.session.delete(block)
+            return
+
+        start_time = _to_utc_naive(event['start'])
+        end_time = _to_utc_naive(event['end'])
+        if end_time <= cutoff:
+            if block is not None:
+                db.session.delete(block)
+            return
+
+        if block is None:
+            block = CalendarBusyBlock(calendar_id=calendar_id, event_id=event['id'])
+            db.session.add(block)
+        block.start_time = start_time
+        block.end_time = end_time
+
+    def _get_index(self, calendar_id):
+        """Return the in-memory busy index of a calendar, reloading it from the table when stale"""
+        now = time.monotonic()
+        with self._lock:
+            if calendar_id in self._stale:
+                return None
+            cached = self._indexes.get(calendar_id)
+        if cached is not None and now - cached[2] < self.refresh_seconds:
+            return cached[0]
+
+        sync_state = CalendarSyncState.query.filter_by(calendar_id=calendar_id).first()
+        if sync_state is None or sync_state.last_synced_at is None:
+            return None
+
+        if cached is not None and cached[1] == sync_state.last_synced_at:
+            busy_index = cached[0]
+        else:
+            blocks = CalendarBusyBlock.query.filter_by(calendar_id=calendar_id).all()
+            busy_index = BusyIndex((block.start_time, block.end_time) for block in blocks)
+
+        with self._lock:
+            self._indexes[calendar_id] = (busy_index, sync_state.last_synced_at, now)
+        return busy_index
+
+class CalendarSyncWorker:
+    """Background thread that keeps recruiter calendars mirrored"""
+
+    def __init__(self, app, mirror, calendar_service, interval_seconds=300):
+        """Initialize the worker"""
+        self.app = app
+        self.mirror = mirror
+        self.calendar_service = calendar_service
+        self.interval_seconds = interval_seconds
+        self._wakeup = threading.Event()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='calendar-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread"""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def request_sync(self, calendar_id):
+        """Ask the worker to sync one calendar as soon as possible"""
+        with self._pending_lock:
+            self._pending.add(calendar_id)
+        self._wakeup.set()
+
+    def sync_all(self):
+        """Sync every recruiter calendar once"""
+        from app.models.models import Recruiter
+        calendar_ids = {recruiter.calendar_id for recruiter in Recruiter.query.all() if recruiter.calendar_id}
+        for calendar_id in calendar_ids:
+            self._sync(calendar_id)
+
+    def _sync(self, calendar_id):
+        try:
+            self.mirror.sync(self.calendar_service.get_calendar_service(), calendar_id)
+            self.calendar_service.freebusy_cache.invalidate(calendar_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error('Error syncing calendar %s: %s', calendar_id, e)
+
+    def _run(self):
+        with self.app.app_context():
+            self.sync_all()
+            while not self._stopped.is_set():
+                triggered = self._wakeup.wait(self.interval_seconds)
+                self._wakeup.clear()
+                if self._stopped.is_set():
+                    break
+
+                if triggered:
+                    with self._pending_lock:
+                        calendar_ids, self._pending = self._pending, set()
+                    for calendar_id in calendar_ids:
+                        self._sync(calendar_id)
+                else:
+                    self.sync_all()
+                db.session.remove()
+
+def mirror_enabled():
+    """Check whether availability should be read from the local calendar mirror"""
+    return os.getenv('CALENDAR_MIRROR_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Shared by every GoogleCalendarService in the process
+calendar_mirror = CalendarMirror(refresh_seconds=float(os.getenv('CALENDAR_MIRROR_REFRESH_SECONDS', 5)))
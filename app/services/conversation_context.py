@@ -0,0 +1,174 @@
+import calendar
+import json
+from datetime import datetime
+from operator import attrgetter
+
+# Reused, since json.dumps builds a new encoder for every call with non-default options
+compact_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+def to_epoch(moment):
+    """Seconds since the epoch of a naive wall-clock datetime (no timezone conversion)"""
+    return calendar.timegm(moment.timetuple())
+
+def from_epoch(seconds):
+    """Naive wall-clock datetime of seconds since the epoch, the inverse of to_epoch"""
+    return datetime.utcfromtimestamp(seconds)
+
+class ConversationContext:
+    """What a conversation has collected so far, with fixed typed fields.
+
+    Offered and selected slots are kept as epoch seconds, and the serialized
+    form uses one-letter keys and leaves out unset fields. Assignments are
+    tracked, so that saving a context only merges the fields a handler
+    actually changed into the stored one.
+    """
+
+    # Field name -> key in the compact serialized form
+    FIELDS = {
+        'name': 'n',
+        'email': 'e',
+        'position': 'p',
+        'candidate_id': 'c',
+        'recruiter_id': 'r',
+        'raw_availability': 'a',
+        'offered_slots': 'o',  # ((start, end, recruiter_id), ...) in epoch seconds
+        'selected_slot': 's',  # (start, end) in epoch seconds
+    }
+
+    __slots__ = tuple(FIELDS) + ('_dirty',)
+
+    def __init__(self, **fields):
+        """Initialize a context; every field passed in counts as changed"""
+        object.__setattr__(self, '_dirty', set())
+        for field in self.FIELDS:
+            object.__setattr__(self, field, None)
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    @classmethod
+    def _from_values(cls, values):
+        """Build an unchanged context from field values in FIELDS order, skipping validation"""
+        context = object.__new__(cls)
+        for set_field, value in zip(SLOT_SETTERS, values):
+            set_field(context, value)
+        DIRTY_SETTER(context, set())
+        return context
+
+    def _values(self):
+        return FIELD_GETTER(self)
+
+    def __setattr__(self, field, value):
+        if field not in self.FIELDS:
+            raise AttributeError(f"ConversationContext has no field '{field}'")
+        if field == 'offered_slots' and value is not None:
+            value = tuple(tuple(slot) for slot in value)
+        elif field == 'selected_slot' and value is not None:
+            value = tuple(value)
+        object.__setattr__(self, field, value)
+        self._dirty.add(field)
+
+    def __eq__(self, other):
+        if not isinstance(other, ConversationContext):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self):
+        values = ', '.join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS
+                           if getattr(self, field) is not None)
+        return f'<ConversationContext {values}>'
+
+    @property
+    def dirty_fields(self):
+        """Names of the fields assigned since the context was loaded"""
+        return frozenset(self._dirty)
+
+    def copy(self):
+        """Return an unchanged copy (field values are immutable, so a shallow copy is enough)"""
+        return self._from_values(self._values())
+
+    def merged(self, changes):
+        """Return a copy of this context with the changed fields of another context applied"""
+        values = list(self._values())
+        for field in changes._dirty:
+            values[FIELD_INDEX[field]] = getattr(changes, field)
+        return self._from_values(values)
+
+    def offer_slots(self, slots):
+        """Store offered (start, end, recruiter_id) slots"""
+        self.offered_slots = [(to_epoch(start), to_epoch(end), recruiter_id) for start, end, recruiter_id in slots]
+
+    def offered_slot_times(self):
+        """Return the offered slots as (start, end, recruiter_id) with datetimes"""
+        return [(from_epoch(start), from_epoch(end), recruiter_id)
+                for start, end, recruiter_id in self.offered_slots or ()]
+
+    def select_slot(self, start_time, end_time):
+        """Store the slot the candidate picked"""
+        self.selected_slot = (to_epoch(start_time), to_epoch(end_time))
+
+    def selected_slot_times(self):
+        """Return the picked slot as (start, end) datetimes, or None"""
+        if not self.selected_slot:
+            return None
+        start, end = self.selected_slot
+        return from_epoch(start), from_epoch(end)
+
+    def to_compact(self):
+        """Serialize the set fields to compact JSON"""
+        values = {key: value for key, value in zip(COMPACT_KEY_ORDER, self._values()) if value is not None}
+        return compact_encoder.encode(values)
+
+    @classmethod
+    def from_compact(cls, serialized):
+        """Load a context from its compact JSON, or from a context stored in the older dict format"""
+        values = json.loads(serialized) if serialized else {}
+        if not isinstance(values, dict):
+            values = {}
+        if not values.keys() <= COMPACT_KEYS:
+            context = cls.from_dict(values)
+            context._dirty.clear()
+            return context
+
+        offered_slots = values.get('o')
+        selected_slot = values.get('s')
+        return cls._from_values([
+            values.get('n'),
+            values.get('e'),
+            values.get('p'),
+            values.get('c'),
+            values.get('r'),
+            values.get('a'),
+            tuple(tuple(slot) for slot in offered_slots) if offered_slots is not None else None,
+            tuple(selected_slot) if selected_slot is not None else None,
+        ])
+
+    @classmethod
+    def from_dict(cls, values):
+        """Build a context from compact keys or the older dict format; every given field counts as changed"""
+        context = cls()
+        for field, key in cls.FIELDS.items():
+            if key in values:
+                setattr(context, field, values[key])
+            elif field in values and field not in ('offered_slots', 'selected_slot'):
+                setattr(context, field, values[field])
+
+        # The older format kept ISO timestamps, with offers under 'available_slots'
+        if 'available_slots' in values and 'o' not in values:
+            context.offer_slots(
+                (datetime.fromisoformat(slot[0]), datetime.fromisoformat(slot[1]), slot[2] if len(slot) > 2 else None)
+                for slot in values['available_slots'] or ()
+            )
+        if values.get('selected_slot') and 's' not in values:
+            start, end = values['selected_slot'][:2]
+            context.select_slot(datetime.fromisoformat(start), datetime.fromisoformat(end))
+        return context
+
+COMPACT_KEY_ORDER = tuple(ConversationContext.FIELDS.values())
+COMPACT_KEYS = frozenset(COMPACT_KEY_ORDER)
+FIELD_INDEX = {field: index for index, field in enumerate(ConversationContext.FIELDS)}
+
+# Reads every field in one call, in FIELDS order
+FIELD_GETTER = attrgetter(*ConversationContext.FIELDS)
+# The slot descriptors' own setters bypass __setattr__ and are much faster than setattr
+SLOT_SETTERS = [ConversationContext.__dict__[field].__set__ for field in ConversationContext.FIELDS]
+DIRTY_SETTER = ConversationContext.__dict__['_dirty'].__set__
@@ -0,0 +1,47 @@
+import re
+
+# Commands that are the whole message, looked up in one dict probe
+WHOLE_MESSAGE_COMMANDS = {
+    **dict.fromkeys(['hi', 'hello', 'hey', 'hola', 'start', 'begin'], 'greeting'),
+    **dict.fromkeys(['reset', 'restart', 'start over'], 'reset'),
+    'continue': 'continue',
+}
+
+# Keywords found anywhere in the message, all in one precompiled pattern
+CALENDAR_KEYWORDS = re.compile(r'calendar|invitation|invite|received|check')
+
+def normalize_message(message_body):
+    """Return the stripped, lowercased message that commands are matched against"""
+    return message_body.strip().lower()
+
+def match_command(normalized_body):
+    """Return the command a normalized message asks for (greeting, reset, continue or calendar), or None"""
+    command = WHOLE_MESSAGE_COMMANDS.get(normalized_body)
+    if command is None and CALENDAR_KEYWORDS.search(normalized_body):
+        return 'calendar'
+    return command
+
+class StateDispatcher:
+    """Table from conversation states to the handler methods that answer them.
+
+    Methods register with the on() decorator. The table keeps method names
+    rather than functions, so that subclasses and patched methods are
+    dispatched to as well.
+    """
+
+    def __init__(self):
+        """Initialize an empty table"""
+        self.handlers = {}
+
+    def on(self, *states):
+        """Decorator registering a method as the handler of the given states"""
+        def register(method):
+            for state in states:
+                self.handlers[state] = method.__name__
+            return method
+        return register
+
+    def handler_for(self, owner, state):
+        """Return the bound handler of a state, or None for an unknown state"""
+        name = self.handlers.get(state)
+        return getattr(owner, name) if name is not None else None
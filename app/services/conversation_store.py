@@ -0,0 +1,233 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from app.models.database import after_commit, after_rollback, in_unit_of_work
+from app.services.conversation_context import ConversationContext
+from app.services.state_backends import StaleConversationState, backend_from_env
+
+NON_DIGITS = re.compile(r'\D')
+
+# Times a save reloads a state that another writer changed before giving up
+SAVE_ATTEMPTS = 3
+
+def normalize_phone_number(phone_number):
+    """Return the E.164 key of a phone number ('+' and digits only), without any 'whatsapp:' prefix"""
+    if phone_number and phone_number[0] == '+' and phone_number[1:].isdigit() and phone_number.isascii():
+        # Already an E.164 key
+        return phone_number
+    number = (phone_number or '').strip()
+    if number.lower().startswith('whatsapp:'):
+        number = number[len('whatsapp:'):].strip()
+    digits = NON_DIGITS.sub('', number)
+    # 00 is the international call prefix written instead of '+'
+    if number.startswith('00'):
+        digits = digits[2:]
+    return '+' + digits if digits else ''
+
+class ConversationSnapshot:
+    """Detached copy of a conversation state; handlers may change its context freely"""
+
+    __slots__ = ('phone_number', 'current_state', 'context')
+
+    def __init__(self, phone_number, current_state, context):
+        self.phone_number = phone_number
+        self.current_state = current_state
+        self.context = context
+
+    def __repr__(self):
+        return f'<ConversationSnapshot {self.phone_number}: {self.current_state}>'
+
+class ConversationStateStore:
+    """Conversation states behind a write-through, thread-safe LRU cache keyed by phone number.
+
+    Phone numbers are normalized to E.164 before they reach the backend (see
+    state_backends), which keeps one record per number. A cached number needs
+    no read at all and every state change is a single upsert. Numbers with no
+    stored state are cached too, so a new conversation starts without a
+    record until its first state change. Entries expire after a TTL so that
+    changes made by other processes are picked up.
+
+    Each process has its own cache, so an entry may be older than the stored
+    state. Saves are therefore conditional on the version the entry was
+    loaded at; when another writer got there first, the state is reloaded
+    and the changed fields are merged into it again.
+    """
+
+    def __init__(self, backend=None, ttl_seconds=300, max_entries=10000, clock=time.monotonic):
+        """Initialize the store"""
+        self.backend = backend if backend is not None else backend_from_env()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        """Create a store configured by the CONVERSATION_STATE_BACKEND and CONVERSATION_CACHE_* environment variables"""
+        return cls(
+            backend=backend_from_env(),
+            ttl_seconds=float(os.getenv('CONVERSATION_CACHE_TTL', 300)),
+            max_entries=int(os.getenv('CONVERSATION_CACHE_MAX_ENTRIES', 10000))
+        )
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, phone_number):
+        """Return the conversation of a phone number, or an unsaved 'initial' one when there is none"""
+        normalized_number = normalize_phone_number(phone_number)
+        entry = self._cached(normalized_number)
+        if entry is None:
+            entry = self._load(normalized_number)
+            self._store(normalized_number, entry)
+
+        current_state, context, _ = entry
+        return ConversationSnapshot(normalized_number, current_state, context.copy())
+
+    def save(self, phone_number, current_state, context=None, replace=False):
+        """Write a state change through to the backend and the cache.
+
+        context is a ConversationContext (a dict in the older format is
+        accepted too). Only its changed fields are merged into the stored
+        context, unless replace is set. Nothing is written when neither the
+        state nor the context changed.
+        """
+        normalized_number = normalize_phone_number(phone_number)
+        if isinstance(context, dict):
+            context = ConversationContext.from_dict(context)
+        changes = context
+
+        entry = self._cached(normalized_number)
+        for _ in range(SAVE_ATTEMPTS):
+            if entry is None:
+                entry = self._load(normalized_number)
+            stored_state, stored_context, version = entry
+
+            if replace:
+                context = changes.copy() if changes is not None else ConversationContext()
+            else:
+                context = stored_context.merged(changes) if changes is not None else stored_context
+                if current_state == stored_state and context == stored_context:
+                    return ConversationSnapshot(normalized_number, current_state, context.copy())
+
+            try:
+                new_version = self.backend.save(normalized_number, current_state, context.to_compact(), version)
+            except StaleConversationState:
+                # Written elsewhere since this entry was loaded: merge into the stored state instead
+                self.invalidate(normalized_number)
+                entry = None
+                continue
+            except Exception:
+                self._discard(normalized_number)
+                raise
+
+            # The version check guarantees the backend replaced exactly this entry
+            after_rollback(self._undo_save, normalized_number, entry if version is not None else None, new_version)
+            self._store_on_commit(normalized_number, (current_state, context, new_version))
+            return ConversationSnapshot(normalized_number, current_state, context.copy())
+
+        self._discard(normalized_number)
+        raise StaleConversationState(normalized_number)
+
+    def delete(self, phone_number):
+        """Delete the conversation of a phone number; returns whether one existed"""
+        normalized_number = normalize_phone_number(phone_number)
+        try:
+            deleted = self.backend.delete(normalized_number)
+        except Exception:
+            self._discard(normalized_number)
+            raise
+
+        self._store_on_commit(normalized_number, ('initial', ConversationContext(), None))
+        return deleted
+
+    def invalidate(self, phone_number):
+        """Drop the cached conversation of a phone number"""
+        with self._lock:
+            self._entries.pop(normalize_phone_number(phone_number), None)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries)
+            }
+
+    def _cached(self, normalized_number):
+        with self._lock:
+            entry = self._entries.get(normalized_number)
+            if entry is None or not self.enabled:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[normalized_number]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(normalized_number)
+            self.hits += 1
+            return value
+
+    def _store(self, normalized_number, value):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[normalized_number] = (self.clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(normalized_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _store_on_commit(self, normalized_number, value):
+        """Cache a written value once it is committed; until then readers go to the database"""
+        self.invalidate(normalized_number)
+        after_commit(self._store, normalized_number, value)
+        after_rollback(self.invalidate, normalized_number)
+
+    def _undo_save(self, normalized_number, entry, new_version):
+        """Hand a rolled back write's previous entry to the backend to put back"""
+        previous = None
+        if entry is not None:
+            current_state, context, version = entry
+            previous = (current_state, context.to_compact(), version)
+        self.backend.undo_save(normalized_number, previous, new_version)
+
+    def _discard(self, normalized_number):
+        """Forget a failed write; a surrounding unit of work rolls the transaction back itself"""
+        if not in_unit_of_work():
+            self.backend.rollback()
+        self.invalidate(normalized_number)
+
+    def _load(self, normalized_number):
+        """Read the state of a phone number from the backend"""
+        record = self.backend.load(normalized_number)
+        if record is None:
+            return ('initial', ConversationContext(), None)
+        current_state, context_json, version = record
+        return (current_state, ConversationContext.from_compact(context_json), version)
+
+# Shared by every SchedulingService in the process
+conversation_store = ConversationStateStore.from_env()
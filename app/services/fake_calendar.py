@@ -0,0 +1,261 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+import httplib2
+from googleapiclient.errors import HttpError
+
+def _parse_time(value):
+    """Parse an RFC 3339 timestamp into an aware UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def _format_time(value):
+    """Format an aware datetime the way the Calendar API returns it"""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class FakeRequest:
+    """A deferred API call, executed like googleapiclient's HttpRequest"""
+
+    def __init__(self, backend, method, func):
+        self.backend = backend
+        self.method = method
+        # Named like HttpRequest.methodId, e.g. 'calendar.events.insert'
+        self.methodId = f'calendar.{method}'
+        self.func = func
+
+    def execute(self):
+        """Run the call and record it on the backend"""
+        self.backend.round_trip()
+        with self.backend.lock:
+            self.backend.calls.append(self.method)
+            return self.func()
+
+class FakeBatchHttpRequest:
+    """A batch of deferred calls sent in one round trip, like googleapiclient's BatchHttpRequest"""
+
+    def __init__(self, backend, callback=None):
+        self.backend = backend
+        self.callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback or self.callback))
+
+    def execute(self):
+        self.backend.round_trip()
+        with self.backend.lock:
+            self.backend.calls.append('batch')
+            self.backend.batch_sizes.append(len(self._requests))
+            for request_id, request, callback in self._requests:
+                response, exception = None, None
+                try:
+                    response = request.func()
+                except HttpError as e:
+                    exception = e
+                if callback is not None:
+                    callback(request_id, response, exception)
+
+class _FakeFreeBusyResource:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def query(self, body):
+        return FakeRequest(self.backend, 'freebusy.query', lambda: self.backend._query_free_busy(body))
+
+class _FakeEventsResource:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def insert(self, calendarId, body, **kwargs):
+        return FakeRequest(self.backend, 'events.insert', lambda: self.backend._insert_event(calendarId, body))
+
+    def get(self, calendarId, eventId, **kwargs):
+        return FakeRequest(self.backend, 'events.get', lambda: self.backend._get_event(calendarId, eventId))
+
+    def update(self, calendarId, eventId, body, **kwargs):
+        return FakeRequest(self.backend, 'events.update', lambda: self.backend._update_event(calendarId, eventId, body, replace=True))
+
+    def patch(self, calendarId, eventId, body, **kwargs):
+        return FakeRequest(self.backend, 'events.patch', lambda: self.backend._update_event(calendarId, eventId, body, replace=False))
+
+    def delete(self, calendarId, eventId, **kwargs):
+        return FakeRequest(self.backend, 'events.delete', lambda: self.backend._delete_event(calendarId, eventId))
+
+    def list(self, calendarId, syncToken=None, pageToken=None, maxResults=250, **kwargs):
+        return FakeRequest(self.backend, 'events.list',
+                           lambda: self.backend._list_events(calendarId, syncToken, pageToken, maxResults))
+
+    def watch(self, calendarId, body, **kwargs):
+        return FakeRequest(self.backend, 'events.watch', lambda: self.backend._watch(calendarId, body))
+
+class FakeCalendarBackend:
+    """In-process stand-in for the Google Calendar v3 service resource.
+
+    Assign an instance to GoogleCalendarService.service (or pass it to the
+    constructor) to run the calendar code paths without network access.
+    Every executed call is recorded in `calls` so tests can count round trips.
+    `latency` adds a delay to every round trip, and calls from several
+    threads are applied one at a time, so load tests can share one backend.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.events_by_calendar = {}
+        self.calls = []
+        self.batch_sizes = []
+        self.channels = {}
+        self._sequence = 0
+        self._expired_before = {}
+
+    def freebusy(self):
+        return _FakeFreeBusyResource(self)
+
+    def events(self):
+        return _FakeEventsResource(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchHttpRequest(self, callback)
+
+    def round_trip(self):
+        """Wait as long as one request to the API takes"""
+        if self.latency:
+            time.sleep(self.latency)
+
+    def call_count(self, method=None):
+        """Count recorded calls, optionally only those of one method"""
+        if method is None:
+            return len(self.calls)
+        return sum(1 for call in self.calls if call == method)
+
+    def add_busy(self, calendar_id, start, end, summary='Busy'):
+        """Add an opaque event to a calendar without recording an API call"""
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        return self._insert_event(calendar_id, {
+            'summary': summary,
+            'start': {'dateTime': _format_time(start)},
+            'end': {'dateTime': _format_time(end)},
+        })
+
+    def expire_sync_tokens(self, calendar_id):
+        """Make every sync token issued so far for a calendar fail with 410 Gone"""
+        self._expired_before[calendar_id] = self._sequence + 1
+
+    def _calendar(self, calendar_id):
+        return self.events_by_calendar.setdefault(calendar_id, {})
+
+    def _touch(self, event):
+        self._sequence += 1
+        event['_sequence'] = self._sequence
+        event['updated'] = _format_time(datetime.now(timezone.utc))
+        return event
+
+    def _public(self, event):
+        return {key: value for key, value in event.items() if not key.startswith('_')}
+
+    def _query_free_busy(self, body):
+        time_min = _parse_time(body['timeMin'])
+        time_max = _parse_time(body['timeMax'])
+        calendars = {}
+
+        for item in body.get('items', []):
+            busy = []
+            for event in self._calendar(item['id']).values():
+                if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+                    continue
+                start = _parse_time(event['start']['dateTime'])
+                end = _parse_time(event['end']['dateTime'])
+                if start < time_max and end > time_min:
+                    busy.append((max(start, time_min), min(end, time_max)))
+
+            # The real API returns merged, sorted busy blocks
+            merged = []
+            for start, end in sorted(busy):
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+
+            calendars[item['id']] = {
+                'busy': [{'start': _format_time(start), 'end': _format_time(end)} for start, end in merged]
+            }
+
+        return {
+            'kind': 'calendar#freeBusy',
+            'timeMin': body['timeMin'],
+            'timeMax': body['timeMax'],
+            'calendars': calendars
+        }
+
+    def _insert_event(self, calendar_id, body):
+        event = dict(body)
+        event['id'] = body.get('id') or uuid.uuid4().hex
+        # Like the real API, an ID that was used before (even by a deleted event) is rejected
+        if event['id'] in self._calendar(calendar_id):
+            raise HttpError(httplib2.Response({'status': 409}),
+                            b'{"error": {"code": 409, "message": "The requested identifier already exists."}}')
+        event['status'] = 'confirmed'
+        event['htmlLink'] = f"https://calendar.google.com/calendar/event?eid={event['id']}"
+        if 'conferenceData' in body and 'createRequest' in body['conferenceData']:
+            event['hangoutLink'] = f"https://meet.google.com/{event['id'][:3]}-{event['id'][3:7]}-{event['id'][7:10]}"
+        self._calendar(calendar_id)[event['id']] = self._touch(event)
+        return self._public(event)
+
+    def _live_event(self, calendar_id, event_id):
+        event = self._calendar(calendar_id).get(event_id)
+        if event is None or event.get('status') == 'cancelled':
+            status = 410 if event is not None else 404
+            raise HttpError(httplib2.Response({'status': status}), b'{"error": {"message": "Not Found"}}')
+        return event
+
+    def _get_event(self, calendar_id, event_id):
+        return self._public(self._live_event(calendar_id, event_id))
+
+    def _update_event(self, calendar_id, event_id, body, replace):
+        event = self._live_event(calendar_id, event_id)
+        if replace:
+            event = dict(body, id=event_id, status=event.get('status', 'confirmed'))
+        else:
+            event = dict(event, **body)
+        self._calendar(calendar_id)[event_id] = self._touch(event)
+        return self._public(event)
+
+    def _delete_event(self, calendar_id, event_id):
+        event = self._live_event(calendar_id, event_id)
+        # Deleted events stay behind as cancelled tombstones for incremental sync
+        event['status'] = 'cancelled'
+        self._touch(event)
+        return ''
+
+    def _list_events(self, calendar_id, sync_token, page_token, max_results):
+        events = sorted(self._calendar(calendar_id).values(), key=lambda event: event['_sequence'])
+
+        if sync_token is not None:
+            since = int(sync_token)
+            if since < self._expired_before.get(calendar_id, 0):
+                raise HttpError(httplib2.Response({'status': 410}), b'{"error": {"code": 410, "message": "Gone"}}')
+            events = [event for event in events if event['_sequence'] > since]
+        else:
+            events = [event for event in events if event.get('status') != 'cancelled']
+
+        offset = int(page_token or 0)
+        page = events[offset:offset + max_results]
+        response = {'kind': 'calendar#events', 'items': [self._public(event) for event in page]}
+        if offset + max_results < len(events):
+            response['nextPageToken'] = str(offset + max_results)
+        else:
+            response['nextSyncToken'] = str(self._sequence)
+        return response
+
+    def _watch(self, calendar_id, body):
+        resource_id = uuid.uuid4().hex
+        self.channels[body['id']] = {'calendar_id': calendar_id, 'address': body.get('address'), 'resourceId': resource_id}
+        return {'kind': 'api#channel', 'id': body['id'], 'resourceId': resource_id, 'expiration': None}
@@ -0,0 +1,55 @@
+import itertools
+import json
+import threading
+import time
+from twilio.http import HttpClient
+from twilio.http.response import Response
+
+class FakeTwilioHttpClient(HttpClient):
+    """In-process stand-in for Twilio's REST endpoint, used as a twilio.rest.Client http_client.
+
+    Accepted messages are recorded in `messages`. Use fail_next() to answer
+    the next requests with an error status, such as 429 or 503. `latency`
+    adds a delay to every request, so that concurrency can be measured
+    without network access.
+    """
+
+    def __init__(self, latency=0.0):
+        """Initialize the fake endpoint"""
+        super().__init__(None, False)
+        self.latency = latency
+        self.messages = []
+        self.requests = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._sids = itertools.count(1)
+
+    def fail_next(self, status, count=1):
+        """Answer the next `count` requests with an error status"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None,
+                allow_redirects=False):
+        """Answer a Twilio API request the way the Messages endpoint would"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+            if self._failures:
+                status = self._failures.pop(0)
+                body = {'code': 20429 if status == 429 else 20500, 'message': f'Fake error {status}', 'status': status}
+                return Response(status, json.dumps(body))
+            if method != 'POST' or not url.endswith('/Messages.json'):
+                return Response(404, json.dumps({'code': 20404, 'message': 'Not found', 'status': 404}))
+
+            message = {
+                'sid': f"SM{next(self._sids):032x}",
+                'to': data.get('To'),
+                'from': data.get('From'),
+                'body': data.get('Body'),
+                'status': 'queued',
+            }
+            self.messages.append(message)
+        return Response(201, json.dumps(message))
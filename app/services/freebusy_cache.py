@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+# Rough memory cost of a cache entry and of each busy interval it holds
+ENTRY_OVERHEAD_BYTES = 256
+INTERVAL_BYTES = 160
+
+class FreeBusyCache:
+    """Thread-safe LRU cache of free/busy results keyed by calendar and time window.
+
+    Entries expire after a TTL, the least recently used entries are evicted
+    once either the entry or the memory cap is reached, and every entry of a
+    calendar is dropped when one of its events is created, updated or deleted.
+    """
+
+    def __init__(self, ttl_seconds=60, max_entries=1024, max_bytes=4 * 1024 * 1024,
+                 window_minutes=60, clock=time.monotonic):
+        """Initialize the cache"""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.window_minutes = window_minutes
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_calendar = {}
+        self._generations = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        """Create a cache configured by the FREEBUSY_CACHE_* environment variables"""
+        return cls(
+            ttl_seconds=float(os.getenv('FREEBUSY_CACHE_TTL', 60)),
+            max_entries=int(os.getenv('FREEBUSY_CACHE_MAX_ENTRIES', 1024)),
+            max_bytes=int(os.getenv('FREEBUSY_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+        )
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def window(self, start_time, end_time):
+        """Widen a time window to the cache granularity so nearby requests share an entry"""
+        granularity = timedelta(minutes=self.window_minutes)
+        floor = start_time.replace(minute=0, second=0, microsecond=0)
+        while floor + granularity <= start_time:
+            floor += granularity
+        ceiling = floor
+        while ceiling < end_time:
+            ceiling += granularity
+        return floor, ceiling
+
+    def generation(self, calendar_id):
+        """Return the invalidation counter of a calendar, used to discard stale writes"""
+        with self._lock:
+            return self._generations.get(calendar_id, 0)
+
+    def get(self, calendar_id, start_time, end_time):
+        """Return the cached busy periods for an exact window, or None on a miss"""
+        key = (calendar_id, start_time, end_time)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self.enabled:
+                self.misses += 1
+                return None
+
+            expires_at, busy_periods, size = entry
+            if expires_at <= self.clock():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(busy_periods)
+
+    def set(self, calendar_id, start_time, end_time, busy_periods, generation=None):
+        """Store busy periods, unless the calendar was invalidated since `generation` was read"""
+        if not self.enabled:
+            return
+
+        key = (calendar_id, start_time, end_time)
+        busy_periods = tuple(busy_periods)
+        size = ENTRY_OVERHEAD_BYTES + INTERVAL_BYTES * len(busy_periods)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generations.get(calendar_id, 0):
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (self.clock() + self.ttl_seconds, busy_periods, size)
+            self._keys_by_calendar.setdefault(calendar_id, set()).add(key)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, calendar_id):
+        """Drop every cached window of a calendar"""
+        with self._lock:
+            self._generations[calendar_id] = self._generations.get(calendar_id, 0) + 1
+            for key in list(self._keys_by_calendar.get(calendar_id, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_calendar.clear()
+            self._generations.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        """Return the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        calendar_keys = self._keys_by_calendar.get(key[0])
+        if calendar_keys is not None:
+            calendar_keys.discard(key)
+            if not calendar_keys:
+                del self._keys_by_calendar[key[0]]
+
+# Shared by every GoogleCalendarService in the process
+freebusy_cache = FreeBusyCache.from_env()
@@ -1,77 +1,258 @@
+import logging
 import os
-import json
-import pickle
-from datetime import datetime, timedelta
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from datetime import datetime, timedelta, timezone
+from flask import current_app, has_app_context
+from googleapiclient.errors import HttpError
+from app.services.availability_grid import AvailabilityGrid
+from app.services.busy_index import BusyIndex
+from app.services.calendar_client import calendar_client, execute, execute_batch
+from app.services.freebusy_cache import freebusy_cache
+from app.services.calendar_mirror import calendar_mirror, mirror_enabled
 
-# Define the scopes
-SCOPES = [
-    'https://www.googleapis.com/auth/calendar',
-    'https://www.googleapis.com/auth/calendar.events'
-]
+logger = logging.getLogger(__name__)
+
+# Maximum number of calendars the freebusy API accepts in a single query
+FREEBUSY_MAX_CALENDARS = 50
+
+# Maximum number of calls sent in one batch HTTP request
+BATCH_MAX_REQUESTS = 50
 
 class GoogleCalendarService:
     """Service for interacting with Google Calendar API"""
     
-    def __init__(self):
+    def __init__(self, service=None, cache=None, mirror=None, client=None):
         """Initialize the Google Calendar service"""
         self.credentials = None
-        self.service = None
-        self.token_path = 'token.pickle'
-        self.client_secret_file = 'client-secret.json'
+        self.service = service
+        self.freebusy_cache = cache if cache is not None else freebusy_cache
+        self.calendar_mirror = mirror if mirror is not None else calendar_mirror
+        self.calendar_client = client if client is not None else calendar_client
         
     def authenticate(self):
         """Authenticate with Google Calendar API"""
-        # Check if token.pickle exists
-        if os.path.exists(self.token_path):
-            with open(self.token_path, 'rb') as token:
-                self.credentials = pickle.load(token)
-        
-        # If credentials don't exist or are invalid, get new ones
-        if not self.credentials or not self.credentials.valid:
-            if self.credentials and self.credentials.expired and self.credentials.refresh_token:
-                self.credentials.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.client_secret_file, SCOPES)
-                self.credentials = flow.run_local_server(port=0)
-            
-            # Save the credentials for the next run
-            with open(self.token_path, 'wb') as token:
-                pickle.dump(self.credentials, token)
-        
-        # Build the service
-        self.service = build('calendar', 'v3', credentials=self.credentials)
-        return self.service
+        # Credentials and the discovery document are shared by the whole process
+        self.credentials = self.calendar_client.get_credentials()
+        return self.calendar_client.get_service()
     
     def get_calendar_service(self):
         """Get the authenticated calendar service"""
-        if not self.service:
-            self.authenticate()
-        return self.service
+        if self.service:
+            return self.service
+        # Not kept on the instance: the service may be used from another thread later
+        return self.authenticate()
     
     def get_free_busy(self, calendar_id, start_time, end_time):
-        """Get free/busy information for a calendar"""
+        """Get free/busy information for one calendar or a list of calendars"""
         service = self.get_calendar_service()
+        calendar_ids = calendar_id if isinstance(calendar_id, (list, tuple)) else [calendar_id]
         
         body = {
-            "timeMin": start_time.isoformat() + 'Z',
-            "timeMax": end_time.isoformat() + 'Z',
-            "items": [{"id": calendar_id}]
+            "timeMin": self._format_query_time(start_time),
+            "timeMax": self._format_query_time(end_time),
+            "items": [{"id": cal_id} for cal_id in calendar_ids]
         }
         
         free_busy_request = service.freebusy().query(body=body)
-        free_busy_response = free_busy_request.execute()
+        free_busy_response = execute(free_busy_request)
         
         return free_busy_response
     
-    def create_event(self, calendar_id, summary, description, start_time, end_time, attendees):
-        """Create a calendar event"""
+    def get_busy_periods_batch(self, calendar_ids, start_time, end_time):
+        """Get busy periods for many calendars with one freebusy query per 50 calendars.
+        
+        Mirrored calendars are answered from the local calendar mirror when it is
+        enabled, then results are served from the free/busy cache where possible;
+        only calendars that miss both are queried, over the widened cache window.
+        """
+        busy_by_calendar = {}
+        unique_ids = list(dict.fromkeys(calendar_ids))
+        cache = self.freebusy_cache
+        window_start, window_end = cache.window(start_time, end_time)
+        
+        missing_ids = []
+        generations = {}
+        for calendar_id in unique_ids:
+            mirrored = self._get_mirrored_busy_periods(calendar_id, window_start, window_end)
+            if mirrored is not None:
+                busy_by_calendar[calendar_id] = mirrored
+                continue
+            
+            cached = cache.get(calendar_id, window_start, window_end)
+            if cached is None:
+                generations[calendar_id] = cache.generation(calendar_id)
+                missing_ids.append(calendar_id)
+            else:
+                busy_by_calendar[calendar_id] = cached
+        
+        for i in range(0, len(missing_ids), FREEBUSY_MAX_CALENDARS):
+            chunk = missing_ids[i:i + FREEBUSY_MAX_CALENDARS]
+            free_busy_response = self.get_free_busy(chunk, window_start, window_end)
+            calendars = free_busy_response.get('calendars', {})
+            
+            for calendar_id in chunk:
+                calendar = calendars.get(calendar_id, {})
+                busy_periods = [
+                    (self._parse_busy_time(busy_time['start']), self._parse_busy_time(busy_time['end']))
+                    for busy_time in calendar.get('busy', [])
+                ]
+                if calendar.get('errors'):
+                    logger.warning('Free/busy errors for calendar %s: %s', calendar_id, calendar['errors'])
+                else:
+                    cache.set(calendar_id, window_start, window_end, busy_periods, generations[calendar_id])
+                busy_by_calendar[calendar_id] = busy_periods
+        
+        # Clip the widened cache window back to the requested one
+        clipped = {}
+        for calendar_id in unique_ids:
+            clipped[calendar_id] = []
+            for start, end in busy_by_calendar[calendar_id]:
+                start = self._match_awareness(start, start_time)
+                end = self._match_awareness(end, start_time)
+                if start < end_time and end > start_time:
+                    clipped[calendar_id].append((max(start, start_time), min(end, end_time)))
+        return clipped
+    
+    def _get_mirrored_busy_periods(self, calendar_id, start_time, end_time):
+        """Read busy periods from the local calendar mirror, or None if it cannot answer"""
+        if not mirror_enabled():
+            return None
+        try:
+            # The mirror stores naive UTC, like naive search windows
+            mirrored = self.calendar_mirror.busy_periods(
+                calendar_id,
+                self._match_awareness(start_time, datetime.min),
+                self._match_awareness(end_time, datetime.min)
+            )
+        except Exception as e:
+            logger.error('Error reading calendar mirror for %s: %s', calendar_id, e)
+            return None
+        if mirrored is None:
+            return None
+        return [(start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)) for start, end in mirrored]
+    
+    def sync_calendar(self, calendar_id):
+        """Sync the local mirror of a calendar with incremental sync tokens"""
+        changed = self.calendar_mirror.sync(self.get_calendar_service(), calendar_id)
+        self.freebusy_cache.invalidate(calendar_id)
+        return changed
+    
+    def _calendar_changed(self, calendar_id):
+        """Forget cached and mirrored busy periods of a calendar after writing an event to it"""
+        self.freebusy_cache.invalidate(calendar_id)
+        if not mirror_enabled():
+            return
+        self.calendar_mirror.mark_stale(calendar_id)
+        # Free/busy answers for the calendar until the sync worker has caught up
+        worker = current_app.extensions.get('calendar_sync_worker') if has_app_context() else None
+        if worker:
+            worker.request_sync(calendar_id)
+    
+    def watch_calendar(self, calendar_id, address):
+        """Register a push-notification channel that triggers mirror syncs for a calendar"""
+        return self.calendar_mirror.watch(self.get_calendar_service(), calendar_id, address)
+    
+    def _format_query_time(self, value):
+        """Format a datetime as an RFC 3339 UTC timestamp, treating naive values as UTC"""
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat() + 'Z'
+    
+    def create_event(self, calendar_id, summary, description, start_time, end_time, attendees, multi_call=None,
+                     event_id=None):
+        """Create a calendar event.
+        
+        By default the event is created with a single insert that carries the reminders,
+        the conference request and the description; the Meet link is returned in
+        event['hangoutLink'] for the caller to store or send. Pass multi_call=True (or set
+        CALENDAR_EVENT_MULTI_CALL) for the old insert/update/patch sequence that also writes
+        the Meet link into the event description.
+        
+        With an event_id the insert is idempotent: when an event with that ID
+        already exists (409), it is fetched and returned instead.
+        """
         service = self.get_calendar_service()
+        if multi_call is None:
+            multi_call = os.getenv('CALENDAR_EVENT_MULTI_CALL', '').lower() in ('1', 'true', 'yes')
+        
+        logger.debug('Creating calendar event:')
+        logger.debug('Calendar ID: %s', calendar_id)
+        logger.debug('Summary: %s', summary)
+        logger.debug('Start time: %s', start_time)
+        logger.debug('End time: %s', end_time)
+        logger.debug('Attendees: %s', attendees)
         
+        event = self._build_event_body(calendar_id, summary, description, start_time, end_time, attendees)
+        if event_id:
+            event['id'] = event_id
+        
+        try:
+            logger.debug('Inserting event into calendar...')
+            try:
+                event = execute(service.events().insert(
+                    calendarId=calendar_id,
+                    body=event,
+                    sendUpdates='all',  # Ensure notifications are sent
+                    conferenceDataVersion=1,
+                    sendNotifications=True  # Explicitly enable notifications
+                ))
+            except HttpError as e:
+                # An earlier attempt created the event, but its caller never recorded it
+                if not event_id or e.resp.status != 409:
+                    raise
+                logger.info('Event %s already exists, using it instead of creating another', event_id)
+                event = execute(service.events().get(calendarId=calendar_id, eventId=event_id))
+                multi_call = False
+            
+            logger.info('Event created successfully with ID: %s', event.get('id'))
+            
+            # Add the Google Meet link to the event description
+            if multi_call and 'hangoutLink' in event:
+                logger.debug('Adding Google Meet link: %s', event['hangoutLink'])
+                event['description'] = f"{description}\n\nGoogle Meet Link: {event['hangoutLink']}"
+                event = execute(service.events().update(
+                    calendarId=calendar_id,
+                    eventId=event['id'],
+                    body=event,
+                    sendUpdates='all',
+                    sendNotifications=True  # Explicitly enable notifications for update
+                ))
+                logger.debug('Google Meet link added to event description')
+            
+            # Format the event ID for the calendar URL
+            event['id'] = event['id'].replace('@google.com', '')
+            
+            # Verify attendees
+            if 'attendees' in event:
+                logger.debug('Event attendees:')
+                for attendee in event['attendees']:
+                    logger.debug('- %s: %s', attendee.get('email'), attendee.get('responseStatus'))
+            
+            # Create a proper calendar URL
+            event['htmlLink'] = f"https://calendar.google.com/calendar/event?eid={event['id']}"
+            
+            # Send a reminder update to ensure notifications are sent
+            if multi_call:
+                execute(service.events().patch(
+                    calendarId=calendar_id,
+                    eventId=event['id'],
+                    body={'reminders': {'useDefault': False, 'overrides': [
+                        {'method': 'email', 'minutes': 24 * 60},
+                        {'method': 'popup', 'minutes': 30}
+                    ]}},
+                    sendUpdates='all',
+                    sendNotifications=True
+                ))
+                logger.debug('Sent reminder notifications')
+            
+            return event
+        except Exception as e:
+            logger.exception('Error creating calendar event: %s', e)
+            raise
+        finally:
+            self._calendar_changed(calendar_id)
+    
+    def _build_event_body(self, calendar_id, summary, description, start_time, end_time, attendees):
+        """Build the events().insert body for an interview event"""
         # Convert times to UTC if they're not already
         if start_time.tzinfo is None:
             start_time = start_time.replace(tzinfo=datetime.now().astimezone().tzinfo)
@@ -79,17 +260,10 @@ class GoogleCalendarService:
             end_time = end_time.replace(tzinfo=datetime.now().astimezone().tzinfo)
         
         # Convert to UTC
-        start_time_utc = start_time.astimezone(datetime.now().astimezone().tzinfo.utc)
-        end_time_utc = end_time.astimezone(datetime.now().astimezone().tzinfo.utc)
+        start_time_utc = start_time.astimezone(timezone.utc)
+        end_time_utc = end_time.astimezone(timezone.utc)
         
-        print(f"Creating calendar event:")
-        print(f"Calendar ID: {calendar_id}")
-        print(f"Summary: {summary}")
-        print(f"Start time: {start_time_utc}")
-        print(f"End time: {end_time_utc}")
-        print(f"Attendees: {attendees}")
-        
-        event = {
+        return {
             'summary': summary,
             'description': description,
             'start': {
@@ -118,70 +292,104 @@ class GoogleCalendarService:
             'guestsCanModify': False,
             'guestsCanSeeOtherGuests': True
         }
+    
+    def create_events_batch(self, events):
+        """Create many interview events through batched HTTP requests.
         
-        try:
-            print("Inserting event into calendar...")
-            event = service.events().insert(
-                calendarId=calendar_id,
-                body=event,
-                sendUpdates='all',  # Ensure notifications are sent
-                conferenceDataVersion=1,
-                sendNotifications=True  # Explicitly enable notifications
-            ).execute()
-            
-            print(f"Event created successfully with ID: {event.get('id')}")
-            
-            # Add the Google Meet link to the event description
-            if 'hangoutLink' in event:
-                print(f"Adding Google Meet link: {event['hangoutLink']}")
-                event['description'] = f"{description}\n\nGoogle Meet Link: {event['hangoutLink']}"
-                event = service.events().update(
-                    calendarId=calendar_id,
-                    eventId=event['id'],
-                    body=event,
-                    sendUpdates='all',
-                    sendNotifications=True  # Explicitly enable notifications for update
-                ).execute()
-                print("Google Meet link added to event description")
-            
-            # Format the event ID for the calendar URL
-            event['id'] = event['id'].replace('@google.com', '')
-            
-            # Verify attendees
-            if 'attendees' in event:
-                print("Event attendees:")
-                for attendee in event['attendees']:
-                    print(f"- {attendee.get('email')}: {attendee.get('responseStatus')}")
-            
-            # Create a proper calendar URL
-            event['htmlLink'] = f"https://calendar.google.com/calendar/event?eid={event['id']}"
-            
-            # Send a reminder update to ensure notifications are sent
-            service.events().patch(
+        `events` maps a caller key (e.g. an interview ID) to a dict with calendar_id, summary,
+        description, start_time, end_time and attendees, and optionally an event_id that makes
+        the insert idempotent like in create_event. Returns a dict mapping each key to
+        (event, exception), where exactly one of the two is set.
+        """
+        requests = {}
+        for key, spec in events.items():
+            body = self._build_event_body(spec['calendar_id'], spec['summary'], spec['description'],
+                                          spec['start_time'], spec['end_time'], spec['attendees'])
+            if spec.get('event_id'):
+                body['id'] = spec['event_id']
+            requests[key] = lambda service, calendar_id=spec['calendar_id'], body=body: service.events().insert(
                 calendarId=calendar_id,
-                eventId=event['id'],
-                body={'reminders': {'useDefault': False, 'overrides': [
-                    {'method': 'email', 'minutes': 24 * 60},
-                    {'method': 'popup', 'minutes': 30}
-                ]}},
+                body=body,
                 sendUpdates='all',
+                conferenceDataVersion=1,
                 sendNotifications=True
-            ).execute()
-            print("Sent reminder notifications")
+            )
+        
+        try:
+            results = self._execute_batch(requests)
             
-            return event
-        except Exception as e:
-            print(f"Error creating calendar event: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
+            # Events an earlier attempt created (409) are fetched instead of failing
+            existing = {
+                key: lambda service, calendar_id=events[key]['calendar_id'], event_id=events[key]['event_id']:
+                    service.events().get(calendarId=calendar_id, eventId=event_id)
+                for key, (_, exception) in results.items()
+                if events[key].get('event_id')
+                and getattr(getattr(exception, 'resp', None), 'status', None) == 409
+            }
+            if existing:
+                logger.info('%s events already existed, using them instead of creating others', len(existing))
+                results.update(self._execute_batch(existing))
+        finally:
+            for calendar_id in {spec['calendar_id'] for spec in events.values()}:
+                self._calendar_changed(calendar_id)
+        
+        for event, exception in results.values():
+            if event is not None:
+                event['id'] = event['id'].replace('@google.com', '')
+                event['htmlLink'] = f"https://calendar.google.com/calendar/event?eid={event['id']}"
+        return results
+    
+    def delete_events_batch(self, events):
+        """Delete many calendar events through batched HTTP requests.
+        
+        `events` maps a caller key to a (calendar_id, event_id) tuple. Returns a dict mapping
+        each key to (deleted, exception); events that were already gone count as deleted.
+        """
+        requests = {
+            key: lambda service, calendar_id=calendar_id, event_id=event_id: service.events().delete(
+                calendarId=calendar_id, eventId=event_id, sendUpdates='all')
+            for key, (calendar_id, event_id) in events.items()
+        }
+        
+        try:
+            results = self._execute_batch(requests)
+        finally:
+            for calendar_id, _ in events.values():
+                self._calendar_changed(calendar_id)
+        
+        deleted = {}
+        for key, (response, exception) in results.items():
+            if exception is not None and getattr(getattr(exception, 'resp', None), 'status', None) in (404, 410):
+                deleted[key] = (True, None)
+            else:
+                deleted[key] = (exception is None, exception)
+        return deleted
+    
+    def _execute_batch(self, requests):
+        """Send request builders in BatchHttpRequest chunks of up to 50 and map results back to their keys"""
+        service = self.get_calendar_service()
+        results = {}
+        keys = list(requests)
+        
+        def callback(request_id, response, exception):
+            results[keys[int(request_id)]] = (response, exception)
+        
+        for i in range(0, len(keys), BATCH_MAX_REQUESTS):
+            batch = service.new_batch_http_request(callback=callback)
+            batched = []
+            for index in range(i, min(i + BATCH_MAX_REQUESTS, len(keys))):
+                batched.append(requests[keys[index]](service))
+                batch.add(batched[-1], request_id=str(index))
+            execute_batch(batch, batched)
+        
+        return results
     
     def update_event(self, calendar_id, event_id, summary=None, description=None, start_time=None, end_time=None, attendees=None):
         """Update a calendar event"""
         service = self.get_calendar_service()
         
         # Get the existing event
-        event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+        event = execute(service.events().get(calendarId=calendar_id, eventId=event_id))
         
         # Update fields if provided
         if summary:
@@ -195,102 +403,100 @@ class GoogleCalendarService:
         if attendees:
             event['attendees'] = attendees
         
-        updated_event = service.events().update(calendarId=calendar_id, eventId=event_id, body=event, sendUpdates='all').execute()
+        try:
+            updated_event = execute(service.events().update(calendarId=calendar_id, eventId=event_id, body=event, sendUpdates='all'))
+        finally:
+            self._calendar_changed(calendar_id)
         return updated_event
     
     def delete_event(self, calendar_id, event_id):
         """Delete a calendar event"""
         service = self.get_calendar_service()
-        service.events().delete(calendarId=calendar_id, eventId=event_id, sendUpdates='all').execute()
+        try:
+            execute(service.events().delete(calendarId=calendar_id, eventId=event_id, sendUpdates='all'))
+        finally:
+            self._calendar_changed(calendar_id)
         return True
     
     def find_available_slots(self, calendar_id, start_date, end_date, duration_minutes=60, working_hours=(9, 17)):
         """Find available time slots in a calendar"""
+        # Convert dates to datetime objects if they're not already
+        if isinstance(start_date, str):
+            start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        if isinstance(end_date, str):
+            end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        
+        slots_by_calendar = self.find_available_slots_batch(
+            [calendar_id], start_date, end_date, duration_minutes, working_hours)
+        return slots_by_calendar[calendar_id]
+    
+    def find_available_slots_batch(self, calendar_ids, start_date, end_date, duration_minutes=60, working_hours=(9, 17)):
+        """Find available time slots for several calendars using batched free/busy queries"""
+        availability = self.get_availability_batch(calendar_ids, start_date, end_date, duration_minutes, working_hours)
+        return {calendar_id: result['slots'] for calendar_id, result in availability.items()}
+    
+    def get_availability_batch(self, calendar_ids, start_date, end_date, duration_minutes=60, working_hours=(9, 17),
+                               windows=None):
+        """Get busy periods and free slots for several calendars, keyed by calendar ID.
+        
+        When windows is given, only slots inside one of those (start, end) windows are returned.
+        """
         try:
-            service = self.get_calendar_service()
-            
-            # Convert dates to datetime objects if they're not already
-            if isinstance(start_date, str):
-                start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            if isinstance(end_date, str):
-                end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            
-            # Get busy times from the calendar
+            # Get busy times from all calendars
             try:
-                free_busy_response = self.get_free_busy(calendar_id, start_date, end_date)
-                busy_times = []
-                
-                if 'calendars' in free_busy_response and calendar_id in free_busy_response['calendars']:
-                    busy_times = free_busy_response['calendars'][calendar_id]['busy']
+                busy_by_calendar = self.get_busy_periods_batch(calendar_ids, start_date, end_date)
             except Exception as e:
-                print(f"Error getting free/busy information: {e}")
+                logger.error('Error getting free/busy information: %s', e)
                 # Return some default available slots for testing
-                return self._generate_default_slots(start_date, end_date, duration_minutes, working_hours)
-            
-            # Convert busy times to datetime objects
-            busy_periods = []
-            for busy_time in busy_times:
-                start = datetime.fromisoformat(busy_time['start'].replace('Z', '+00:00'))
-                end = datetime.fromisoformat(busy_time['end'].replace('Z', '+00:00'))
-                busy_periods.append((start, end))
+                return self._default_availability(calendar_ids, start_date, end_date, duration_minutes, working_hours,
+                                                  windows)
             
-            # Find available slots
-            available_slots = []
-            current_date = start_date
+            # Slot search for every calendar runs at once on a minute grid
+            grid = AvailabilityGrid(start_date, end_date)
+            slots_by_calendar = grid.free_slots_many(busy_by_calendar, duration_minutes, working_hours, windows)
             
-            while current_date < end_date:
-                # Only consider working hours
-                day_start = current_date.replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
-                day_end = current_date.replace(hour=working_hours[1], minute=0, second=0, microsecond=0)
-                
-                # Skip if current_date is already past working hours for today
-                if current_date.hour >= working_hours[1]:
-                    current_date = (current_date + timedelta(days=1)).replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
-                    continue
-                
-                # Skip weekends (assuming 0 is Monday and 6 is Sunday in weekday())
-                if current_date.weekday() >= 5:  # Saturday or Sunday
-                    current_date = current_date + timedelta(days=1)
-                    current_date = current_date.replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
-                    continue
-                
-                # Start from current time or beginning of working hours, whichever is later
-                slot_start = max(current_date, day_start)
-                
-                while slot_start < day_end:
-                    slot_end = slot_start + timedelta(minutes=duration_minutes)
-                    
-                    # Check if slot exceeds day_end
-                    if slot_end > day_end:
-                        break
-                    
-                    # Check if slot overlaps with any busy period
-                    is_available = True
-                    for busy_start, busy_end in busy_periods:
-                        if (slot_start < busy_end and slot_end > busy_start):
-                            is_available = False
-                            # Move slot_start to the end of this busy period
-                            slot_start = busy_end
-                            break
-                    
-                    if is_available:
-                        available_slots.append((slot_start, slot_end))
-                        slot_start = slot_end
-                    
-                # Move to the next day
-                current_date = (current_date + timedelta(days=1)).replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
+            availability = {}
+            for calendar_id, busy_periods in busy_by_calendar.items():
+                availability[calendar_id] = {
+                    'busy': list(BusyIndex(busy_periods)),
+                    'slots': slots_by_calendar[calendar_id]
+                }
             
-            return available_slots
+            return availability
         except Exception as e:
-            print(f"Error finding available slots: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Error finding available slots: %s', e)
             # Return some default available slots for testing
-            return self._generate_default_slots(start_date, end_date, duration_minutes, working_hours)
+            return self._default_availability(calendar_ids, start_date, end_date, duration_minutes, working_hours,
+                                              windows)
+    
+    def _default_availability(self, calendar_ids, start_date, end_date, duration_minutes, working_hours, windows=None):
+        """Build the default availability for calendars whose free/busy could not be fetched"""
+        default_slots = self._generate_default_slots(start_date, end_date, duration_minutes, working_hours)
+        if windows is not None:
+            default_slots = [
+                (slot_start, slot_end) for slot_start, slot_end in default_slots
+                if any(window_start <= slot_start and slot_end <= window_end for window_start, window_end in windows)
+            ]
+        return {calendar_id: {'busy': [], 'slots': list(default_slots)} for calendar_id in calendar_ids}
+    
+    def _parse_busy_time(self, value):
+        """Parse a free/busy timestamp into an aware datetime"""
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    
+    def _match_awareness(self, value, reference):
+        """Convert an aware datetime to naive UTC when the search window is naive"""
+        # get_free_busy sends naive windows as UTC, so compare naive windows against naive UTC
+        if reference.tzinfo is None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    
+    def _find_free_slots(self, busy_periods, start_date, end_date, duration_minutes=60, working_hours=(9, 17)):
+        """Find free slots of duration_minutes within working hours, packed from the start of each free gap"""
+        return AvailabilityGrid(start_date, end_date).free_slots(busy_periods, duration_minutes, working_hours)
     
     def _generate_default_slots(self, start_date, end_date, duration_minutes=60, working_hours=(9, 17)):
         """Generate default available slots for testing"""
-        print("Generating default available slots for testing")
+        logger.info('Generating default available slots for testing')
         available_slots = []
         current_date = start_date
         
@@ -316,13 +522,11 @@ class GoogleCalendarService:
         """Get details of a specific event"""
         service = self.get_calendar_service()
         try:
-            event = service.events().get(
+            event = execute(service.events().get(
                 calendarId=calendar_id,
                 eventId=event_id
-            ).execute()
+            ))
             return event
         except Exception as e:
-            print(f"Error getting event details: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Error getting event details: %s', e)
             return None 
\ No newline at end of file
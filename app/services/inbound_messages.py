@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+from collections import deque
+from app.logging_config import mask_phone
+from app.services.conversation_store import normalize_phone_number
+from app.services.message_dedupe import processed_messages
+from app.services.outbound_sender import send_message
+
+logger = logging.getLogger(__name__)
+
+def async_webhook_enabled():
+    """Return whether the webhook acknowledges messages at once and answers them in the background"""
+    return os.getenv('WEBHOOK_ASYNC', 'false').lower() in ('1', 'true', 'yes')
+
+class InboundMessageQueue:
+    """Inbound messages waiting to be handled by a pool of background workers.
+
+    Messages from the same number are handled in the order they arrived,
+    one at a time; different numbers are handled in parallel. Each job
+    handles a single message and queues the next one from the same number
+    behind everything already waiting, so one busy number cannot hold a
+    worker for long. Replies go out through the outbound sender, which
+    paces and retries them without handling the message again.
+
+    The queue lives in this process's memory only. Twilio got a 200 for
+    every queued message, so it does not redeliver them: messages still
+    waiting when the process stops or crashes are lost.
+    """
+
+    def __init__(self, job_queue, handle_message):
+        """Initialize the queue on top of a BackgroundJobQueue"""
+        self.job_queue = job_queue
+        self.handle_message = handle_message
+
+        self._lock = threading.Lock()
+        self._pending = {}  # phone number -> deque of (from_number, body, message_sid)
+
+        self.received = 0
+        self.handled = 0
+
+    def submit(self, from_number, body, message_sid=None):
+        """Queue a message for handling and return right away"""
+        key = normalize_phone_number(from_number)
+        with self._lock:
+            self.received += 1
+            messages = self._pending.get(key)
+            if messages is not None:
+                # A job for this number is already queued or running; it picks this message up next
+                messages.append((from_number, body, message_sid))
+                return
+            self._pending[key] = deque([(from_number, body, message_sid)])
+        self.job_queue.submit(self._handle_next, key)
+
+    def pending_count(self):
+        """Return the number of messages not handled yet"""
+        with self._lock:
+            return sum(len(messages) for messages in self._pending.values())
+
+    def _handle_next(self, key):
+        with self._lock:
+            from_number, body, message_sid = self._pending[key][0]
+
+        try:
+            if message_sid and processed_messages.get(message_sid) is not None:
+                # A redelivery of a message that was answered already; its reply went out then
+                logger.info('Message %s was already processed, not replying again', message_sid)
+                return
+            response = self.handle_message(from_number, body, message_sid)
+            if response:
+                send_message(from_number, response)
+        except Exception as e:
+            logger.exception('Error handling queued message from %s: %s', mask_phone(key), e)
+        finally:
+            with self._lock:
+                self.handled += 1
+                messages = self._pending[key]
+                messages.popleft()
+                more = bool(messages)
+                if not more:
+                    del self._pending[key]
+            if more:
+                self.job_queue.submit(self._handle_next, key)
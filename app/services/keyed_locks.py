@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+
+class KeyedLocks:
+    """One lock per key, created on demand and dropped once nobody holds or waits for it.
+
+    Work for the same key runs one at a time while work for different keys
+    runs in parallel. The locks are local to this process.
+    """
+
+    def __init__(self):
+        """Initialize the lock table"""
+        self._guard = threading.Lock()
+        self._locks = {}  # key -> [lock, number of threads holding or waiting]
+
+    @contextmanager
+    def hold(self, key):
+        """Hold the lock of key for the duration of the block"""
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        lock = entry[0]
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def active_keys(self):
+        """Return the number of keys currently held or waited for"""
+        with self._guard:
+            return len(self._locks)
+
+# Shared by every handler in the process, so messages from one number never interleave
+phone_locks = KeyedLocks()
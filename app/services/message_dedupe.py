@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from app.models.database import after_commit, db
+from app.models.models import ProcessedMessage
+from app.services.background_jobs import submit_job
+
+logger = logging.getLogger(__name__)
+
+class ProcessedMessageStore:
+    """Replies already sent for inbound messages, keyed by Twilio MessageSid.
+
+    Twilio redelivers a message when the webhook is slow to answer. A
+    redelivery is answered with the recorded reply, without running the
+    conversation again. Replies are recorded in the processed_message table
+    in the same transaction as the rest of the message, and kept in a
+    bounded LRU cache once committed. Rows older than the TTL are purged by
+    a background job at most once per cleanup interval.
+    """
+
+    def __init__(self, ttl_seconds=86400, max_entries=10000, cleanup_interval=3600, clock=time.monotonic):
+        """Initialize the store"""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cleanup_interval = cleanup_interval
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # message_sid -> (expires_at, response)
+        self._next_cleanup = clock() + cleanup_interval
+
+        self.duplicates = 0
+
+    @classmethod
+    def from_env(cls):
+        """Create a store configured by the MESSAGE_DEDUPE_* environment variables"""
+        return cls(
+            ttl_seconds=float(os.getenv('MESSAGE_DEDUPE_TTL', 86400)),
+            max_entries=int(os.getenv('MESSAGE_DEDUPE_MAX_ENTRIES', 10000)),
+            cleanup_interval=float(os.getenv('MESSAGE_DEDUPE_CLEANUP_INTERVAL', 3600))
+        )
+
+    def get(self, message_sid):
+        """Return the recorded reply to a message, or None when it was not processed yet"""
+        response = self._cached(message_sid)
+        if response is None:
+            row = db.session.query(ProcessedMessage.response, ProcessedMessage.created_at).filter_by(
+                message_sid=message_sid).first()
+            if row is None or row.created_at < datetime.utcnow() - timedelta(seconds=self.ttl_seconds):
+                return None
+            response = row.response
+            self._store(message_sid, response)
+
+        with self._lock:
+            self.duplicates += 1
+        return response
+
+    def record(self, message_sid, phone_number, response):
+        """Record the reply to a message as part of the current transaction"""
+        db.session.add(ProcessedMessage(message_sid=message_sid, phone_number=phone_number, response=response))
+        after_commit(self._store, message_sid, response)
+
+        now = self.clock()
+        with self._lock:
+            cleanup_due = now >= self._next_cleanup
+            if cleanup_due:
+                self._next_cleanup = now + self.cleanup_interval
+        if cleanup_due:
+            submit_job(purge_processed_messages, self.ttl_seconds)
+
+    def clear(self):
+        """Drop all cached entries and reset the counter"""
+        with self._lock:
+            self._entries.clear()
+            self.duplicates = 0
+
+    def _cached(self, message_sid):
+        with self._lock:
+            entry = self._entries.get(message_sid)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= self.clock():
+                del self._entries[message_sid]
+                return None
+            self._entries.move_to_end(message_sid)
+            return response
+
+    def _store(self, message_sid, response):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[message_sid] = (self.clock() + self.ttl_seconds, response)
+            self._entries.move_to_end(message_sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+def purge_processed_messages(ttl_seconds):
+    """Delete processed messages older than the TTL; returns how many were deleted"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+    deleted = ProcessedMessage.query.filter(ProcessedMessage.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    if deleted:
+        logger.info('Purged %s processed messages older than %.0fs', deleted, ttl_seconds)
+    return deleted
+
+# Shared by every webhook handler in the process
+processed_messages = ProcessedMessageStore.from_env()
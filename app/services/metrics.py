@@ -0,0 +1,279 @@
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.services.conversation_store import normalize_phone_number
+
+# Upper bounds, in seconds, of the latency histogram buckets: 1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the API-calls-per-message histogram buckets
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+# Prometheus names of the metric families, with their help text
+FAMILIES = {
+    'stage_seconds': ('histogram', 'Time spent in each stage of the webhook pipeline'),
+    'api_call_seconds': ('histogram', 'Duration of Google Calendar and Twilio API calls'),
+    'api_calls_total': ('counter', 'Google Calendar and Twilio API calls, batched calls counted one by one'),
+    'api_errors_total': ('counter', 'Google Calendar and Twilio API calls that raised an error'),
+    'api_calls_per_message': ('histogram', 'API calls made while handling one inbound message'),
+}
+
+class Histogram:
+    """Cumulative-bucket histogram with a sum and a count, as Prometheus expects"""
+
+    def __init__(self, buckets):
+        """Initialize an empty histogram"""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add a value; callers hold the registry lock"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """Return (upper bound, count of values at or below it) for every bucket, ending with +Inf"""
+        bounds = [*self.buckets, float('inf')]
+        running = 0
+        cumulative = []
+        for bound, count in zip(bounds, self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative
+
+class _Timer:
+    """Context manager that observes its elapsed time in a histogram when it exits"""
+
+    __slots__ = ('registry', 'family', 'labels', 'started')
+
+    def __init__(self, registry, family, labels):
+        self.registry = registry
+        self.family = family
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.family, self.labels, time.perf_counter() - self.started)
+        return False
+
+class _ApiCall(_Timer):
+    """Timer for one API call that also counts it, its errors and its conversation"""
+
+    __slots__ = ('conversation',)
+
+    def __init__(self, registry, labels, conversation):
+        super().__init__(registry, 'api_call_seconds', labels)
+        self.conversation = conversation
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        self.registry.count_api_call(self.labels[0][1], self.labels[1][1], conversation=self.conversation)
+        if exc_type is not None:
+            self.registry.increment('api_errors_total', self.labels)
+        return False
+
+class _ConversationScope:
+    """Attributes the API calls made on this thread to one conversation until it exits"""
+
+    __slots__ = ('registry', 'key', 'per_message', 'calls', '_outer')
+
+    def __init__(self, registry, key, per_message):
+        self.registry = registry
+        self.key = key
+        self.per_message = per_message
+        self.calls = 0
+
+    def __enter__(self):
+        local = self.registry._local
+        self._outer = getattr(local, 'scope', None)
+        local.scope = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry._local.scope = self._outer
+        if self.per_message:
+            self.registry.observe('api_calls_per_message', (), self.calls)
+        return False
+
+class _NullContext:
+    """Stand-in for every timer and scope while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_CONTEXT = _NullContext()
+
+class MetricsRegistry:
+    """Per-process latency histograms and API call counters, rendered in the Prometheus text format.
+
+    stage() times a step of the webhook pipeline and api_call() a Google
+    Calendar or Twilio request. API calls made inside a conversation() scope
+    are also tallied per phone number, for the last `max_conversations`
+    numbers, so the quota each conversation burns can be looked up with
+    conversation_calls(). Observing takes one lock and a bisect; when the
+    registry is disabled every timer is a shared no-op.
+    """
+
+    def __init__(self, enabled=True, max_conversations=10000, prefix='scheduling_bot_'):
+        """Initialize an empty registry"""
+        self.enabled = enabled
+        self.max_conversations = max_conversations
+        self.prefix = prefix
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._histograms = {}
+        self._counters = {}
+        self._conversations = OrderedDict()
+
+    @classmethod
+    def from_env(cls):
+        """Create a registry configured by the METRICS_ENABLED and METRICS_MAX_CONVERSATIONS environment variables"""
+        return cls(
+            enabled=os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+            max_conversations=int(os.getenv('METRICS_MAX_CONVERSATIONS', 10000))
+        )
+
+    def stage(self, stage):
+        """Return a context manager timing one stage of the pipeline, such as 'state_load'"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, 'stage_seconds', (('stage', stage),))
+
+    def api_call(self, api, method, conversation=None):
+        """Return a context manager timing and counting one call, such as ('google_calendar', 'events.insert').
+
+        The call is attributed to `conversation` (a phone number) when given,
+        else to the conversation() scope open on this thread, if any.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _ApiCall(self, (('api', api), ('method', method)), conversation)
+
+    def conversation(self, phone_number, per_message=False):
+        """Return a context manager attributing this thread's API calls to a conversation.
+
+        With per_message set the scope covers one inbound message, and the
+        number of calls it made is observed when it exits.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _ConversationScope(self, normalize_phone_number(phone_number), per_message)
+
+    def count_api_call(self, api, method, conversation=None):
+        """Count an API call without timing it, such as one request of a batch"""
+        if not self.enabled:
+            return
+        scope = getattr(self._local, 'scope', None)
+        key = normalize_phone_number(conversation) if conversation else (scope.key if scope else None)
+        if scope is not None and key == scope.key:
+            scope.calls += 1
+
+        with self._lock:
+            labels = (('api', api), ('method', method))
+            self._counters[('api_calls_total', labels)] = self._counters.get(('api_calls_total', labels), 0) + 1
+            if key:
+                tally = self._conversations.pop(key, None) or {}
+                tally[api] = tally.get(api, 0) + 1
+                self._conversations[key] = tally
+                if len(self._conversations) > self.max_conversations:
+                    self._conversations.popitem(last=False)
+
+    def observe(self, family, labels, value):
+        """Add a value to the histogram of a family and label set"""
+        with self._lock:
+            histogram = self._histograms.get((family, labels))
+            if histogram is None:
+                buckets = CALL_COUNT_BUCKETS if family == 'api_calls_per_message' else LATENCY_BUCKETS
+                histogram = self._histograms[(family, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, family, labels, amount=1):
+        """Add to the counter of a family and label set"""
+        with self._lock:
+            self._counters[(family, labels)] = self._counters.get((family, labels), 0) + amount
+
+    def conversation_calls(self, phone_number):
+        """Return {api: calls} made for a conversation, empty when it is unknown or was evicted"""
+        with self._lock:
+            return dict(self._conversations.get(normalize_phone_number(phone_number), {}))
+
+    def histogram(self, family, **labels):
+        """Return (count, sum) of a histogram, or (0, 0.0) when nothing was observed"""
+        with self._lock:
+            histogram = self._histograms.get((family, tuple(labels.items())))
+            return (histogram.count, histogram.sum) if histogram else (0, 0.0)
+
+    def counter(self, family, **labels):
+        """Return the value of a counter"""
+        with self._lock:
+            return self._counters.get((family, tuple(labels.items())), 0)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: (h.cumulative_counts(), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for family, (kind, help_text) in FAMILIES.items():
+            name = self.prefix + family
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (counter_family, labels), value in sorted(counters.items()):
+                    if counter_family == family:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            for (histogram_family, labels), (buckets, total, count) in sorted(histograms.items()):
+                if histogram_family != family:
+                    continue
+                for bound, cumulative in buckets:
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        """Forget every observation"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._conversations.clear()
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+# Shared by every module in the process and exposed at /metrics
+metrics = MetricsRegistry.from_env()
+
+@event.listens_for(Session, 'before_commit')
+def _commit_started(session):
+    if metrics.enabled:
+        session.info['metrics_commit_started'] = time.perf_counter()
+
+@event.listens_for(Session, 'after_commit')
+def _commit_finished(session):
+    # Covers the flush as well: that is the work the commit waits for
+    started = session.info.pop('metrics_commit_started', None)
+    if started is not None:
+        metrics.observe('stage_seconds', (('stage', 'db_commit'),), time.perf_counter() - started)
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+from flask import current_app, has_app_context
+from requests.exceptions import ConnectionError, ConnectTimeout
+from twilio.base.exceptions import TwilioRestException
+from urllib3.exceptions import NewConnectionError
+from app.logging_config import mask_phone
+from app.services.background_jobs import BackgroundJobQueue
+from app.services.twilio_service import TwilioService
+
+logger = logging.getLogger(__name__)
+
+def is_retryable(error):
+    """Return whether a failed send may succeed later without sending the message twice.
+
+    Twilio throttling (429) and server errors are retried, as are failures to
+    connect. Read timeouts and connections dropped mid-request are not: the
+    message may already have been accepted.
+    """
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    if isinstance(error, ConnectTimeout):
+        return True
+    # Connection refused or DNS failure: requests wraps urllib3's MaxRetryError
+    reason = getattr(error.args[0], 'reason', None) if isinstance(error, ConnectionError) and error.args else None
+    return isinstance(reason, NewConnectionError)
+
+class OutboundSender:
+    """Pool of workers sending WhatsApp messages through the shared Twilio client.
+
+    send() only queues a message. Workers send it once the per-number rate
+    limiter allows, and retry throttled (429), 5xx and connect failures with
+    exponential backoff and jitter. Other errors, such as an invalid
+    number, fail at once. Every send uses the process-wide pooled HTTP
+    session.
+    """
+
+    def __init__(self, job_queue, twilio_service=None, clock=time.monotonic):
+        """Initialize the sender on top of a BackgroundJobQueue"""
+        self.job_queue = job_queue
+        self.twilio_service = twilio_service
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self._latency_total = 0.0
+        self._first_sent_at = None
+        self._last_sent_at = None
+
+    @classmethod
+    def for_app(cls, app, twilio_service=None):
+        """Create a sender with its own workers, configured by the TWILIO_SENDER_* environment variables"""
+        job_queue = BackgroundJobQueue(
+            app,
+            workers=int(os.getenv('TWILIO_SENDER_WORKERS', 4)),
+            max_attempts=int(os.getenv('TWILIO_SENDER_MAX_ATTEMPTS', 5)),
+            base_delay=float(os.getenv('TWILIO_SENDER_RETRY_DELAY', 1)),
+            max_delay=60.0,
+            retry_on=is_retryable
+        )
+        return cls(job_queue, twilio_service=twilio_service)
+
+    def start(self):
+        """Start the worker threads"""
+        self.job_queue.start()
+
+    def stop(self):
+        """Stop the worker threads once they finish their current message"""
+        self.job_queue.stop()
+
+    def send(self, to_number, message):
+        """Queue a WhatsApp message and return right away"""
+        with self._lock:
+            self.queued += 1
+        self.job_queue.submit(self._deliver, to_number, message, self.clock(), on_failure=self._give_up)
+
+    def run_pending(self):
+        """Send every message that is due in the calling thread and return how many attempts ran"""
+        return self.job_queue.run_pending()
+
+    def pending_count(self):
+        """Return the number of messages not sent yet, including those waiting for a retry"""
+        return self.job_queue.pending_count()
+
+    def drain(self, poll_seconds=0.1):
+        """Stop the workers and send every queued message in the calling thread, waiting out retry delays"""
+        self.stop()
+        while self.pending_count():
+            if not self.run_pending():
+                time.sleep(poll_seconds)
+
+    def stats(self):
+        """Return the sender's counters and its throughput since the first message went out"""
+        with self._lock:
+            elapsed = (self._last_sent_at - self._first_sent_at) if self.sent > 1 else 0.0
+            return {
+                'queued': self.queued,
+                'sent': self.sent,
+                'failed': self.failed,
+                'retried': self.job_queue.retried,
+                'pending': self.job_queue.pending_count(),
+                'messages_per_second': (self.sent - 1) / elapsed if elapsed > 0 else 0.0,
+                'average_latency': self._latency_total / self.sent if self.sent else 0.0,
+                'rate_limit_waits': self._service().rate_limiter.waits,
+            }
+
+    def _service(self):
+        if self.twilio_service is None:
+            self.twilio_service = TwilioService()
+        return self.twilio_service
+
+    def _deliver(self, to_number, message, queued_at):
+        self._service().send_whatsapp_message(to_number, message)
+        now = self.clock()
+        with self._lock:
+            self.sent += 1
+            self._latency_total += now - queued_at
+            if self._first_sent_at is None:
+                self._first_sent_at = now
+            self._last_sent_at = now
+
+    def _give_up(self, error, to_number, message, queued_at):
+        with self._lock:
+            self.failed += 1
+        logger.error('Giving up on WhatsApp message to %s: %s', mask_phone(to_number), error)
+
+def send_message(to_number, message):
+    """Queue a message on the application's outbound sender, or send it right away when there is none"""
+    sender = current_app.extensions.get('outbound_sender') if has_app_context() else None
+    if sender is not None:
+        sender.send(to_number, message)
+    else:
+        TwilioService().send_whatsapp_message(to_number, message)
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+# Twilio's default throughput for a WhatsApp sender, in messages per second
+WHATSAPP_MESSAGES_PER_SECOND = 80
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding at most `capacity` tokens"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        """Initialize a full bucket"""
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it.
+
+        The bucket may go into debt, so that callers arriving while it is
+        empty are spaced out one token apart instead of racing each other.
+        """
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class RateLimiter:
+    """One token bucket per key, such as a sender phone number, shared by every thread.
+
+    acquire() blocks until the key may send again. A rate of zero or less
+    disables the limiter.
+    """
+
+    def __init__(self, rate_per_second=WHATSAPP_MESSAGES_PER_SECOND, burst=WHATSAPP_MESSAGES_PER_SECOND,
+                 clock=time.monotonic, sleep=time.sleep):
+        """Initialize the limiter"""
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """Create a limiter configured by the TWILIO_SEND_RATE and TWILIO_SEND_BURST environment variables"""
+        return cls(
+            rate_per_second=float(os.getenv('TWILIO_SEND_RATE', WHATSAPP_MESSAGES_PER_SECOND)),
+            burst=int(os.getenv('TWILIO_SEND_BURST', WHATSAPP_MESSAGES_PER_SECOND))
+        )
+
+    def acquire(self, key):
+        """Wait until key may send; returns the seconds waited"""
+        if self.rate_per_second <= 0:
+            return 0.0
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate_per_second, self.burst, self.clock)
+            wait = bucket.reserve()
+            if wait > 0:
+                self.waits += 1
+                self.waited_seconds += wait
+
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def clear(self):
+        """Forget every bucket and reset the counters"""
+        with self._lock:
+            self._buckets.clear()
+            self.waits = 0
+            self.waited_seconds = 0.0
+
+# Shared by every TwilioService in the process, so all senders respect one limit per number
+sender_rate_limiter = RateLimiter.from_env()
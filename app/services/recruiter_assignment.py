@@ -0,0 +1,156 @@
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app.models.database import db
+from app.models.models import Interview, Recruiter
+
+logger = logging.getLogger(__name__)
+
+def _naive(value):
+    """Drop the timezone of a datetime, the way interview times are stored"""
+    return value.replace(tzinfo=None)
+
+def _overlaps_any(start, end, periods):
+    """Check whether [start, end) overlaps any of the (naive) periods"""
+    start, end = _naive(start), _naive(end)
+    return any(period_start < end and period_end > start for period_start, period_end in periods)
+
+class LeastBookedPolicy:
+    """Prefer the recruiters with the fewest interviews scheduled this week"""
+
+    name = 'least_booked'
+
+    def rank(self, recruiters):
+        """Return a sort key per recruiter ID; lower keys are preferred"""
+        now = datetime.now()
+        week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+        week_end = week_start + timedelta(days=7)
+
+        counts = dict(
+            db.session.query(Interview.recruiter_id, func.count(Interview.id))
+            .filter(
+                Interview.recruiter_id.in_([recruiter.id for recruiter in recruiters]),
+                Interview.status == 'scheduled',
+                Interview.start_time >= week_start,
+                Interview.start_time < week_end
+            )
+            .group_by(Interview.recruiter_id)
+            .all()
+        )
+        return {recruiter.id: (counts.get(recruiter.id, 0), recruiter.id) for recruiter in recruiters}
+
+class RoundRobinPolicy:
+    """Rotate the preferred recruiter with every assignment (per process)"""
+
+    name = 'round_robin'
+
+    def __init__(self):
+        """Initialize the policy"""
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def rank(self, recruiters):
+        """Return a sort key per recruiter ID; lower keys are preferred"""
+        recruiter_ids = sorted(recruiter.id for recruiter in recruiters)
+        with self._lock:
+            turn = self._turn
+            self._turn += 1
+        return {
+            recruiter_id: ((position - turn) % len(recruiter_ids), recruiter_id)
+            for position, recruiter_id in enumerate(recruiter_ids)
+        }
+
+POLICIES = {
+    LeastBookedPolicy.name: LeastBookedPolicy,
+    RoundRobinPolicy.name: RoundRobinPolicy,
+}
+
+def policy_from_env():
+    """Create the assignment policy named by RECRUITER_ASSIGNMENT_POLICY"""
+    name = os.getenv('RECRUITER_ASSIGNMENT_POLICY', LeastBookedPolicy.name)
+    if name not in POLICIES:
+        logger.warning("Unknown recruiter assignment policy '%s', using %s", name, LeastBookedPolicy.name)
+        name = LeastBookedPolicy.name
+    return POLICIES[name]()
+
+class RecruiterAssigner:
+    """Offers interview slots across every recruiter instead of always using the first one.
+
+    Each recruiter's free slots inside the candidate's windows are already
+    sorted by time, so a k-way heap merge yields the earliest offers without
+    sorting everything. When several recruiters are free at the same time,
+    the policy decides who gets the offer.
+    """
+
+    def __init__(self, scheduling_service, policy=None):
+        """Initialize the assigner"""
+        self.scheduling_service = scheduling_service
+        self.policy = policy if policy is not None else policy_from_env()
+
+    def find_offers(self, candidate_windows, start_date, end_date, k=3, duration_minutes=60):
+        """Return the earliest k (start, end, recruiter) offers inside the candidate's windows"""
+        recruiters = Recruiter.query.all()
+        if not recruiters:
+            return []
+
+        ranks = self.policy.rank(recruiters)
+        recruiters_by_id = {recruiter.id: recruiter for recruiter in recruiters}
+        availability = self.scheduling_service.get_recruiters_availability_from_calendar(
+            list(recruiters_by_id),
+            start_date,
+            end_date,
+            duration_minutes,
+            windows=candidate_windows
+        )
+
+        # Confirmed interviews reach Google Calendar later through a background job, and free/busy answers may come
+        # from the cache or the mirror, so booked slots are also taken out using the interviews table
+        booked = self._booked_periods(list(recruiters_by_id), start_date, end_date)
+        streams = [
+            [
+                (slot_start, ranks[recruiter_id], recruiter_id, slot_end)
+                for slot_start, slot_end in result['slots']
+                if not _overlaps_any(slot_start, slot_end, booked.get(recruiter_id, ()))
+            ]
+            for recruiter_id, result in availability.items()
+        ]
+
+        offers = []
+        offered_starts = set()
+        for slot_start, _, recruiter_id, slot_end in heapq.merge(*streams):
+            # Only the best-ranked recruiter free at a given time gets that offer
+            if slot_start in offered_starts:
+                continue
+            offered_starts.add(slot_start)
+            offers.append((slot_start, slot_end, recruiters_by_id[recruiter_id]))
+            if len(offers) == k:
+                break
+        return offers
+
+    def _booked_periods(self, recruiter_ids, start_date, end_date):
+        """Return the (start, end) periods of scheduled interviews per recruiter overlapping the search range"""
+        rows = (
+            db.session.query(Interview.recruiter_id, Interview.start_time, Interview.end_time)
+            .filter(
+                Interview.recruiter_id.in_(recruiter_ids),
+                Interview.status == 'scheduled',
+                Interview.start_time < _naive(end_date),
+                Interview.end_time > _naive(start_date)
+            )
+            .all()
+        )
+        booked = {}
+        for recruiter_id, start_time, end_time in rows:
+            booked.setdefault(recruiter_id, []).append((start_time, end_time))
+        return booked
+
+    def preferred_recruiter(self):
+        """Return the recruiter the policy ranks first, or None when there are no recruiters"""
+        recruiters = Recruiter.query.all()
+        if not recruiters:
+            return None
+        ranks = self.policy.rank(recruiters)
+        return min(recruiters, key=lambda recruiter: ranks[recruiter.id])
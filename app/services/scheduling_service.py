@@ -1,10 +1,25 @@
+import hashlib
+import logging
 from datetime import datetime, timedelta
-import pytz
-from app.models.database import db
-from app.models.models import Candidate, Recruiter, AvailabilitySlot, Interview, ConversationState
+from sqlalchemy import func
+from app.models.database import db, commit
+from app.models.models import Candidate, Recruiter, AvailabilitySlot, Interview
+from app.services.availability_grid import AvailabilityGrid
+from app.services.availability_parser import parse_availability
 from app.services.google_calendar import GoogleCalendarService
-from app.services.twilio_service import TwilioService
-import json
+from app.services.background_jobs import submit_job
+from app.services.conversation_store import conversation_store, normalize_phone_number
+from app.services.metrics import metrics
+from app.services.outbound_sender import send_message
+from app.logging_config import mask_phone
+
+logger = logging.getLogger(__name__)
+
+def calendar_event_id(interview):
+    """Google Calendar event ID of an interview, the same on every attempt to create its event"""
+    # Hex digits are valid event ID characters; created_at keeps IDs apart when a database is recreated
+    created_at = interview.created_at.isoformat() if interview.created_at else ''
+    return hashlib.sha1(f"interview:{interview.id}:{created_at}".encode()).hexdigest()
 
 class SchedulingService:
     """Service for handling scheduling logic"""
@@ -12,12 +27,12 @@ class SchedulingService:
     def __init__(self):
         """Initialize the scheduling service"""
         self.calendar_service = GoogleCalendarService()
-        self.twilio_service = TwilioService()
+        self.conversation_store = conversation_store
     
     def register_candidate(self, name, phone_number, email, position_applied):
         """Register a new candidate"""
         # Create new candidate
-        print(f"Creating new candidate: {name} with phone {phone_number}")
+        logger.info('Creating new candidate: %s with phone %s', name, mask_phone(phone_number))
         candidate = Candidate(
             name=name,
             phone_number=phone_number,
@@ -27,7 +42,7 @@ class SchedulingService:
         )
         
         db.session.add(candidate)
-        db.session.commit()
+        commit()
         
         return candidate
     
@@ -46,7 +61,7 @@ class SchedulingService:
         )
         
         db.session.add(recruiter)
-        db.session.commit()
+        commit()
         
         return recruiter
     
@@ -61,7 +76,7 @@ class SchedulingService:
         )
         
         db.session.add(slot)
-        db.session.commit()
+        commit()
         
         return slot
     
@@ -76,27 +91,27 @@ class SchedulingService:
         )
         
         db.session.add(slot)
-        db.session.commit()
+        commit()
         
         return slot
     
     def get_recruiter_availability_from_calendar(self, recruiter_id, start_date, end_date, duration_minutes=60):
         """Get recruiter availability from Google Calendar"""
         # Get recruiter
-        recruiter = Recruiter.query.get(recruiter_id)
+        recruiter = db.session.get(Recruiter, recruiter_id)
         if not recruiter:
-            print(f"Recruiter with ID {recruiter_id} not found")
+            logger.info('Recruiter with ID %s not found', recruiter_id)
             return []
             
         if not recruiter.calendar_id:
-            print(f"Recruiter {recruiter.name} has no calendar ID set")
+            logger.info('Recruiter %s has no calendar ID set', recruiter.name)
             return []
         
         try:
             # Use the Google Calendar API to find real available slots
-            print(f"Fetching real availability from Google Calendar for recruiter {recruiter.name}")
-            print(f"Calendar ID: {recruiter.calendar_id}")
-            print(f"Date range: {start_date} to {end_date}")
+            logger.debug('Fetching real availability from Google Calendar for recruiter %s', recruiter.name)
+            logger.debug('Calendar ID: %s', recruiter.calendar_id)
+            logger.debug('Date range: %s to %s', start_date, end_date)
             
             # Get available slots from calendar
             available_slots = self.calendar_service.find_available_slots(
@@ -107,19 +122,59 @@ class SchedulingService:
             )
             
             if available_slots:
-                print(f"Found {len(available_slots)} real available slots from Google Calendar")
+                logger.info('Found %s real available slots from Google Calendar', len(available_slots))
                 for slot in available_slots:
-                    print(f"Available slot: {slot[0]} to {slot[1]}")
+                    logger.debug('Available slot: %s to %s', slot[0], slot[1])
                 return available_slots
             else:
-                print("No available slots found from Google Calendar, using fallback mock slots")
+                logger.info('No available slots found from Google Calendar, using fallback mock slots')
         except Exception as e:
-            print(f"Error fetching availability from Google Calendar: {e}")
-            import traceback
-            traceback.print_exc()
-            print("Using fallback mock slots due to error")
+            logger.exception('Error fetching availability from Google Calendar: %s', e)
+            logger.info('Using fallback mock slots due to error')
         
         # Fallback to mock slots if Google Calendar fails or returns no slots
+        return self._generate_mock_slots(start_date, end_date)
+    
+    def get_recruiters_availability_from_calendar(self, recruiter_ids, start_date, end_date, duration_minutes=60,
+                                                  windows=None):
+        """Get availability for several recruiters with batched free/busy queries.
+        
+        Returns a dict keyed by recruiter ID with the recruiter's busy periods and free slots.
+        Recruiters without a calendar are left out; no mock slots are generated here.
+        When windows is given, slots are limited to those (start, end) windows.
+        """
+        recruiters = Recruiter.query.filter(Recruiter.id.in_(recruiter_ids)).all()
+        calendar_recruiters = [recruiter for recruiter in recruiters if recruiter.calendar_id]
+        
+        for recruiter in recruiters:
+            if not recruiter.calendar_id:
+                logger.info('Recruiter %s has no calendar ID set', recruiter.name)
+        
+        calendar_ids = [recruiter.calendar_id for recruiter in calendar_recruiters]
+        logger.info('Fetching availability for %s recruiter calendars in one batch', len(calendar_ids))
+        
+        availability_by_calendar = {}
+        if calendar_ids:
+            availability_by_calendar = self.calendar_service.get_availability_batch(
+                calendar_ids,
+                start_date,
+                end_date,
+                duration_minutes,
+                windows=windows
+            )
+        
+        availability = {}
+        for recruiter in calendar_recruiters:
+            calendar_availability = availability_by_calendar.get(recruiter.calendar_id, {'busy': [], 'slots': []})
+            availability[recruiter.id] = {
+                'busy': calendar_availability['busy'],
+                'slots': calendar_availability['slots']
+            }
+        
+        return availability
+    
+    def _generate_mock_slots(self, start_date, end_date):
+        """Generate fallback mock slots at 10 AM and 2 PM on weekdays"""
         mock_slots = []
         current_date = start_date
         
@@ -135,19 +190,19 @@ class SchedulingService:
             slot_end = slot_start + timedelta(hours=1)
             if slot_start >= start_date and slot_end <= end_date:
                 mock_slots.append((slot_start, slot_end))
-                print(f"Generated mock slot: {slot_start} to {slot_end}")
+                logger.debug('Generated mock slot: %s to %s', slot_start, slot_end)
             
             # Afternoon slot (2-3 PM)
             slot_start = current_date.replace(hour=14, minute=0, second=0, microsecond=0)
             slot_end = slot_start + timedelta(hours=1)
             if slot_start >= start_date and slot_end <= end_date:
                 mock_slots.append((slot_start, slot_end))
-                print(f"Generated mock slot: {slot_start} to {slot_end}")
+                logger.debug('Generated mock slot: %s to %s', slot_start, slot_end)
             
             # Move to the next day
             current_date = current_date + timedelta(days=1)
         
-        print(f"Generated {len(mock_slots)} mock slots as fallback")
+        logger.info('Generated %s mock slots as fallback', len(mock_slots))
         return mock_slots
     
     def find_matching_slots(self, candidate_id, recruiter_id, start_date, end_date, duration_minutes=60):
@@ -162,7 +217,7 @@ class SchedulingService:
         ).all()
         
         # Get recruiter
-        recruiter = Recruiter.query.get(recruiter_id)
+        recruiter = db.session.get(Recruiter, recruiter_id)
         if not recruiter or not recruiter.calendar_id:
             return []
         
@@ -174,41 +229,31 @@ class SchedulingService:
             duration_minutes
         )
         
-        # Convert candidate slots to tuples for easier comparison
-        candidate_slot_tuples = [(slot.start_time, slot.end_time) for slot in candidate_slots]
-        
-        # Find matching slots
-        matching_slots = []
-        for recruiter_start, recruiter_end in recruiter_slots:
-            for candidate_start, candidate_end in candidate_slot_tuples:
-                # Check if there's an overlap of at least duration_minutes
-                overlap_start = max(recruiter_start, candidate_start)
-                overlap_end = min(recruiter_end, candidate_end)
-                
-                if overlap_start < overlap_end:
-                    overlap_duration = (overlap_end - overlap_start).total_seconds() / 60
-                    
-                    if overlap_duration >= duration_minutes:
-                        # We found a matching slot
-                        slot_end = overlap_start + timedelta(minutes=duration_minutes)
-                        matching_slots.append((overlap_start, slot_end))
-        
-        return matching_slots
+        candidate_windows = [(slot.start_time, slot.end_time) for slot in candidate_slots]
+        return self.match_slots(recruiter_slots, candidate_windows, start_date, end_date, duration_minutes)
+    
+    def match_slots(self, recruiter_slots, candidate_windows, start_date, end_date, duration_minutes=60):
+        """Find slots of duration_minutes inside both the recruiter's free slots and the candidate's windows"""
+        # Intersect both schedules on a minute grid and pack slots into every overlap
+        grid = AvailabilityGrid(start_date, end_date)
+        overlap = (grid.intervals_mask(recruiter_slots, expand=False)
+                   & grid.intervals_mask(candidate_windows, expand=False))
+        return grid.slots(overlap, duration_minutes)
     
     def schedule_interview(self, candidate_id, recruiter_id, start_time, end_time):
         """Schedule an interview and create a calendar event"""
         # Get candidate and recruiter
-        candidate = Candidate.query.get(candidate_id)
-        recruiter = Recruiter.query.get(recruiter_id)
+        candidate = db.session.get(Candidate, candidate_id)
+        recruiter = db.session.get(Recruiter, recruiter_id)
         
         if not candidate or not recruiter:
-            print(f"Error: Candidate or recruiter not found. Candidate ID: {candidate_id}, Recruiter ID: {recruiter_id}")
+            logger.error('Candidate or recruiter not found. Candidate ID: %s, Recruiter ID: %s', candidate_id, recruiter_id)
             return None
         
-        print(f"Scheduling interview:")
-        print(f"Candidate: {candidate.name} ({candidate.email})")
-        print(f"Recruiter: {recruiter.name} ({recruiter.email})")
-        print(f"Time: {start_time} to {end_time}")
+        logger.debug('Scheduling interview:')
+        logger.debug('Candidate: %s (%s)', candidate.name, candidate.email)
+        logger.debug('Recruiter: %s (%s)', recruiter.name, recruiter.email)
+        logger.debug('Time: %s to %s', start_time, end_time)
         
         # Create the interview in the database
         interview = Interview(
@@ -220,7 +265,7 @@ class SchedulingService:
         )
         
         db.session.add(interview)
-        db.session.commit()
+        commit()
         
         # Create the calendar event
         event_summary = f"Interview: {candidate.name} for {candidate.position_applied}"
@@ -254,42 +299,37 @@ class SchedulingService:
                     # Create a generic URL if htmlLink is not available
                     interview.calendar_url = f"https://calendar.google.com/calendar/event?eid={event.get('id')}"
                 
-                db.session.commit()
+                # The Meet link comes back with the insert, so keep it instead of patching it into the event
+                interview.meet_link = event.get('hangoutLink')
+                interview.calendar_status = 'synced'
                 
-                # Force a refresh of the event to ensure notifications are sent
-                updated_event = self.calendar_service.get_event(
-                    recruiter.calendar_id or 'primary',
-                    event.get('id')
-                )
-                
-                # Verify the event was created correctly
-                verified = self.verify_calendar_event(
-                    recruiter.calendar_id or 'primary',
-                    event.get('id')
-                )
+                commit()
                 
-                if not verified:
-                    print("Warning: Calendar event verification failed, but proceeding with interview scheduling")
+                # Verify the event from the insert response instead of fetching it again
+                if 'attendees' not in event:
+                    logger.warning('Calendar event verification failed, but proceeding with interview scheduling')
                 
-                print(f"Calendar event created successfully. Event ID: {event.get('id')}")
-                print(f"Calendar URL: {interview.calendar_url}")
-                print(f"Calendar invites sent to: {candidate.email} and {recruiter.email}")
+                logger.info('Calendar event created successfully. Event ID: %s', event.get('id'))
+                logger.debug('Calendar URL: %s', interview.calendar_url)
+                logger.debug('Calendar invites sent to: %s and %s', candidate.email, recruiter.email)
                 
                 # Send confirmation messages
-                self.send_interview_confirmation(candidate.phone_number, candidate.name, recruiter.name, start_time, end_time)
+                self.send_interview_confirmation(candidate.phone_number, candidate.name, recruiter.name, start_time, end_time,
+                                                 interview.meet_link)
                 
                 return interview
             else:
-                print("Error: No event ID returned from calendar service")
+                logger.error('No event ID returned from calendar service')
                 return None
         except Exception as e:
-            print(f"Error creating calendar event: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Error creating calendar event: %s', e)
             # Even if calendar event creation fails, we still want to keep the interview record
+            interview.calendar_status = 'failed'
+            interview.calendar_error = str(e)[:500]
+            commit()
             return interview
     
-    def send_interview_confirmation(self, phone_number, candidate_name, recruiter_name, start_time, end_time):
+    def send_interview_confirmation(self, phone_number, candidate_name, recruiter_name, start_time, end_time, meet_link=None):
         """Send interview confirmation via WhatsApp"""
         # Format the date and time
         date_str = start_time.strftime("%A, %B %d, %Y")
@@ -300,347 +340,192 @@ class SchedulingService:
         message = f"Hello {candidate_name},\n\n"
         message += f"Your interview has been scheduled with {recruiter_name} on {date_str} "
         message += f"from {start_time_str} to {end_time_str}.\n\n"
+        if meet_link:
+            message += f"Google Meet link: {meet_link}\n\n"
         message += "You will receive a calendar invitation shortly. "
         message += "Please confirm your attendance by replying 'confirm'.\n\n"
         message += "If you need to reschedule, please reply 'reschedule'."
         
-        # Send the message
-        self.twilio_service.send_whatsapp_message(phone_number, message)
+        # Queue the message on the rate-limited sender
+        send_message(phone_number, message)
     
-    def get_or_create_conversation_state(self, phone_number):
-        """Get or create a conversation state for a phone number"""
-        # Normalize the phone number format (remove 'whatsapp:' and ensure it starts with '+')
-        normalized_number = phone_number.replace('whatsapp:', '')
-        if normalized_number and normalized_number[0].isdigit() and not normalized_number.startswith('+'):
-            normalized_number = '+' + normalized_number
-        
-        print(f"Looking for conversation state with normalized number: {normalized_number}")
-        
-        # Check if conversation state exists - get the most recent one
-        state = ConversationState.query.filter_by(phone_number=normalized_number).order_by(
-            ConversationState.created_at.desc()).first()
-        
-        if not state:
-            # Also try a fuzzy search without the + in case there are entries with different formats
-            clean_number = normalized_number.replace('+', '')
-            state = ConversationState.query.filter(
-                ConversationState.phone_number.like(f"%{clean_number}")
-            ).order_by(ConversationState.created_at.desc()).first()
-            
-            if state:
-                # Update the phone number format to be consistent
-                state.phone_number = normalized_number
-                db.session.commit()
-                print(f"Updated phone number format from {state.phone_number} to {normalized_number}")
-        
-        if not state:
-            # Create new conversation state
-            print(f"Creating new conversation state for {normalized_number}")
-            state = ConversationState(
-                phone_number=normalized_number,
-                current_state='initial',
-                context={}
-            )
-            db.session.add(state)
-            db.session.commit()
-        
-        return state
+    def queue_calendar_event(self, interview_id, attendee_email=None):
+        """Create the calendar event of a pending interview in the background"""
+        submit_job(self.create_interview_calendar_event, interview_id, attendee_email,
+                   on_failure=self.mark_calendar_event_failed)
     
-    def update_conversation_state(self, phone_number, new_state, context=None):
-        """Update the conversation state"""
+    def create_interview_calendar_event(self, interview_id, attendee_email=None):
+        """Create the calendar event of a pending interview and notify the candidate.
+        
+        The interview is claimed by moving it from 'pending' to 'creating' in a
+        single UPDATE, so when several processes pick up the same interview only
+        one of them creates the event. The event ID is derived from the
+        interview, so a retry after an insert whose result was never committed
+        finds that event instead of creating a second one.
+        """
+        interview = db.session.get(Interview, interview_id)
+        if not interview or interview.calendar_status != 'pending' or interview.status == 'cancelled':
+            return None
+        if not self.claim_calendar_event(interview_id):
+            return None
+        db.session.refresh(interview)
+        return self._create_claimed_calendar_event(interview, attendee_email)
+    
+    def claim_calendar_event(self, interview_id, statuses=('pending',)):
+        """Move a scheduled interview without an event from one of `statuses` to 'creating'; returns whether it did.
+        
+        The claim is a single conditional UPDATE, so of several processes (the
+        job queue, the retry script, the admin panel) only one creates the
+        event, and an interview cancelled meanwhile is not claimed at all.
+        """
+        calendar_status = Interview.calendar_status.in_([status for status in statuses if status is not None])
+        if None in statuses:
+            calendar_status = db.or_(calendar_status, Interview.calendar_status.is_(None))
+        claimed = Interview.query.filter(
+            Interview.id == interview_id,
+            Interview.status == 'scheduled',
+            Interview.calendar_event_id.is_(None),
+            calendar_status
+        ).update({
+            'calendar_status': 'creating',
+            'calendar_attempts': func.coalesce(Interview.calendar_attempts, 0) + 1,
+            'updated_at': datetime.utcnow(),
+        }, synchronize_session=False)
+        commit()
+        return bool(claimed)
+    
+    def retry_calendar_event(self, interview_id):
+        """Create the calendar event of an interview whose event failed (or predates the calendar job) right away.
+        
+        Returns the interview, or None when it is not waiting for a retry, such
+        as while the job queue is creating its event. Errors mark it 'failed'
+        again and propagate.
+        """
+        if not self.claim_calendar_event(interview_id, statuses=('failed', None)):
+            return None
+        interview = db.session.get(Interview, interview_id)
+        db.session.refresh(interview)
         try:
-            # Normalize the phone number format to ensure consistent storage
-            normalized_number = phone_number.replace('whatsapp:', '')
-            if normalized_number and normalized_number[0].isdigit() and not normalized_number.startswith('+'):
-                normalized_number = '+' + normalized_number
-            
-            # Import db at the beginning to avoid UnboundLocalError
-            from app.models.database import db
-            from app.models.models import ConversationState
-            import json
-            
-            # Debug logging
-            print(f"Updating state for {normalized_number} to {new_state}")
-            print(f"New context: {context}")
-            
-            # First try to get the existing state - get the most recent one
-            state = ConversationState.query.filter_by(phone_number=normalized_number).order_by(ConversationState.created_at.desc()).first()
-            
-            if state:
-                # Update existing state
-                print(f"Found existing state: {state.current_state}")
-                print(f"Current context: {state.context}")
-                
-                # Update the state
-                state.current_state = new_state
-                
-                # Update the context if provided
-                if context is not None:
-                    # Make sure context is a dictionary
-                    if not isinstance(context, dict):
-                        print(f"WARNING: Context is not a dictionary: {context}")
-                        context = {}
-                    
-                    # If the existing context is not None, merge the new context with it
-                    # This ensures we don't lose information from the previous state
-                    if state.context is not None:
-                        # Create a copy of the existing context
-                        merged_context = state.context.copy() if isinstance(state.context, dict) else {}
-                        
-                        # Update with the new context
-                        merged_context.update(context)
-                        
-                        # Use the merged context
-                        context = merged_context
-                        print(f"Merged context: {context}")
-                    
-                    # Convert to string and back to ensure deep copy
-                    context_str = json.dumps(context)
-                    state.context = json.loads(context_str)
-                    
-                    print(f"Updated context: {state.context}")
-                
-                # Commit the changes
-                db.session.commit()
-                
-                # Force a refresh from the database to ensure we have the latest data
-                db.session.refresh(state)
-                
-                # Verify the update by fetching again
-                updated_state = ConversationState.query.filter_by(phone_number=normalized_number).order_by(ConversationState.created_at.desc()).first()
-                print(f"Verified state: {updated_state.current_state}")
-                print(f"Verified context: {updated_state.context}")
-                
-                return state
-            else:
-                # Create new state
-                print(f"Creating new state for {normalized_number}")
-                
-                # Ensure context is a dictionary
-                if context is None:
-                    context = {}
-                elif not isinstance(context, dict):
-                    print(f"WARNING: Context is not a dictionary: {context}")
-                    context = {}
-                
-                # Convert to string and back to ensure deep copy
-                context_str = json.dumps(context)
-                context_copy = json.loads(context_str)
-                
-                # Create new conversation state
-                new_state_obj = ConversationState(
-                    phone_number=normalized_number,
-                    current_state=new_state,
-                    context=context_copy
-                )
-                
-                db.session.add(new_state_obj)
-                db.session.commit()
-                
-                # Force a refresh from the database to ensure we have the latest data
-                db.session.refresh(new_state_obj)
-                
-                # Verify the creation
-                created_state = ConversationState.query.filter_by(phone_number=normalized_number).order_by(ConversationState.created_at.desc()).first()
-                print(f"Created state: {created_state.current_state}")
-                print(f"Created context: {created_state.context}")
-                
-                return new_state_obj
-                
+            return self._create_claimed_calendar_event(interview)
         except Exception as e:
-            print(f"Error updating conversation state: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            # Try one more approach as a last resort
-            try:
-                from app.models.database import db
-                from app.models.models import ConversationState
-                
-                # We won't delete existing states anymore, just create a new one
-                # Create a completely new state
-                if context is None:
-                    context = {}
-                
-                new_state_obj = ConversationState(
-                    phone_number=normalized_number,
-                    current_state=new_state,
-                    context=context
+            self.mark_calendar_event_failed(e, interview_id)
+            raise
+    
+    def cancel_interviews_without_event(self, interview_ids):
+        """Cancel scheduled interviews that have no calendar event, skipping those whose event is being created.
+        
+        Like the claim, each cancellation is one conditional UPDATE, so an
+        interview is either cancelled before a job claims it or left to the
+        job. Returns the IDs cancelled.
+        """
+        cancelled = set()
+        for interview_id in interview_ids:
+            updated = Interview.query.filter(
+                Interview.id == interview_id,
+                Interview.status == 'scheduled',
+                Interview.calendar_event_id.is_(None),
+                db.or_(Interview.calendar_status.is_(None), Interview.calendar_status != 'creating')
+            ).update({'status': 'cancelled', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+            if updated:
+                cancelled.add(interview_id)
+        commit()
+        return cancelled
+    
+    def _create_claimed_calendar_event(self, interview, attendee_email=None):
+        """Create the calendar event of an interview claimed by this process and notify the candidate"""
+        candidate = interview.candidate
+        recruiter = interview.recruiter
+        attendee_email = attendee_email or candidate.email
+        
+        try:
+            # The calendar calls count against the candidate's conversation
+            with metrics.conversation(candidate.phone_number):
+                event = self.calendar_service.create_event(
+                    recruiter.calendar_id or 'primary',
+                    f"Interview: {candidate.name} for {candidate.position_applied}",
+                    f"Interview with {candidate.name} for the {candidate.position_applied} position.",
+                    interview.start_time,
+                    interview.end_time,
+                    [{'email': attendee_email}, {'email': recruiter.email}],
+                    event_id=calendar_event_id(interview)
                 )
-                
-                db.session.add(new_state_obj)
-                db.session.commit()
-                
-                print(f"Created new state after error: {new_state}, context: {context}")
-                
-                return new_state_obj
-            except Exception as inner_e:
-                print(f"Failed to recover from error: {str(inner_e)}")
-                traceback.print_exc()
-                return None
+        except Exception as e:
+            # Release the claim with the error and let the job queue retry
+            interview.calendar_status = 'pending'
+            interview.calendar_error = str(e)[:500]
+            commit()
+            raise
+        
+        interview.calendar_event_id = event.get('id')
+        interview.calendar_url = event.get('htmlLink') or f"https://calendar.google.com/calendar/event?eid={event.get('id')}"
+        interview.meet_link = event.get('hangoutLink')
+        interview.calendar_status = 'synced'
+        interview.calendar_error = None
+        commit()
+        
+        logger.info('Calendar event created for interview %s: %s', interview.id, event.get('id'))
+        
+        # The event exists now, so a failed notification must not make the job retry
+        try:
+            message = f"Hello {candidate.name},\n\n"
+            message += f"A calendar invitation for your interview on {interview.start_time.strftime('%A, %B %d at %I:%M %p')} "
+            message += f"has been sent to {attendee_email}."
+            if interview.meet_link:
+                message += f"\n\nGoogle Meet link: {interview.meet_link}"
+            send_message(candidate.phone_number, message)
+        except Exception as e:
+            logger.error('Error notifying candidate about interview %s: %s', interview.id, e)
+        
+        return interview
+    
+    def mark_calendar_event_failed(self, error, interview_id, attendee_email=None):
+        """Mark the calendar event of an interview as failed once every retry is used up"""
+        interview = db.session.get(Interview, interview_id)
+        if interview and interview.calendar_status in ('pending', 'creating'):
+            interview.calendar_status = 'failed'
+            interview.calendar_error = str(error)[:500]
+            commit()
+    
+    def get_or_create_conversation_state(self, phone_number):
+        """Get the conversation state for a phone number (an unsaved 'initial' state if there is none)"""
+        return self.conversation_store.get(phone_number)
+    
+    def update_conversation_state(self, phone_number, new_state, context=None, replace=False):
+        """Update the conversation state, merging the new context into the stored one unless replace is set.
+
+        Errors propagate, so that the message's unit of work rolls back with them.
+        """
+        state = self.conversation_store.save(phone_number, new_state, context, replace=replace)
+        logger.debug('Updated state for %s to %s', mask_phone(state.phone_number), new_state)
+        return state
     
     def reset_conversation(self, phone_number):
         """Reset the conversation state for a phone number"""
-        # Normalize the phone number format (remove 'whatsapp:' and ensure it starts with '+')
-        normalized_number = phone_number.replace('whatsapp:', '')
-        if normalized_number and normalized_number[0].isdigit() and not normalized_number.startswith('+'):
-            normalized_number = '+' + normalized_number
-        
-        print(f"Attempting to reset conversation for normalized number: {normalized_number}")
-        
-        # First try exact match
-        conversation = ConversationState.query.filter_by(phone_number=normalized_number).first()
-        
-        # If not found, try fuzzy match
-        if not conversation:
-            clean_number = normalized_number.replace('+', '')
-            conversation = ConversationState.query.filter(
-                ConversationState.phone_number.like(f"%{clean_number}")
-            ).first()
-        
-        if conversation:
-            db.session.delete(conversation)
-            db.session.commit()
-            print(f"Conversation state for {normalized_number} has been reset")
+        if self.conversation_store.delete(phone_number):
+            logger.info('Conversation state for %s has been reset', mask_phone(normalize_phone_number(phone_number)))
             return True
-        else:
-            print(f"No conversation state found for {normalized_number}")
-            return False
+        logger.info('No conversation state found for %s', mask_phone(normalize_phone_number(phone_number)))
+        return False
             
     def parse_availability(self, message_text):
-        """Parse availability from a message text"""
-        # This is a simple implementation and can be enhanced with NLP
-        try:
-            # Example format: "Monday 2pm-4pm, Tuesday 10am-12pm"
-            availability = []
-            
-            # Debug logging
-            print(f"Parsing availability from: '{message_text}'")
-            
-            # Handle single day-time entry without comma
-            if ',' not in message_text:
-                parts = [message_text]
-            else:
-                parts = message_text.split(',')
-            
-            for part in parts:
-                part = part.strip()
-                print(f"Processing part: '{part}'")
-                
-                # Split by space to get day and time range
-                segments = part.split()
-                if len(segments) < 2:
-                    print(f"Invalid format, not enough segments: {segments}")
-                    continue
-                
-                # The first segment is the day, the rest combined is the time range
-                day = segments[0].strip().lower()
-                time_range = ' '.join(segments[1:]).strip()
-                
-                print(f"Day: '{day}', Time range: '{time_range}'")
-                
-                # Split time range by hyphen
-                if '-' not in time_range:
-                    print(f"Invalid time range format, missing hyphen: {time_range}")
-                    continue
-                
-                time_parts = time_range.split('-')
-                if len(time_parts) != 2:
-                    print(f"Invalid time range format: {time_range}")
-                    continue
-                
-                start_time_str = time_parts[0].strip().lower()
-                end_time_str = time_parts[1].strip().lower()
-                
-                print(f"Start time: '{start_time_str}', End time: '{end_time_str}'")
-                
-                # Convert to datetime objects
-                now = datetime.now()
-                weekday_map = {
-                    'monday': 0, 'tuesday': 1, 'wednesday': 2,
-                    'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6,
-                    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6
-                }
-                
-                if day not in weekday_map:
-                    print(f"Invalid day: {day}")
-                    continue
-                
-                # Calculate the date for the next occurrence of this weekday
-                days_ahead = weekday_map[day] - now.weekday()
-                if days_ahead <= 0:  # Target day already happened this week
-                    days_ahead += 7
-                
-                target_date = now + timedelta(days=days_ahead)
-                print(f"Target date: {target_date.strftime('%Y-%m-%d')}")
-                
-                # Parse time strings
-                try:
-                    # Handle various time formats
-                    start_hour, start_minute = self._parse_time(start_time_str)
-                    end_hour, end_minute = self._parse_time(end_time_str)
-                    
-                    print(f"Parsed start: {start_hour}:{start_minute}, end: {end_hour}:{end_minute}")
-                    
-                    start_time = target_date.replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
-                    end_time = target_date.replace(hour=end_hour, minute=end_minute, second=0, microsecond=0)
-                    
-                    print(f"Final start time: {start_time}, end time: {end_time}")
-                    
-                    availability.append((start_time, end_time))
-                except ValueError as e:
-                    print(f"Error parsing time: {e}")
-                    continue
-            
-            print(f"Final availability slots: {availability}")
-            return availability
-        except Exception as e:
-            print(f"Error parsing availability: {e}")
-            return []
-    
-    def _parse_time(self, time_str):
-        """Parse a time string into hour and minute components"""
-        time_str = time_str.lower().strip()
-        
-        # Handle am/pm format
-        is_pm = 'pm' in time_str
-        time_str = time_str.replace('am', '').replace('pm', '').strip()
-        
-        # Handle hour:minute format
-        if ':' in time_str:
-            hour_str, minute_str = time_str.split(':')
-            hour = int(hour_str)
-            minute = int(minute_str)
-        else:
-            # Handle hour only format
-            hour = int(time_str)
-            minute = 0
-        
-        # Adjust for PM
-        if is_pm and hour < 12:
-            hour += 12
-        
-        # Validate hour and minute
-        if hour < 0 or hour > 23 or minute < 0 or minute > 59:
-            raise ValueError(f"Invalid time: {hour}:{minute}")
-        
-        return hour, minute
+        """Parse availability from a message text into (start, end) datetimes"""
+        return parse_availability(message_text)
     
     def verify_calendar_event(self, calendar_id, event_id):
         """Verify that a calendar event exists and has proper notifications"""
         try:
             event = self.calendar_service.get_event(calendar_id, event_id)
             if not event:
-                print(f"Error: Could not retrieve event {event_id}")
+                logger.error('Could not retrieve event %s', event_id)
                 return False
                 
             # Check if attendees are set correctly
             if 'attendees' not in event:
-                print("Warning: No attendees found in event")
+                logger.warning('No attendees found in event')
                 return False
                 
-            print(f"Event verification successful for event {event_id}")
+            logger.info('Event verification successful for event %s', event_id)
             return True
         except Exception as e:
-            print(f"Error verifying calendar event: {e}")
+            logger.error('Error verifying calendar event: %s', e)
             return False 
\ No newline at end of file
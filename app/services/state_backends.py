@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models.database import after_rollback, commit, db
+from app.models.models import ConversationState
+
+logger = logging.getLogger(__name__)
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE
+UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+class StaleConversationState(Exception):
+    """Raised when a conversation state was written by someone else since it was loaded"""
+
+def _check_version(phone_number, previous, version):
+    """Raise StaleConversationState unless the (state, context, version) record is at the expected version"""
+    current_version = previous[2] if previous is not None else None
+    if current_version != version:
+        raise StaleConversationState(phone_number)
+
+class SQLStateBackend:
+    """Conversation states in the conversation_state table of the main database.
+
+    Like every backend, it takes and returns contexts as JSON strings, along
+    with the version of the record: a save only succeeds when the record is
+    still at the version it was loaded at (None when there was no record).
+    Writes join the current unit of work, so they commit or roll back with
+    the rest of the message.
+    """
+
+    name = 'sql'
+
+    def load(self, phone_number):
+        """Return (state, context JSON, version) for a normalized phone number, or None"""
+        row = db.session.query(
+            ConversationState.current_state, ConversationState.context, ConversationState.version
+        ).filter_by(phone_number=phone_number).first()
+        if row is None:
+            return None
+        context = row.context if isinstance(row.context, dict) else {}
+        return row.current_state or 'initial', json.dumps(context), row.version
+
+    def save(self, phone_number, current_state, context_json, version):
+        """Insert or update the state of a phone number in one conditional statement and return its new version"""
+        context = json.loads(context_json)
+        now = datetime.utcnow()
+        if version is None:
+            insert = UPSERT_DIALECTS.get(db.engine.dialect.name)
+            if insert is None:
+                # Other databases: a concurrent insert fails on the unique phone number instead
+                if ConversationState.query.filter_by(phone_number=phone_number).first() is not None:
+                    raise StaleConversationState(phone_number)
+                db.session.add(ConversationState(phone_number=phone_number, current_state=current_state,
+                                                 context=context, version=1))
+            else:
+                statement = insert(ConversationState.__table__).values(
+                    phone_number=phone_number,
+                    current_state=current_state,
+                    context=context,
+                    version=1,
+                    created_at=now,
+                    updated_at=now
+                )
+                result = db.session.execute(statement.on_conflict_do_nothing(
+                    index_elements=[ConversationState.phone_number]))
+                if not result.rowcount:
+                    raise StaleConversationState(phone_number)
+        else:
+            updated = ConversationState.query.filter_by(phone_number=phone_number, version=version).update(
+                {'current_state': current_state, 'context': context, 'version': version + 1, 'updated_at': now},
+                synchronize_session=False)
+            if not updated:
+                raise StaleConversationState(phone_number)
+        commit()
+        return (version or 0) + 1
+
+    def undo_save(self, phone_number, previous, new_version):
+        """The unit of work's transaction rolls the write back, so there is nothing to undo"""
+
+    def delete(self, phone_number):
+        """Delete the state of a phone number; returns whether there was one"""
+        deleted = ConversationState.query.filter_by(phone_number=phone_number).delete(synchronize_session=False)
+        commit()
+        return deleted > 0
+
+    def rollback(self):
+        """Discard a failed write outside of a unit of work"""
+        db.session.rollback()
+
+class MemoryStateBackend:
+    """Conversation states in a process-local dict, for tests, benchmarks and single-process setups.
+
+    States do not survive a restart. Writes made inside a unit of work that
+    rolls back are undone, unless the record was written again since.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        """Initialize the backend"""
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def load(self, phone_number):
+        """Return (state, context JSON, version) for a normalized phone number, or None"""
+        with self._lock:
+            return self._states.get(phone_number)
+
+    def save(self, phone_number, current_state, context_json, version):
+        """Store the state of a phone number if it is still at `version`, and return its new version"""
+        new_version = (version or 0) + 1
+        with self._lock:
+            _check_version(phone_number, self._states.get(phone_number), version)
+            self._set(phone_number, (current_state, context_json, new_version))
+        return new_version
+
+    def undo_save(self, phone_number, previous, new_version):
+        """Put back the record a save replaced, unless it was written again since"""
+        with self._lock:
+            current = self._states.get(phone_number)
+            if current is not None and current[2] == new_version:
+                self._set(phone_number, previous)
+
+    def delete(self, phone_number):
+        """Delete the state of a phone number; returns whether there was one"""
+        with self._lock:
+            previous = self._states.pop(phone_number, None)
+        if previous is not None:
+            after_rollback(self._restore_deleted, phone_number, previous)
+        return previous is not None
+
+    def rollback(self):
+        """Writes are applied immediately, so there is nothing to discard"""
+
+    def _restore_deleted(self, phone_number, previous):
+        with self._lock:
+            self._states.setdefault(phone_number, previous)
+
+    def _set(self, phone_number, value):
+        if value is None:
+            self._states.pop(phone_number, None)
+        else:
+            self._states[phone_number] = value
+
+class SQLiteFileStateBackend(MemoryStateBackend):
+    """Conversation states in their own SQLite file in WAL mode, off the main database.
+
+    Readers never block the writer, and every write is one autocommitted
+    upsert, so hot conversation traffic no longer competes with the admin
+    panel for the main database lock. Each thread keeps its own connection.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path='conversation_state.db', timeout=5.0):
+        """Initialize the backend and create its table if needed"""
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS conversation_state ("
+            "phone_number TEXT PRIMARY KEY, "
+            "current_state TEXT NOT NULL, "
+            "context TEXT NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0, "
+            "updated_at REAL NOT NULL)"
+        )
+        # Files created before writes were versioned
+        columns = {row[1] for row in self._connect().execute("PRAGMA table_info(conversation_state)")}
+        if 'version' not in columns:
+            self._connect().execute("ALTER TABLE conversation_state ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def load(self, phone_number):
+        """Return (state, context JSON, version) for a normalized phone number, or None"""
+        return self._connect().execute(
+            "SELECT current_state, context, version FROM conversation_state WHERE phone_number = ?",
+            (phone_number,)
+        ).fetchone()
+
+    def save(self, phone_number, current_state, context_json, version):
+        """Store the state of a phone number in one conditional statement and return its new version"""
+        new_version = (version or 0) + 1
+        connection = self._connect()
+        if version is None:
+            cursor = connection.execute(
+                "INSERT INTO conversation_state (phone_number, current_state, context, version, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(phone_number) DO NOTHING",
+                (phone_number, current_state, context_json, new_version, time.time())
+            )
+        else:
+            cursor = connection.execute(
+                "UPDATE conversation_state SET current_state = ?, context = ?, version = ?, updated_at = ? "
+                "WHERE phone_number = ? AND version = ?",
+                (current_state, context_json, new_version, time.time(), phone_number, version)
+            )
+        if not cursor.rowcount:
+            raise StaleConversationState(phone_number)
+        return new_version
+
+    def undo_save(self, phone_number, previous, new_version):
+        """Put back the record a save replaced, unless it was written again since"""
+        connection = self._connect()
+        if previous is None:
+            connection.execute("DELETE FROM conversation_state WHERE phone_number = ? AND version = ?",
+                               (phone_number, new_version))
+            return
+        current_state, context_json, version = previous
+        connection.execute(
+            "UPDATE conversation_state SET current_state = ?, context = ?, version = ?, updated_at = ? "
+            "WHERE phone_number = ? AND version = ?",
+            (current_state, context_json, version, time.time(), phone_number, new_version)
+        )
+
+    def delete(self, phone_number):
+        """Delete the state of a phone number; returns whether there was one"""
+        previous = self.load(phone_number)
+        if previous is None:
+            return False
+        self._connect().execute("DELETE FROM conversation_state WHERE phone_number = ?", (phone_number,))
+        after_rollback(self._restore_deleted, phone_number, previous)
+        return True
+
+    def _restore_deleted(self, phone_number, previous):
+        current_state, context_json, version = previous
+        self._connect().execute(
+            "INSERT INTO conversation_state (phone_number, current_state, context, version, updated_at) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(phone_number) DO NOTHING",
+            (phone_number, current_state, context_json, version, time.time())
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode: every statement is its own short transaction
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL stays consistent after a crash with NORMAL; only the last writes may be lost
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+BACKENDS = {
+    SQLStateBackend.name: SQLStateBackend,
+    MemoryStateBackend.name: MemoryStateBackend,
+    SQLiteFileStateBackend.name: SQLiteFileStateBackend,
+}
+
+def backend_from_env():
+    """Create the state backend named by CONVERSATION_STATE_BACKEND (sql, memory or sqlite)"""
+    name = os.getenv('CONVERSATION_STATE_BACKEND', SQLStateBackend.name)
+    if name not in BACKENDS:
+        logger.warning("Unknown conversation state backend '%s', using %s", name, SQLStateBackend.name)
+        name = SQLStateBackend.name
+    if name == SQLiteFileStateBackend.name:
+        return SQLiteFileStateBackend(os.getenv('CONVERSATION_STATE_PATH', 'conversation_state.db'))
+    return BACKENDS[name]()
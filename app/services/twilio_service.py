@@ -1,19 +1,47 @@
 import os
+import threading
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
+from twilio.request_validator import RequestValidator
 from twilio.rest import Client
 from dotenv import load_dotenv
+from app.services.metrics import metrics
+from app.services.rate_limiter import sender_rate_limiter
 
 # Load environment variables
 load_dotenv()
 
+_client_lock = threading.Lock()
+_shared_client = None
+
+def shared_client():
+    """Return the process-wide Twilio client, whose HTTP session keeps its connections open between calls"""
+    global _shared_client
+    with _client_lock:
+        if _shared_client is None:
+            http_client = TwilioHttpClient(pool_connections=True, timeout=float(os.getenv('TWILIO_HTTP_TIMEOUT', 10)))
+            # Enough pooled connections for every sender worker to keep its own
+            http_client.session.mount('https://', HTTPAdapter(pool_maxsize=int(os.getenv('TWILIO_HTTP_POOL_SIZE', 10))))
+            _shared_client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'),
+                                    http_client=http_client)
+        return _shared_client
+
+def is_signed_by_twilio(url, params, signature):
+    """Check the X-Twilio-Signature of a webhook request made to `url` with the POST `params`"""
+    if not signature:
+        return False
+    return RequestValidator(os.getenv('TWILIO_AUTH_TOKEN')).validate(url, params, signature)
+
 class TwilioService:
     """Service for interacting with Twilio API for WhatsApp messaging"""
     
-    def __init__(self):
-        """Initialize the Twilio client"""
+    def __init__(self, client=None, rate_limiter=None):
+        """Initialize the service on the shared Twilio client"""
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.phone_number = os.getenv('TWILIO_PHONE_NUMBER')
-        self.client = Client(self.account_sid, self.auth_token)
+        self.client = client if client is not None else shared_client()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else sender_rate_limiter
     
     def send_whatsapp_message(self, to_number, message):
         """Send a WhatsApp message using Twilio"""
@@ -24,12 +52,16 @@ class TwilioService:
         # Format the 'from' number for WhatsApp
         from_number = f'whatsapp:{self.phone_number}'
         
+        # Stay under Twilio's per-number throughput limit
+        self.rate_limiter.acquire(from_number)
+        
         # Send the message
-        message = self.client.messages.create(
-            body=message,
-            from_=from_number,
-            to=to_number
-        )
+        with metrics.api_call('twilio', 'messages.create', conversation=to_number):
+            message = self.client.messages.create(
+                body=message,
+                from_=from_number,
+                to=to_number
+            )
         
         return message.sid
     
@@ -45,12 +77,15 @@ class TwilioService:
         # Prepare the content SID
         content_sid = os.getenv('TWILIO_CONTENT_SID')
         
+        self.rate_limiter.acquire(from_number)
+        
         # Send the template message
-        message = self.client.messages.create(
-            content_sid=content_sid,
-            from_=from_number,
-            to=to_number,
-            content_variables=template_data
-        )
+        with metrics.api_call('twilio', 'messages.create', conversation=to_number):
+            message = self.client.messages.create(
+                content_sid=content_sid,
+                from_=from_number,
+                to=to_number,
+                content_variables=template_data
+            )
         
         return message.sid 
\ No newline at end of file
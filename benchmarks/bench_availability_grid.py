@@ -0,0 +1,100 @@
+import os
+import sys
+import random
+from datetime import datetime, timedelta
+
+# Allow running as `python benchmarks/bench_availability_grid.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+
+from app.services.availability_grid import AvailabilityGrid
+from bench_slot_search import best_of, generate_busy_periods, legacy_find_slots
+
+def legacy_match_slots(recruiter_slots, candidate_windows, duration_minutes=60):
+    """The nested recruiter x candidate overlap loop of find_matching_slots before the minute grid"""
+    matching_slots = []
+    for recruiter_start, recruiter_end in recruiter_slots:
+        for candidate_start, candidate_end in candidate_windows:
+            overlap_start = max(recruiter_start, candidate_start)
+            overlap_end = min(recruiter_end, candidate_end)
+            if overlap_start < overlap_end:
+                if (overlap_end - overlap_start).total_seconds() / 60 >= duration_minutes:
+                    matching_slots.append((overlap_start, overlap_start + timedelta(minutes=duration_minutes)))
+    return matching_slots
+
+def generate_candidate_windows(start_date, days, seed=7):
+    """One or two windows of availability per weekday, like parsed WhatsApp replies"""
+    rng = random.Random(seed)
+    windows = []
+    for day in range(days):
+        date = start_date + timedelta(days=day)
+        if date.weekday() >= 5:
+            continue
+        for _ in range(rng.choice([1, 2])):
+            window_start = date.replace(hour=rng.randrange(9, 16), minute=rng.choice([0, 30]))
+            windows.append((window_start, window_start + timedelta(hours=rng.choice([1, 2, 3]))))
+    return windows
+
+def run_recruiters_benchmark(recruiters=300, busy_per_recruiter=120, days=30, duration_minutes=60, repeat=3):
+    """Free slots for many recruiters over a month: per-calendar loops vs one grid pass"""
+    start_date = datetime(2025, 3, 3, 8, 0)
+    end_date = start_date + timedelta(days=days)
+    busy_by_recruiter = {
+        f"recruiter-{i}": generate_busy_periods(busy_per_recruiter, start_date, days, seed=i)
+        for i in range(recruiters)
+    }
+
+    legacy_time, legacy_slots = best_of(lambda: {
+        key: legacy_find_slots(busy, start_date, end_date, duration_minutes)
+        for key, busy in busy_by_recruiter.items()
+    }, repeat)
+
+    grid_time, grid_slots = best_of(
+        lambda: AvailabilityGrid(start_date, end_date).free_slots_many(busy_by_recruiter, duration_minutes), repeat)
+
+    if legacy_slots != grid_slots:
+        raise AssertionError("Minute grid returned different slots than the legacy loop")
+
+    print(f"Recruiters: {recruiters}, busy blocks each: {busy_per_recruiter}, window: {days} days")
+    print(f"Free slots found: {sum(len(slots) for slots in grid_slots.values())}")
+    print(f"Legacy loops: {legacy_time * 1000:.2f} ms")
+    print(f"Minute grid:  {grid_time * 1000:.2f} ms")
+    print(f"Speedup:      {legacy_time / grid_time:.1f}x")
+
+def run_matching_benchmark(busy_count=300, days=30, duration_minutes=60, repeat=5):
+    """Candidate/recruiter matching: nested overlap loop vs grid intersection"""
+    start_date = datetime(2025, 3, 3, 8, 0)
+    end_date = start_date + timedelta(days=days)
+    grid = AvailabilityGrid(start_date, end_date)
+    recruiter_slots = grid.free_slots(generate_busy_periods(busy_count, start_date, days), duration_minutes)
+    candidate_windows = generate_candidate_windows(start_date, days)
+
+    legacy_time, legacy_slots = best_of(
+        lambda: legacy_match_slots(recruiter_slots, candidate_windows, duration_minutes), repeat)
+
+    def grid_match():
+        grid = AvailabilityGrid(start_date, end_date)
+        overlap = (grid.intervals_mask(recruiter_slots, expand=False)
+                   & grid.intervals_mask(candidate_windows, expand=False))
+        return grid.slots(overlap, duration_minutes)
+
+    grid_time, grid_slots = best_of(grid_match, repeat)
+
+    # The grid packs slots from the start of each overlap, so every legacy match overlaps a grid slot
+    for match_start, match_end in legacy_slots:
+        if not any(start < match_end and match_start < end for start, end in grid_slots):
+            raise AssertionError("Minute grid missed an overlap found by the legacy loop")
+
+    print(f"Recruiter slots: {len(recruiter_slots)}, candidate windows: {len(candidate_windows)}")
+    print(f"Matches: legacy {len(legacy_slots)}, grid {len(grid_slots)}")
+    print(f"Legacy loop:  {legacy_time * 1000:.2f} ms")
+    print(f"Minute grid:  {grid_time * 1000:.2f} ms")
+    print(f"Speedup:      {legacy_time / grid_time:.1f}x")
+
+if __name__ == '__main__':
+    run_recruiters_benchmark()
+    print()
+    run_matching_benchmark()
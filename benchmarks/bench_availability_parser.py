@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Allow running as `python benchmarks/bench_availability_parser.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'availability_corpus.json')
+
+def load_corpus(path=CORPUS_PATH):
+    """Return (reference time, [(phrase, expected slots)]) from the availability corpus"""
+    with open(path) as corpus_file:
+        corpus = json.load(corpus_file)
+    phrases = [
+        (entry['text'], [(datetime.fromisoformat(start), datetime.fromisoformat(end))
+                         for start, end in entry['expected']])
+        for entry in corpus['phrases']
+    ]
+    return datetime.fromisoformat(corpus['reference']), phrases
+
+def accuracy(parse, reference, phrases):
+    """Return the phrases whose parsed slots differ from the expected ones"""
+    failures = []
+    for text, expected in phrases:
+        slots = parse(text, reference)
+        if slots != expected:
+            failures.append((text, slots))
+    return failures
+
+def phrases_per_second(parse, reference, phrases, passes, before_pass=None):
+    """Parse the whole corpus `passes` times and return the throughput"""
+    started = time.perf_counter()
+    for _ in range(passes):
+        if before_pass is not None:
+            before_pass()
+        for text, _ in phrases:
+            parse(text, reference)
+    return passes * len(phrases) / (time.perf_counter() - started)
+
+def run_benchmark(passes=200):
+    """Report the parser's accuracy on the corpus and its throughput with a cold and a warm cache"""
+    from app.services.availability_parser import _parse_slots, parse_availability
+    reference, phrases = load_corpus()
+
+    failures = accuracy(parse_availability, reference, phrases)
+    print(f"Accuracy: {len(phrases) - len(failures)}/{len(phrases)} phrases")
+    for text, slots in failures:
+        print(f"  mismatch: {text!r} -> {slots}")
+
+    cold = phrases_per_second(parse_availability, reference, phrases, passes, before_pass=_parse_slots.cache_clear)
+    warm = phrases_per_second(parse_availability, reference, phrases, passes)
+    print(f"Cold cache: {cold:9.0f} phrases/s")
+    print(f"Warm cache: {warm:9.0f} phrases/s")
+
+if __name__ == '__main__':
+    run_benchmark()
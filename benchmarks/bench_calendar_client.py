@@ -0,0 +1,57 @@
+import os
+import sys
+import pickle
+import tempfile
+import time
+
+# Allow running as `python benchmarks/bench_calendar_client.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from app.services.calendar_client import CalendarClient
+from app.services.google_calendar import GoogleCalendarService
+
+def legacy_setup(token_path):
+    """Per-request setup as it was before the shared client: read the token file and build the service"""
+    with open(token_path, 'rb') as token:
+        credentials = pickle.load(token)
+    return build('calendar', 'v3', credentials=credentials, static_discovery=True)
+
+def shared_setup(client):
+    """Per-request setup with the process-wide client"""
+    return GoogleCalendarService(client=client).get_calendar_service()
+
+def time_per_call(func, iterations):
+    """Return the average wall-clock time of func in milliseconds"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) * 1000 / iterations
+
+def run_benchmark(iterations=200):
+    """Compare the per-request cost of getting a calendar service"""
+    with tempfile.TemporaryDirectory() as directory:
+        # A token that never expires, so neither path makes a network call
+        token_path = os.path.join(directory, 'token.pickle')
+        with open(token_path, 'wb') as token:
+            pickle.dump(Credentials(token='benchmark'), token)
+
+        client = CalendarClient(token_path=token_path)
+        shared_setup(client)  # Warm the discovery document and this thread's service
+
+        legacy_ms = time_per_call(lambda: legacy_setup(token_path), iterations)
+        shared_ms = time_per_call(lambda: shared_setup(client), iterations)
+
+    print(f"Iterations: {iterations}")
+    print(f"Token read + build():  {legacy_ms:.3f} ms per request")
+    print(f"Shared calendar client: {shared_ms:.3f} ms per request")
+    print(f"Speedup:               {legacy_ms / shared_ms:.0f}x")
+    return legacy_ms, shared_ms
+
+if __name__ == '__main__':
+    run_benchmark()
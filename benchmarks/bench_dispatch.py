@@ -0,0 +1,45 @@
+import contextlib
+import os
+import sys
+import time
+
+# Allow running as `python benchmarks/bench_dispatch.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+os.environ['BACKGROUND_JOB_WORKERS'] = '0'
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ['CONVERSATION_STATE_BACKEND'] = 'memory'
+
+# One conversation: greeting, name, a 'continue', email, a calendar question and a reset
+CONVERSATION = ['Hi', 'Jane Doe', 'continue', 'jane@example.com', 'Did I get the calendar invite?', 'start over']
+
+def run_messages(handler, messages, conversations=200):
+    """Send `messages` messages through handle_message, spread over several conversations"""
+    for i in range(messages):
+        conversation, step = divmod(i, len(CONVERSATION))
+        handler.handle_message(f"whatsapp:+1555{conversation % conversations:07d}", CONVERSATION[step])
+
+def run_benchmark(messages=6000, repeats=3):
+    """Measure messages per second through ConversationHandler.handle_message with in-memory conversation states"""
+    from app import create_app
+    from app.services.conversation_handler import ConversationHandler
+    app = create_app()
+
+    with app.app_context():
+        handler = ConversationHandler()
+        best = 0.0
+        # The handler prints a lot; keep the terminal out of the measurement
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            run_messages(handler, len(CONVERSATION) * 200)
+            for _ in range(repeats):
+                started = time.perf_counter()
+                run_messages(handler, messages)
+                best = max(best, messages / (time.perf_counter() - started))
+
+    print(f"handle_message: {best:9.0f} msg/s ({messages} messages, best of {repeats})")
+
+if __name__ == '__main__':
+    run_benchmark()
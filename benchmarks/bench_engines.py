@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+# Allow running as `python benchmarks/bench_engines.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+os.environ['BACKGROUND_JOB_WORKERS'] = '0'
+os.environ['TWILIO_SENDER_WORKERS'] = '0'
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+# The default-slot generator logs every call; keep that out of the timings
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'engines_baseline.json')
+
+# Fixed times, so that every run works on the same synthetic data
+START_DATE = datetime(2025, 3, 3, 8, 0)
+REFERENCE_TIME = datetime(2025, 3, 5, 10, 0)
+
+DAY_NAMES = ['Monday', 'Tue', 'Wednesday', 'Thu', 'Friday', 'tomorrow', 'today']
+RANGES = ['9am-11am', '2pm-4pm', '10:30-12', '1 to 3pm', '3:15pm-5pm', 'from 9 to 10:30am']
+
+def generate_busy_periods(count, days, seed):
+    """Unsorted, overlapping busy blocks spread over `days` days, like a shared recruiter calendar"""
+    rng = random.Random(seed)
+    busy_periods = []
+    for _ in range(count):
+        start = START_DATE + timedelta(minutes=rng.randrange(0, days * 24 * 60))
+        busy_periods.append((start, start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))))
+    return busy_periods
+
+def generate_availability_text(clauses, seed):
+    """A WhatsApp availability reply with `clauses` day and time ranges"""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(clauses):
+        days = ' and '.join(rng.sample(DAY_NAMES[:5], rng.choice([1, 1, 2])))
+        parts.append(f"{days} {rng.choice(RANGES)}")
+    return ', '.join(parts)
+
+def generate_candidate_windows(days, seed):
+    """One or two windows of availability per weekday, like parsed WhatsApp replies"""
+    rng = random.Random(seed)
+    windows = []
+    for day in range(days):
+        date = START_DATE + timedelta(days=day)
+        if date.weekday() >= 5:
+            continue
+        for _ in range(rng.choice([1, 2])):
+            window_start = date.replace(hour=rng.randrange(9, 16), minute=rng.choice([0, 30]))
+            windows.append((window_start, window_start + timedelta(hours=rng.choice([1, 2, 3]))))
+    return windows
+
+def fake_calendar_with(busy_by_calendar):
+    """A FakeCalendarBackend holding the given busy blocks"""
+    from app.services.fake_calendar import FakeCalendarBackend
+    fake_calendar = FakeCalendarBackend()
+    for calendar_id, busy_periods in busy_by_calendar.items():
+        for start, end in busy_periods:
+            fake_calendar.add_busy(calendar_id, start, end)
+    return fake_calendar
+
+def build_cases(app):
+    """Return {case name: zero-argument callable} for every engine at every size"""
+    from app.services.availability_parser import _parse_slots, parse_availability
+    from app.services.freebusy_cache import FreeBusyCache
+    from app.services.google_calendar import GoogleCalendarService
+    from app.services.recruiter_assignment import RecruiterAssigner
+    from app.services.scheduling_service import SchedulingService
+
+    cases = {}
+    # A TTL of 0 disables the free/busy cache, so every call runs the whole engine
+    no_cache = FreeBusyCache(ttl_seconds=0)
+    scheduling_service = SchedulingService()
+
+    for busy_count in (50, 400, 3200):
+        end_date = START_DATE + timedelta(days=30)
+        busy_periods = generate_busy_periods(busy_count, 30, seed=busy_count)
+        calendar_service = GoogleCalendarService(service=fake_calendar_with({'cal': busy_periods}), cache=no_cache)
+        cases[f"find_available_slots/busy={busy_count}"] = (
+            lambda service=calendar_service, end=end_date: service.find_available_slots('cal', START_DATE, end))
+
+        # The slot search alone, without the free/busy round trip through the fake
+        cases[f"find_free_slots/busy={busy_count}"] = (
+            lambda service=calendar_service, busy=busy_periods, end=end_date:
+            service._find_free_slots(busy, START_DATE, end))
+
+    # The default slots always cover 7 days; longer working days mean more slots
+    calendar_service = GoogleCalendarService(service=fake_calendar_with({}), cache=no_cache)
+    for hours in (4, 8, 24):
+        end_date = START_DATE + timedelta(days=7)
+        cases[f"generate_default_slots/hours={hours}"] = (
+            lambda hours=hours, end=end_date: calendar_service._generate_default_slots(
+                START_DATE, end, working_hours=(0 if hours == 24 else 9, 24 if hours == 24 else 9 + hours)))
+
+    for days in (7, 30, 120):
+        end_date = START_DATE + timedelta(days=days)
+        grid_service = GoogleCalendarService(service=fake_calendar_with({}), cache=no_cache)
+        recruiter_slots = grid_service._find_free_slots(
+            generate_busy_periods(days * 10, days, seed=days), START_DATE, end_date)
+        candidate_windows = generate_candidate_windows(days, seed=days)
+        cases[f"match_slots/days={days}"] = (
+            lambda slots=recruiter_slots, windows=candidate_windows, end=end_date:
+            scheduling_service.match_slots(slots, windows, START_DATE, end))
+
+    # find_offers is the engine behind the overlap search of handle_availability_state
+    for recruiter_count in (5, 20, 80):
+        busy_by_calendar = {f"recruiter-{i}": generate_busy_periods(60, 7, seed=i) for i in range(recruiter_count)}
+        service = SchedulingService()
+        service.calendar_service = GoogleCalendarService(service=fake_calendar_with(busy_by_calendar), cache=no_cache)
+        windows = generate_candidate_windows(7, seed=recruiter_count)
+        cases[f"find_offers/recruiters={recruiter_count}"] = _in_app_context(
+            app, lambda assigner=RecruiterAssigner(service), windows=windows:
+            assigner.find_offers(windows, START_DATE, START_DATE + timedelta(days=7)))
+
+    for clauses in (1, 4, 16):
+        text = generate_availability_text(clauses, seed=clauses)
+
+        def parse_cold(text=text):
+            _parse_slots.cache_clear()
+            return parse_availability(text, REFERENCE_TIME)
+
+        cases[f"parse_availability_cold/clauses={clauses}"] = parse_cold
+        cases[f"parse_availability_warm/clauses={clauses}"] = (
+            lambda text=text: parse_availability(text, REFERENCE_TIME))
+        # The SchedulingService entry point parses relative to the current time
+        cases[f"scheduling_service_parse_availability/clauses={clauses}"] = (
+            lambda text=text: scheduling_service.parse_availability(text))
+    return cases
+
+def _in_app_context(app, func):
+    """Wrap func to run in an app context, as find_offers reads the recruiters from the database"""
+    from app.models.database import db
+
+    def run():
+        with app.app_context():
+            result = func()
+            db.session.remove()
+            return result
+    return run
+
+def time_case(func, repeat):
+    """Return the best seconds per call over `repeat` runs of an auto-sized loop"""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops
+
+def run_benchmarks(selected=None, repeat=5):
+    """Time every case whose name contains one of `selected` (all by default) and return {name: seconds}"""
+    from app import create_app
+    from app.models.database import db
+    app = create_app()
+    cases = build_cases(app)
+
+    results = {}
+    for name, func in cases.items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        if name.startswith('find_offers/'):
+            # The cases share the in-memory database; each one needs exactly its own recruiters
+            seed_recruiters(app, int(name.split('=')[1]))
+        results[name] = time_case(func, repeat)
+        print(f"{name:<50} {results[name] * 1e6:12.1f} us", flush=True)
+    with app.app_context():
+        db.session.remove()
+    return results
+
+def seed_recruiters(app, recruiter_count):
+    """Replace the recruiters in the database with recruiter-0 .. recruiter-N, whose calendars the fakes hold"""
+    from app.models.database import db
+    from app.models.models import Recruiter
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([Recruiter(name=f"Recruiter {i}", email=f"recruiter{i}@example.com",
+                                      calendar_id=f"recruiter-{i}")
+                            for i in range(recruiter_count)])
+        db.session.commit()
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Store results as the baseline that --compare checks against"""
+    with open(path, 'w') as baseline_file:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+def compare(results, baseline, threshold):
+    """Print each case against the baseline and return the names that got slower by more than `threshold`"""
+    regressions = []
+    print()
+    print(f"{'case':<50}{'baseline us':>13}{'now us':>11}{'change':>9}")
+    for name, seconds in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<50}{'-':>13}{seconds * 1e6:11.1f}{'new':>9}")
+            continue
+        change = seconds / before - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{name:<50}{before * 1e6:13.1f}{seconds * 1e6:11.1f}{change:+9.0%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the slot and parsing engines on seeded synthetic data')
+    parser.add_argument('cases', nargs='*', help='only run cases whose name contains one of these')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='fail when a case regressed against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown before a case counts as a regression (0.25 = 25%%)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file to save to or compare against')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case; the best one counts')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.repeat)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    if args.compare:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('python') != platform.python_version() or baseline.get('machine') != platform.machine():
+            print(f"Note: baseline recorded on Python {baseline.get('python')} / {baseline.get('machine')}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        print(f"\nNo case regressed by more than {args.threshold:.0%}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
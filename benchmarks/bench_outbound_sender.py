@@ -0,0 +1,60 @@
+import logging
+import os
+import sys
+import time
+
+# Allow running as `python benchmarks/bench_outbound_sender.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+os.environ['BACKGROUND_JOB_WORKERS'] = '0'
+os.environ['TWILIO_SENDER_WORKERS'] = '0'
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
+def send_batch(app, workers, messages, latency, rate_per_second=0, throttled=0):
+    """Send a batch through an OutboundSender backed by the fake Twilio endpoint and return its stats"""
+    from twilio.rest import Client
+    from app.services.background_jobs import BackgroundJobQueue
+    from app.services.fake_twilio import FakeTwilioHttpClient
+    from app.services.outbound_sender import OutboundSender, is_retryable
+    from app.services.rate_limiter import RateLimiter
+    from app.services.twilio_service import TwilioService
+
+    fake_twilio = FakeTwilioHttpClient(latency=latency)
+    fake_twilio.fail_next(429, throttled)
+    service = TwilioService(client=Client('ACbenchmark', 'benchmark', http_client=fake_twilio),
+                            rate_limiter=RateLimiter(rate_per_second=rate_per_second, burst=1))
+    queue = BackgroundJobQueue(app, workers=workers, max_attempts=5, base_delay=0.01, max_delay=0.1,
+                               retry_on=is_retryable)
+    sender = OutboundSender(queue, twilio_service=service)
+
+    started = time.perf_counter()
+    queue.start()
+    for i in range(messages):
+        sender.send(f"+1555{i:07d}", f"Batch message {i}")
+    while sender.stats()['sent'] + sender.stats()['failed'] < messages:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    queue.stop()
+    return messages / elapsed, sender.stats()
+
+def run_benchmark(messages=200, latency=0.02):
+    """Compare sender pool sizes against a fake endpoint that takes `latency` seconds per request"""
+    from app import create_app
+    app = create_app()
+
+    print(f"{messages} messages, {latency * 1000:.0f} ms per Twilio request")
+    for workers in (1, 4, 8):
+        throughput, stats = send_batch(app, workers, messages, latency)
+        print(f"{workers} worker(s):                 {throughput:7.0f} msg/s")
+    # Every retry logs a warning; keep them off the terminal
+    logging.getLogger('app.services.background_jobs').setLevel(logging.ERROR)
+    throughput, stats = send_batch(app, 8, messages, latency, throttled=20)
+    print(f"8 workers, 20 throttled (429):  {throughput:7.0f} msg/s, {stats['retried']} retries, {stats['failed']} failed")
+    throughput, stats = send_batch(app, 8, messages // 4, latency, rate_per_second=25)
+    print(f"8 workers, limited to 25/s:     {throughput:7.0f} msg/s, {stats['rate_limit_waits']} waits")
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,104 @@
+import os
+import sys
+import random
+import time
+from datetime import datetime, timedelta
+
+# Allow running as `python benchmarks/bench_slot_search.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+
+from app.services.google_calendar import GoogleCalendarService
+
+def generate_busy_periods(count, start_date, days, seed=42):
+    """Generate unsorted, overlapping busy blocks like a shared recruiter calendar"""
+    rng = random.Random(seed)
+    busy_periods = []
+    for _ in range(count):
+        start = start_date + timedelta(minutes=rng.randrange(0, days * 24 * 60))
+        end = start + timedelta(minutes=rng.choice([5, 10, 15, 30, 45, 60]))
+        busy_periods.append((start, end))
+    return busy_periods
+
+def legacy_find_slots(busy_periods, start_date, end_date, duration_minutes=60, working_hours=(9, 17)):
+    """The slot search loop as it was before the busy index and the minute grid (O(slots x busy))"""
+    available_slots = []
+    current_date = start_date
+    
+    while current_date < end_date:
+        day_start = current_date.replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
+        day_end = current_date.replace(hour=working_hours[1], minute=0, second=0, microsecond=0)
+        
+        if current_date.hour >= working_hours[1]:
+            current_date = (current_date + timedelta(days=1)).replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
+            continue
+        
+        if current_date.weekday() >= 5:
+            current_date = current_date + timedelta(days=1)
+            current_date = current_date.replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
+            continue
+        
+        slot_start = max(current_date, day_start)
+        
+        while slot_start < day_end:
+            slot_end = slot_start + timedelta(minutes=duration_minutes)
+            if slot_end > day_end:
+                break
+            
+            is_available = True
+            for busy_start, busy_end in busy_periods:
+                if (slot_start < busy_end and slot_end > busy_start):
+                    is_available = False
+                    slot_start = busy_end
+                    break
+            
+            if is_available:
+                available_slots.append((slot_start, slot_end))
+                slot_start = slot_end
+        
+        current_date = (current_date + timedelta(days=1)).replace(hour=working_hours[0], minute=0, second=0, microsecond=0)
+    
+    return available_slots
+
+def best_of(func, repeat):
+    """Return the best wall-clock time of func over repeat runs, and its last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_benchmark(busy_count=10000, days=28, duration_minutes=30, repeat=3):
+    """Compare the legacy loop with the current slot search on a synthetic calendar"""
+    start_date = datetime(2025, 3, 3, 8, 0)
+    end_date = start_date + timedelta(days=days)
+    busy_periods = generate_busy_periods(busy_count, start_date, days)
+    service = GoogleCalendarService()
+    
+    legacy_time, legacy_slots = best_of(
+        lambda: legacy_find_slots(busy_periods, start_date, end_date, duration_minutes), repeat)
+    
+    grid_time, grid_slots = best_of(
+        lambda: service._find_free_slots(busy_periods, start_date, end_date, duration_minutes), repeat)
+    
+    if legacy_slots != grid_slots:
+        raise AssertionError("Current slot search returned different slots than the legacy loop")
+    
+    print(f"Busy blocks: {busy_count}, window: {days} days, slot length: {duration_minutes} min")
+    print(f"Free slots found: {len(grid_slots)}")
+    print(f"Legacy loop:  {legacy_time * 1000:.2f} ms")
+    print(f"Minute grid:  {grid_time * 1000:.2f} ms")
+    print(f"Speedup:      {legacy_time / grid_time:.1f}x")
+    return legacy_time, grid_time
+
+if __name__ == '__main__':
+    # Keep roughly 30 busy blocks per day so larger calendars still have free gaps
+    for count in (100, 1000, 10000):
+        run_benchmark(busy_count=count, days=max(28, count // 30))
+        print()
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Allow running as `python benchmarks/bench_state_backends.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+os.environ['BACKGROUND_JOB_WORKERS'] = '0'
+
+STATES = ['awaiting_name', 'awaiting_email', 'awaiting_position', 'awaiting_availability',
+          'awaiting_slot_selection', 'awaiting_confirmation']
+
+def run_messages(app, store, phone_numbers, messages):
+    """Handle `messages` state changes the way a message does: one read and one write in a unit of work"""
+    from app.models.database import db, unit_of_work
+    from app.services.conversation_context import ConversationContext
+
+    with app.app_context():
+        for i in range(messages):
+            phone_number = phone_numbers[i % len(phone_numbers)]
+            with unit_of_work():
+                store.get(phone_number)
+                store.save(phone_number, STATES[i % len(STATES)],
+                           ConversationContext(candidate_id=i, name='Jane Doe', email='jane@example.com'))
+        db.session.remove()
+
+def messages_per_second(app, store, threads, messages_per_thread, conversations=200):
+    """Run the message workload on several threads and return the combined throughput"""
+    workers = [
+        threading.Thread(target=run_messages, args=(
+            app, store, [f"+1555{thread:03d}{i:04d}" for i in range(conversations)], messages_per_thread))
+        for thread in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * messages_per_thread / (time.perf_counter() - started)
+
+def run_benchmark(messages=2000, threads=4):
+    """Compare conversation state backends, with the state cache disabled so every read hits the backend"""
+    with tempfile.TemporaryDirectory() as directory:
+        # A file-backed main database, as in production with SQLite
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'main.db')}"
+        from app import create_app
+        from app.services.conversation_store import ConversationStateStore
+        from app.services.state_backends import MemoryStateBackend, SQLiteFileStateBackend, SQLStateBackend
+        app = create_app()
+
+        backends = [
+            SQLStateBackend(),
+            MemoryStateBackend(),
+            SQLiteFileStateBackend(os.path.join(directory, 'conversation_state.db')),
+        ]
+        print(f"Messages per run: {messages} (1 thread), {messages // threads} x {threads} threads")
+        for backend in backends:
+            store = ConversationStateStore(backend=backend, ttl_seconds=0)
+            single = messages_per_second(app, store, 1, messages)
+            concurrent = messages_per_second(app, store, threads, messages // threads)
+            print(f"{backend.name:>7}: {single:9.0f} msg/s on 1 thread, {concurrent:9.0f} msg/s on {threads} threads")
+
+if __name__ == '__main__':
+    run_benchmark()
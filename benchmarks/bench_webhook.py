@@ -0,0 +1,97 @@
+import logging
+import os
+import statistics
+import sys
+import time
+
+# Allow running as `python benchmarks/bench_webhook.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+os.environ['BACKGROUND_JOB_WORKERS'] = '0'
+os.environ['TWILIO_SENDER_WORKERS'] = '0'
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ['CONVERSATION_STATE_BACKEND'] = 'memory'
+
+# One candidate's way through the conversation; 'hi' starts it over
+CONVERSATION = ['hi', 'Jane Doe', 'jane@example.com', 'Software Engineer', 'Monday 9am-5pm']
+
+class SlowStream:
+    """Write-only stream that takes `delay` seconds per write, like a busy terminal or log pipe"""
+
+    def __init__(self, delay):
+        """Initialize the stream"""
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+def post_messages(client, messages, phone_numbers=50):
+    """Post `messages` Twilio webhooks and return the latency of each request in milliseconds"""
+    latencies = []
+    for i in range(messages):
+        phone_number = f"whatsapp:+1555{i % phone_numbers:07d}"
+        body = CONVERSATION[(i // phone_numbers) % len(CONVERSATION)]
+        started = time.perf_counter()
+        client.post('/webhook', data={'From': phone_number, 'Body': body, 'MessageSid': f"SM{i:032x}"})
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def run_mode(app, label, handler, level, messages, listener=None):
+    """Measure the webhook with `handler` as the only output of the app loggers"""
+    from app.models.database import db
+    from app.services.conversation_store import conversation_store
+    from app.services.message_dedupe import processed_messages
+
+    app_logger = logging.getLogger('app')
+    saved_handlers = app_logger.handlers[:]
+    app_logger.handlers = [handler]
+    app_logger.setLevel(level)
+    if listener is not None:
+        listener.start()
+    try:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+        conversation_store.clear()
+        processed_messages.clear()
+        latencies = post_messages(app.test_client(), messages)
+    finally:
+        # The queued records are written after the requests returned; draining them is not request time
+        if listener is not None:
+            listener.stop()
+        app_logger.handlers = saved_handlers
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{label:<38} {statistics.mean(latencies):7.2f} ms mean {p95:7.2f} ms p95")
+
+def run_benchmark(messages=500, write_delay=0.0002):
+    """Compare writing every log line on the request thread (the old print() calls) with the queued logger"""
+    from app import create_app
+    from app.logging_config import LOG_FORMAT, queue_handler_for
+    app = create_app()
+
+    print(f"{messages} webhook requests, {write_delay * 1e6:.0f} us per log write")
+    synchronous = logging.StreamHandler(SlowStream(write_delay))
+    synchronous.setFormatter(logging.Formatter(LOG_FORMAT))
+    run_mode(app, 'every line, written in request (print)', synchronous, logging.DEBUG, messages)
+
+    for label, level, sample_every in [
+        ('DEBUG, queued', logging.DEBUG, 1),
+        ('DEBUG sampled 1/10, queued', logging.DEBUG, 10),
+        ('INFO, queued', logging.INFO, 1),
+    ]:
+        handler, listener = queue_handler_for(SlowStream(write_delay), sample_every)
+        run_mode(app, label, handler, level, messages, listener)
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,266 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Allow running as `python benchmarks/load_test_webhook.py` from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the app package builds the Twilio client, which only needs placeholder credentials here
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACloadtest')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'loadtest')
+# Replies to a number are paced by the per-number limiter; simulated candidates must not wait on it
+os.environ.setdefault('TWILIO_SEND_RATE', '0')
+
+FIRST_NAMES = ['Jane', 'John', 'Maria', 'Wei', 'Amara', 'Lucas', 'Priya', 'Omar', 'Sofia', 'Kenji']
+LAST_NAMES = ['Doe', 'Smith', 'Garcia', 'Chen', 'Okafor', 'Silva', 'Patel', 'Haddad', 'Rossi', 'Tanaka']
+POSITIONS = ['Software Engineer', 'Data Analyst', 'Product Manager', 'Designer']
+
+# An error reply means the message was rolled back, whatever the HTTP status
+ERROR_REPLY = 'there was an error processing your message'
+
+def conversation_script(index, rng):
+    """Return the (state, message) steps of one scripted conversation, from greeting to confirmation"""
+    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    # A weekday of next week, so every offered slot is in the future
+    day = date.today() + timedelta(days=7 - date.today().weekday() + rng.randrange(5))
+    return [
+        ('initial', 'hi'),
+        ('awaiting_name', f"{first_name} {last_name}"),
+        ('awaiting_email', f"{first_name.lower()}.{last_name.lower()}{index}@example.com"),
+        ('awaiting_position', rng.choice(POSITIONS)),
+        ('awaiting_availability', f"{day:%B} {day.day} 9am-5pm"),
+        ('awaiting_slot_selection', '1'),
+        ('awaiting_confirmation', 'yes'),
+    ]
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+class QueryCounter:
+    """Counts SQL statements per message on the thread that posted it; other threads count as background"""
+
+    def __init__(self):
+        """Initialize the counter"""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.background = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'count', None) is None:
+            with self._lock:
+                self.background += 1
+        else:
+            self._local.count += 1
+
+    def start(self):
+        """Start counting the statements of this thread's next message"""
+        self._local.count = 0
+
+    def stop(self):
+        """Return how many statements this thread ran since start()"""
+        count, self._local.count = self._local.count, None
+        return count
+
+def post(client, message_format, phone_number, body, message_sid):
+    """Post one message in the JSON or Twilio form format and return (ok, reply)"""
+    if message_format == 'json':
+        response = client.post('/webhook', json={'from': phone_number, 'message': body, 'message_sid': message_sid})
+        reply = (response.get_json(silent=True) or {}).get('response', '')
+    else:
+        response = client.post('/webhook', data={'From': f"whatsapp:{phone_number}", 'Body': body,
+                                                 'MessageSid': message_sid})
+        reply = response.get_data(as_text=True)
+    return response.status_code == 200 and ERROR_REPLY not in reply, reply
+
+def drive_conversations(app, next_index, total, message_format, seed, queries, results):
+    """Run scripted conversations on this thread until `total` were started, recording every message"""
+    client = app.test_client()
+    while True:
+        index = next(next_index)
+        if index >= total:
+            return
+        rng = random.Random(seed * 1000003 + index)
+        phone_number = f"+1555{seed % 1000:03d}{index:04d}"
+        formats = ('json', 'form') if message_format == 'mixed' else (message_format,)
+        conversation_format = formats[index % len(formats)]
+
+        for step, (state, body) in enumerate(conversation_script(index, rng)):
+            queries.start()
+            started = time.perf_counter()
+            ok, _ = post(client, conversation_format, phone_number, body, f"SM{seed:08x}{index:012x}{step:012x}")
+            elapsed = time.perf_counter() - started
+            results.append((state, elapsed, queries.stop(), ok))
+
+def wait_for_jobs(app, timeout=60):
+    """Wait until the background jobs queued by confirmations (calendar events, notifications) ran"""
+    deadline = time.monotonic() + timeout
+    for name in ('background_jobs', 'outbound_sender'):
+        queue = app.extensions.get(name)
+        while queue is not None and queue.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+def run_load_test(conversations=50, concurrency=10, message_format='form', recruiters=5, seed=0,
+                  calendar_latency=0.0, twilio_latency=0.0, database_url=None):
+    """Drive `conversations` scripted conversations, `concurrency` at a time, through /webhook and return a report.
+
+    Google Calendar and Twilio are in-process fakes; the database is a fresh
+    SQLite file unless `database_url` names another one.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(directory, 'load_test.db')}"
+        return _run(conversations, concurrency, message_format, recruiters, seed, calendar_latency, twilio_latency)
+
+def _run(conversations, concurrency, message_format, recruiters, seed, calendar_latency, twilio_latency):
+    from sqlalchemy import event
+    from twilio.rest import Client
+    from app import create_app
+    from app.models.database import db
+    from app.models.models import Interview, Recruiter
+    from app.routes.webhook import conversation_handler
+    from app.services.conversation_store import conversation_store
+    from app.services.fake_calendar import FakeCalendarBackend
+    from app.services.fake_twilio import FakeTwilioHttpClient
+    from app.services.google_calendar import GoogleCalendarService
+    from app.services.message_dedupe import processed_messages
+    from app.services.metrics import metrics
+    from app.services.rate_limiter import RateLimiter
+    from app.services.twilio_service import TwilioService
+
+    app = create_app()
+    fake_calendar = FakeCalendarBackend(latency=calendar_latency)
+    fake_twilio = FakeTwilioHttpClient(latency=twilio_latency)
+    twilio_service = TwilioService(client=Client('ACloadtest', 'loadtest', http_client=fake_twilio),
+                                   rate_limiter=RateLimiter(rate_per_second=0))
+    scheduling_service = conversation_handler.scheduling_service
+    scheduling_service.calendar_service = GoogleCalendarService(service=fake_calendar)
+    app.extensions['outbound_sender'].twilio_service = twilio_service
+
+    queries = QueryCounter()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            Recruiter(name=f"Recruiter {i}", email=f"recruiter{i}@example.com", calendar_id=f"recruiter-{i}")
+            for i in range(recruiters)
+        ])
+        db.session.commit()
+        engine = db.engine
+    conversation_store.clear()
+    processed_messages.clear()
+    metrics.clear()
+
+    results = []
+    next_index = itertools.count()
+    workers = [
+        threading.Thread(target=drive_conversations,
+                         args=(app, next_index, conversations, message_format, seed, queries, results))
+        for _ in range(concurrency)
+    ]
+    event.listen(engine, 'before_cursor_execute', queries)
+    try:
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        wait_for_jobs(app)
+    finally:
+        event.remove(engine, 'before_cursor_execute', queries)
+        for name in ('background_jobs', 'outbound_sender'):
+            app.extensions[name].stop()
+
+    with app.app_context():
+        booked = Interview.query.count()
+        synced = Interview.query.filter_by(calendar_status='synced').count()
+        db.session.remove()
+
+    states = {}
+    for state, _ in conversation_script(0, random.Random(seed)):
+        latencies = sorted(seconds for step_state, seconds, _, _ in results if step_state == state)
+        statement_counts = [count for step_state, _, count, _ in results if step_state == state]
+        states[state] = {
+            'messages': len(latencies),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries_per_message': sum(statement_counts) / len(statement_counts) if statement_counts else 0.0,
+        }
+
+    api_calls = {}
+    for index in range(conversations):
+        for api, calls in metrics.conversation_calls(f"+1555{seed % 1000:03d}{index:04d}").items():
+            api_calls[api] = api_calls.get(api, 0) + calls
+
+    return {
+        'conversations': conversations,
+        'concurrency': concurrency,
+        'format': message_format,
+        'messages': len(results),
+        'errors': sum(1 for *_, ok in results if not ok),
+        'elapsed_seconds': elapsed,
+        'messages_per_second': len(results) / elapsed if elapsed else 0.0,
+        'conversations_per_second': conversations / elapsed if elapsed else 0.0,
+        'interviews_booked': booked,
+        'calendar_events_synced': synced,
+        'queries_per_message': sum(count for _, _, count, _ in results) / len(results) if results else 0.0,
+        'background_queries': queries.background,
+        'api_calls_per_conversation': {api: calls / conversations for api, calls in sorted(api_calls.items())},
+        'states': states,
+    }
+
+def print_report(report):
+    """Print a load test report as a table"""
+    print(f"{report['conversations']} conversations, {report['concurrency']} at a time, {report['format']} format")
+    print(f"{report['messages']} messages in {report['elapsed_seconds']:.2f}s: "
+          f"{report['messages_per_second']:.0f} msg/s, {report['conversations_per_second']:.1f} conversations/s, "
+          f"{report['errors']} errors")
+    print(f"{report['interviews_booked']} interviews booked, {report['calendar_events_synced']} calendar events created")
+    print(f"{report['queries_per_message']:.1f} SQL statements per message, "
+          f"{report['background_queries']} in background jobs")
+    calls = ', '.join(f"{api} {count:.1f}" for api, count in report['api_calls_per_conversation'].items())
+    print(f"API calls per conversation: {calls or 'none'}")
+    print()
+    print(f"{'state':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for state, stats in report['states'].items():
+        print(f"{state:<26}{stats['p50_ms']:9.2f}{stats['p95_ms']:9.2f}{stats['p99_ms']:9.2f}"
+              f"{stats['queries_per_message']:9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test /webhook with scripted conversations against in-process fakes')
+    parser.add_argument('--conversations', type=int, default=50, help='scripted conversations to run')
+    parser.add_argument('--concurrency', type=int, default=10, help='phone numbers talking at the same time')
+    parser.add_argument('--format', choices=['form', 'json', 'mixed'], default='form', dest='message_format',
+                        help='Twilio form posts, JSON posts, or alternate between them per conversation')
+    parser.add_argument('--recruiters', type=int, default=5, help='recruiters with (empty) fake calendars')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated names, days and positions')
+    parser.add_argument('--calendar-latency', type=float, default=0.0, help='seconds per fake Calendar API call')
+    parser.add_argument('--twilio-latency', type=float, default=0.0, help='seconds per fake Twilio API call')
+    parser.add_argument('--database-url', help='database to use instead of a temporary SQLite file')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    # Per-message log lines would dominate the output and the timings
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    report = run_load_test(args.conversations, args.concurrency, args.message_format, args.recruiters, args.seed,
+                           args.calendar_latency, args.twilio_latency, args.database_url)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    # Fail the run, e.g. in CI before a deploy, when any message got an error reply
+    return 1 if report['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
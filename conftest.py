@@ -0,0 +1,118 @@
+import os
+
+# The app package builds a Twilio client on import; tests never talk to Twilio
+os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACtest')
+os.environ.setdefault('TWILIO_AUTH_TOKEN', 'test')
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
+# Interactive scripts that talk to the real Google and Twilio services; run them by hand
+collect_ignore = ['test_calendar.py', 'test_conversation.py', 'test_twilio.py']
+
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from app.models.database import db
+from app.models.models import Candidate, Recruiter
+from app.services.conversation_handler import ConversationHandler
+from app.services.fake_calendar import FakeCalendarBackend
+from app.services.conversation_store import conversation_store
+from app.services.freebusy_cache import freebusy_cache
+from app.services.google_calendar import GoogleCalendarService
+from app.services.message_dedupe import processed_messages
+from app.services.metrics import metrics
+from app.services.twilio_service import TwilioService
+
+def _next_week(day_offset, hour, minute=0):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    next_monday = today + timedelta(days=7 - today.weekday())
+    return next_monday + timedelta(days=day_offset, hours=hour, minutes=minute)
+
+@pytest.fixture
+def app():
+    """Application with an empty in-memory database, an active app context and no worker threads"""
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def fake_calendar():
+    """In-process fake of the Google Calendar API"""
+    return FakeCalendarBackend()
+
+@pytest.fixture
+def calendar_api(fake_calendar, monkeypatch):
+    """The fake Calendar API, answering every GoogleCalendarService that builds its own client"""
+    monkeypatch.setattr(GoogleCalendarService, 'get_calendar_service', lambda self: fake_calendar)
+    return fake_calendar
+
+@pytest.fixture
+def sent_messages(monkeypatch):
+    """(to, body) of every WhatsApp message sent through TwilioService, which no longer reaches Twilio"""
+    sent = []
+    monkeypatch.setattr(TwilioService, 'send_whatsapp_message', lambda self, to, body: sent.append((to, body)))
+    return sent
+
+@pytest.fixture
+def next_week():
+    """next_week(day_offset, hour, minute=0): a time next week, for data that must not be in the past"""
+    return _next_week
+
+@pytest.fixture
+def recruiters_with_calendars(app):
+    """recruiters_with_calendars(count): create recruiters whose calendars are cal-0 .. cal-N"""
+    def create(count):
+        recruiters = [
+            Recruiter(name=f"Recruiter {i}", email=f"recruiter{i}@example.com", calendar_id=f"cal-{i}")
+            for i in range(count)
+        ]
+        db.session.add_all(recruiters)
+        db.session.commit()
+        return recruiters
+    return create
+
+@pytest.fixture
+def awaiting_confirmation(app):
+    """awaiting_confirmation(phone_number): create a candidate, a recruiter and a conversation waiting for 'yes'"""
+    def create(phone_number):
+        recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+        candidate = Candidate(name="Jane Doe", phone_number=phone_number, email="jane@example.com",
+                              position_applied="Engineer")
+        db.session.add_all([recruiter, candidate])
+        db.session.commit()
+        
+        handler = ConversationHandler()
+        handler.scheduling_service.update_conversation_state(phone_number, 'awaiting_confirmation', {
+            'candidate_id': candidate.id,
+            'recruiter_id': recruiter.id,
+            'name': candidate.name,
+            'email': candidate.email,
+            'position': candidate.position_applied,
+            'selected_slot': (_next_week(0, 14).isoformat(), _next_week(0, 15).isoformat())
+        })
+        return handler
+    return create
+
+@pytest.fixture(autouse=True)
+def clear_freebusy_cache():
+    """Keep the process-wide free/busy cache from leaking between tests"""
+    freebusy_cache.clear()
+    yield
+    freebusy_cache.clear()
+
+@pytest.fixture(autouse=True)
+def clear_conversation_store():
+    """Each test starts with a fresh database, so cached conversation rows must not survive it"""
+    conversation_store.clear()
+    processed_messages.clear()
+    yield
+    conversation_store.clear()
+    processed_messages.clear()
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    """Keep the process-wide metrics registry from leaking between tests"""
+    metrics.clear()
+    yield
+    metrics.clear()
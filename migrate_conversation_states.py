@@ -0,0 +1,104 @@
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+from app import create_app
+from app.models.database import db
+from app.models.models import Candidate, ConversationState, Interview
+from app.services.conversation_store import normalize_phone_number
+
+# Load environment variables
+load_dotenv()
+
+# Interview columns added after the first release, with their SQL definitions
+INTERVIEW_CALENDAR_COLUMNS = [
+    ('meet_link', 'VARCHAR(500)'),
+    ('calendar_status', 'VARCHAR(20)'),
+    ('calendar_attempts', 'INTEGER DEFAULT 0'),
+    ('calendar_error', 'VARCHAR(500)'),
+]
+
+def _add_column(connection, table, name, definition):
+    """Add a column to a table unless it already has it; returns whether it was added"""
+    if name in {column['name'] for column in inspect(connection).get_columns(table)}:
+        return False
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+    return True
+
+def add_version_column():
+    """Add the version column that conditional state writes check to tables created before it existed.
+
+    Returns whether the column was added.
+    """
+    with db.engine.begin() as connection:
+        return _add_column(connection, ConversationState.__tablename__, 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+def add_interview_calendar_columns():
+    """Add the Meet link and calendar event tracking columns to interview tables created before they existed.
+
+    Interviews that already have a calendar event are marked 'synced'.
+    Returns the names of the columns added.
+    """
+    table = Interview.__tablename__
+    with db.engine.begin() as connection:
+        added = [name for name, definition in INTERVIEW_CALENDAR_COLUMNS
+                 if _add_column(connection, table, name, definition)]
+        if 'calendar_status' in added:
+            connection.execute(text(
+                f"UPDATE {table} SET calendar_status = 'synced' WHERE calendar_event_id IS NOT NULL"))
+    return added
+
+def collapse_conversation_states():
+    """Normalize stored phone numbers to E.164 and keep one conversation state per number.
+
+    Older versions stored numbers in several formats and inserted a new row
+    on errors, so a number could have many states. The most recently updated
+    one is kept. Returns the number of rows deleted.
+    """
+    latest = {}
+    duplicates = []
+    states = ConversationState.query.order_by(ConversationState.id).all()
+    for state in states:
+        key = normalize_phone_number(state.phone_number)
+        current = latest.get(key)
+        if current is None:
+            latest[key] = state
+        elif (state.updated_at or state.created_at) >= (current.updated_at or current.created_at):
+            duplicates.append(current)
+            latest[key] = state
+        else:
+            duplicates.append(state)
+
+    # Delete before renaming, so that no two rows ever hold the same normalized number
+    for state in duplicates:
+        db.session.delete(state)
+    db.session.flush()
+
+    for key, state in latest.items():
+        if state.phone_number != key:
+            state.phone_number = key
+
+    # Candidates are looked up by the same normalized numbers
+    for candidate in Candidate.query.all():
+        key = normalize_phone_number(candidate.phone_number)
+        if key and candidate.phone_number != key:
+            candidate.phone_number = key
+
+    db.session.commit()
+
+    # Tables created before the unique index existed need it added
+    for index in ConversationState.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+    return len(duplicates)
+
+if __name__ == '__main__':
+    app = create_app()
+
+    with app.app_context():
+        if add_version_column():
+            print('Added the version column to conversation states.')
+        added = add_interview_calendar_columns()
+        if added:
+            print(f"Added the {', '.join(added)} columns to interviews.")
+        deleted = collapse_conversation_states()
+        print(f"Removed {deleted} duplicate conversation states.")
+        print('Conversation states migrated successfully.')
@@ -0,0 +1,59 @@
+import argparse
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from app import create_app
+from app.models.database import db
+from app.models.models import Interview
+from app.services.scheduling_service import SchedulingService
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger('app.retry_calendar_events')
+
+def retry_pending_calendar_events(stale_minutes=10):
+    """Create the calendar events of interviews still pending, such as those queued when a process stopped.
+
+    Interviews left in 'creating' for more than `stale_minutes` were claimed
+    by a process that died while creating their event, and are made pending
+    again. Their event IDs are fixed, so an event that was in fact created
+    is picked up rather than created twice. Run this from a single place,
+    such as a cron job or a deploy step. Returns (created, failed).
+    """
+    stale = Interview.query.filter(
+        Interview.calendar_status == 'creating',
+        Interview.updated_at < datetime.utcnow() - timedelta(minutes=stale_minutes)
+    ).update({'calendar_status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+    if stale:
+        logger.warning('Released %s interviews stuck while creating their calendar event', stale)
+
+    scheduling_service = SchedulingService()
+    pending = [interview_id for interview_id, in
+               db.session.query(Interview.id).filter_by(calendar_status='pending').order_by(Interview.id)]
+    created = failed = 0
+    for interview_id in pending:
+        try:
+            if scheduling_service.create_interview_calendar_event(interview_id) is not None:
+                created += 1
+        except Exception as e:
+            # Left pending, with the error recorded, for the next run
+            logger.error('Could not create the calendar event of interview %s: %s', interview_id, e)
+            db.session.rollback()
+            failed += 1
+    return created, failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the calendar events of interviews left pending')
+    parser.add_argument('--stale-minutes', type=int, default=10,
+                        help="minutes after which an interview stuck in 'creating' is retried")
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        created, failed = retry_pending_calendar_events(args.stale_minutes)
+        # Candidates are notified through the outbound sender; its queue only lives in this process
+        app.extensions['outbound_sender'].drain()
+        print(f"Created {created} calendar events, {failed} failed.")
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+from app.services.availability_grid import AvailabilityGrid
+
+def test_availability_grid_slot_search():
+    """The minute grid rounds busy blocks outwards, skips nights and weekends, and honours windows"""
+    grid = AvailabilityGrid(datetime(2025, 3, 7, 15, 0, 30), datetime(2025, 3, 10, 12, 0))
+    busy = {
+        'alice': [(datetime(2025, 3, 7, 15, 40, 10), datetime(2025, 3, 7, 16, 0))],
+        'bob': [(datetime(2025, 3, 10, 9, 0), datetime(2025, 3, 10, 9, 59, 30))],
+    }
+    
+    slots = grid.free_slots_many(busy, duration_minutes=30)
+    
+    # Friday afternoon, then Monday morning up to the end of the horizon
+    assert slots['alice'] == [
+        (datetime(2025, 3, 7, 15, 1), datetime(2025, 3, 7, 15, 31)),
+        (datetime(2025, 3, 7, 16, 0), datetime(2025, 3, 7, 16, 30)),
+        (datetime(2025, 3, 7, 16, 30), datetime(2025, 3, 7, 17, 0)),
+    ] + [(datetime(2025, 3, 10, 9, 0) + timedelta(minutes=30 * i),
+          datetime(2025, 3, 10, 9, 30) + timedelta(minutes=30 * i)) for i in range(6)]
+    assert slots['bob'][3] == (datetime(2025, 3, 10, 10, 0), datetime(2025, 3, 10, 10, 30))
+    assert slots['bob'] == grid.free_slots(busy['bob'], duration_minutes=30)
+    
+    windows = [(datetime(2025, 3, 10, 10, 15), datetime(2025, 3, 10, 11, 20))]
+    assert grid.free_slots_many(busy, 60, windows=windows)['bob'] == [
+        (datetime(2025, 3, 10, 10, 15), datetime(2025, 3, 10, 11, 15))]
@@ -0,0 +1,34 @@
+import json
+import os
+from datetime import datetime
+from app.services.availability_parser import _parse_slots, parse_availability
+
+def test_availability_parser_matches_corpus():
+    """Every phrase of the benchmark corpus parses to its expected slots"""
+    with open(os.path.join(os.path.dirname(__file__), 'benchmarks', 'availability_corpus.json')) as corpus_file:
+        corpus = json.load(corpus_file)
+    reference = datetime.fromisoformat(corpus['reference'])
+    for entry in corpus['phrases']:
+        slots = [[start.isoformat(), end.isoformat()] for start, end in parse_availability(entry['text'], reference)]
+        assert slots == entry['expected'], entry['text']
+
+def test_availability_parser_rolls_weekdays_and_caches():
+    """A weekday whose range already passed means next week, and repeated phrases hit the cache"""
+    _parse_slots.cache_clear()
+    wednesday_noon = datetime(2025, 3, 5, 12, 0)
+    
+    assert parse_availability('Wednesday 9am-11am', wednesday_noon) == [
+        (datetime(2025, 3, 12, 9, 0), datetime(2025, 3, 12, 11, 0))]
+    assert parse_availability('today 9am-11am', wednesday_noon) == []
+    assert parse_availability('  WEDNESDAY   9am-11am ', wednesday_noon.replace(hour=8)) == [
+        (datetime(2025, 3, 5, 9, 0), datetime(2025, 3, 5, 11, 0))]
+    assert _parse_slots.cache_info().hits == 1
+
+def test_availability_parser_takes_plurals_only_on_full_weekday_names():
+    """'mondays' is a weekday, but 'thus' is not 'thu' with a plural s"""
+    monday = datetime(2025, 3, 3, 8, 0)
+    
+    assert parse_availability("thus I'm free 2-4pm", monday) == []
+    assert parse_availability('thursdays 2-4pm', monday) == [(datetime(2025, 3, 6, 14, 0), datetime(2025, 3, 6, 16, 0))]
+    assert parse_availability('mondays and thurs. 9-11am', monday) == [
+        (datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 11, 0)), (datetime(2025, 3, 6, 9, 0), datetime(2025, 3, 6, 11, 0))]
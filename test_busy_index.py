@@ -0,0 +1,41 @@
+from datetime import datetime
+from app.services.busy_index import BusyIndex
+
+def test_busy_index_sorts_and_merges_overlapping_blocks():
+    """Unsorted, overlapping and touching blocks come out sorted and merged; empty blocks are dropped"""
+    busy_index = BusyIndex([
+        (datetime(2025, 3, 3, 14, 0), datetime(2025, 3, 3, 15, 0)),
+        (datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0)),
+        (datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 9, 45)),  # Inside the 9:00 block
+        (datetime(2025, 3, 3, 10, 0), datetime(2025, 3, 3, 11, 0)),  # Touches the 9:00 block
+        (datetime(2025, 3, 3, 14, 30), datetime(2025, 3, 3, 16, 0)),
+        (datetime(2025, 3, 3, 12, 0), datetime(2025, 3, 3, 12, 0)),
+        (datetime(2025, 3, 3, 13, 0), datetime(2025, 3, 3, 12, 30)),
+    ])
+
+    assert list(busy_index) == [
+        (datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 11, 0)),
+        (datetime(2025, 3, 3, 14, 0), datetime(2025, 3, 3, 16, 0)),
+    ]
+    assert len(busy_index) == 2
+    assert list(BusyIndex()) == []
+
+def test_busy_index_returns_clipped_overlapping_blocks():
+    """Range lookups return only the blocks overlapping the window, clipped to it"""
+    busy_index = BusyIndex([
+        (datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0)),
+        (datetime(2025, 3, 3, 11, 0), datetime(2025, 3, 3, 12, 0)),
+        (datetime(2025, 3, 3, 14, 0), datetime(2025, 3, 3, 16, 0)),
+    ])
+
+    assert busy_index.overlapping(datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 15, 0)) == [
+        (datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 10, 0)),
+        (datetime(2025, 3, 3, 11, 0), datetime(2025, 3, 3, 12, 0)),
+        (datetime(2025, 3, 3, 14, 0), datetime(2025, 3, 3, 15, 0)),
+    ]
+    # Windows that only touch a block or fall between blocks are free
+    assert busy_index.overlapping(datetime(2025, 3, 3, 10, 0), datetime(2025, 3, 3, 11, 0)) == []
+    assert busy_index.overlapping(datetime(2025, 3, 3, 12, 0), datetime(2025, 3, 3, 14, 0)) == []
+    assert busy_index.overlapping(datetime(2025, 3, 3, 7, 0), datetime(2025, 3, 3, 8, 0)) == []
+    assert busy_index.overlapping(datetime(2025, 3, 3, 17, 0), datetime(2025, 3, 3, 18, 0)) == []
+    assert BusyIndex().overlapping(datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0)) == []
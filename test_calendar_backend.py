@@ -0,0 +1,310 @@
+import pickle
+import threading
+from datetime import datetime, timedelta
+from google.oauth2.credentials import Credentials
+from app.models.database import db
+from app.models.models import Candidate, Interview, Recruiter, CalendarBusyBlock, CalendarSyncState
+from app.services.calendar_client import CalendarClient
+from app.services.calendar_mirror import CalendarMirror
+from app.services.freebusy_cache import FreeBusyCache
+from app.services.google_calendar import GoogleCalendarService
+from app.services.scheduling_service import SchedulingService, calendar_event_id
+
+# A Monday, so the whole window falls on working days
+WINDOW_START = datetime(2025, 3, 3, 9, 0)
+WINDOW_END = datetime(2025, 3, 5, 17, 0)
+
+def test_batched_free_busy_uses_one_query(fake_calendar):
+    """Several calendars are answered by a single freebusy round trip"""
+    fake_calendar.add_busy('alice', datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 12, 0))
+    fake_calendar.add_busy('bob', datetime(2025, 3, 3, 13, 0), datetime(2025, 3, 3, 14, 0))
+    calendar_service = GoogleCalendarService(service=fake_calendar)
+    
+    availability = calendar_service.get_availability_batch(['alice', 'bob', 'carol'], WINDOW_START, WINDOW_END)
+    
+    assert fake_calendar.call_count('freebusy.query') == 1
+    assert availability['alice']['busy'] == [(datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 12, 0))]
+    assert availability['alice']['slots'][0] == (datetime(2025, 3, 3, 12, 0), datetime(2025, 3, 3, 13, 0))
+    assert (datetime(2025, 3, 3, 13, 0), datetime(2025, 3, 3, 14, 0)) not in availability['bob']['slots']
+    assert availability['carol']['busy'] == []
+    assert availability['carol']['slots'][0] == (datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0))
+
+def test_batched_free_busy_chunks_large_requests(fake_calendar):
+    """Calendar lists above the API limit are split into chunks of 50"""
+    calendar_service = GoogleCalendarService(service=fake_calendar)
+    calendar_ids = [f"recruiter-{i}@example.com" for i in range(120)]
+    
+    slots = calendar_service.find_available_slots_batch(calendar_ids, WINDOW_START, WINDOW_END)
+    
+    assert fake_calendar.call_count('freebusy.query') == 3
+    assert set(slots) == set(calendar_ids)
+
+def test_free_busy_cache_serves_repeated_queries(fake_calendar):
+    """Back-to-back availability checks for a recruiter cost one freebusy call"""
+    cache = FreeBusyCache(ttl_seconds=60)
+    calendar_service = GoogleCalendarService(service=fake_calendar, cache=cache)
+    
+    first = calendar_service.find_available_slots('alice', WINDOW_START, WINDOW_END)
+    second = calendar_service.find_available_slots('alice', WINDOW_START + timedelta(seconds=5), WINDOW_END)
+    
+    assert fake_calendar.call_count('freebusy.query') == 1
+    assert first[8:] == second[7:]
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_free_busy_cache_invalidated_by_event_writes(fake_calendar):
+    """Creating, updating or deleting an event drops that calendar's cached windows only"""
+    cache = FreeBusyCache(ttl_seconds=60)
+    calendar_service = GoogleCalendarService(service=fake_calendar, cache=cache)
+    calendar_service.get_availability_batch(['alice', 'bob'], WINDOW_START, WINDOW_END)
+    
+    event = calendar_service.create_event(
+        'alice', 'Interview', 'Interview', datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0), [])
+    availability = calendar_service.get_availability_batch(['alice', 'bob'], WINDOW_START, WINDOW_END)
+    
+    assert fake_calendar.call_count('freebusy.query') == 2
+    assert fake_calendar.calls[-1] == 'freebusy.query'
+    assert availability['alice']['busy'] == [(datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0))]
+    assert cache.stats()['hits'] == 1
+    
+    calendar_service.delete_event('alice', event['id'])
+    availability = calendar_service.get_availability_batch(['alice'], WINDOW_START, WINDOW_END)
+    assert availability['alice']['busy'] == []
+    assert fake_calendar.call_count('freebusy.query') == 3
+
+def test_free_busy_cache_ttl_and_limits():
+    """Entries expire after the TTL and the least recently used ones are evicted first"""
+    now = [0.0]
+    cache = FreeBusyCache(ttl_seconds=30, max_entries=2, clock=lambda: now[0])
+    busy = [(datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0))]
+    
+    cache.set('a', WINDOW_START, WINDOW_END, busy)
+    cache.set('b', WINDOW_START, WINDOW_END, busy)
+    assert cache.get('a', WINDOW_START, WINDOW_END) == busy
+    cache.set('c', WINDOW_START, WINDOW_END, busy)
+    
+    assert cache.get('b', WINDOW_START, WINDOW_END) is None
+    assert cache.get('a', WINDOW_START, WINDOW_END) == busy
+    assert cache.stats()['evictions'] == 1
+    
+    now[0] = 31.0
+    assert cache.get('a', WINDOW_START, WINDOW_END) is None
+    
+    small_cache = FreeBusyCache(max_bytes=1024)
+    small_cache.set('a', WINDOW_START, WINDOW_END, busy * 100)
+    assert small_cache.stats()['entries'] == 0
+
+def test_free_busy_cache_ignores_results_older_than_invalidation():
+    """A freebusy result fetched before an event write is not cached after it"""
+    cache = FreeBusyCache()
+    generation = cache.generation('alice')
+    cache.invalidate('alice')
+    cache.set('alice', WINDOW_START, WINDOW_END, [], generation)
+    
+    assert cache.get('alice', WINDOW_START, WINDOW_END) is None
+
+def test_calendar_mirror_incremental_sync(app, fake_calendar, next_week, monkeypatch):
+    """The mirror answers availability locally and follows changes through sync tokens"""
+    monkeypatch.setenv('CALENDAR_MIRROR_ENABLED', '1')
+    mirror = CalendarMirror(refresh_seconds=0)
+    calendar_service = GoogleCalendarService(service=fake_calendar, cache=FreeBusyCache(), mirror=mirror)
+    first = fake_calendar.add_busy('alice', next_week(0, 9, 0), next_week(0, 11, 0))
+    
+    assert calendar_service.sync_calendar('alice') == 1
+    slots = calendar_service.find_available_slots('alice', next_week(0, 9), next_week(2, 17))
+    assert slots[0] == (next_week(0, 11, 0), next_week(0, 12, 0))
+    assert fake_calendar.call_count('freebusy.query') == 0
+    
+    # Incremental sync only transfers what changed since the last sync token
+    fake_calendar.add_busy('alice', next_week(0, 11, 0), next_week(0, 12, 0))
+    fake_calendar._delete_event('alice', first['id'])
+    assert calendar_service.sync_calendar('alice') == 2
+    
+    busy = calendar_service.get_availability_batch(['alice'], next_week(0, 9), next_week(2, 17))['alice']['busy']
+    assert busy == [(next_week(0, 11, 0), next_week(0, 12, 0))]
+    assert CalendarBusyBlock.query.filter_by(calendar_id='alice').count() == 1
+
+def test_calendar_mirror_is_not_used_after_event_writes(app, fake_calendar, next_week, monkeypatch):
+    """Creating an event makes the mirror fall back to free/busy until the calendar is synced again"""
+    monkeypatch.setenv('CALENDAR_MIRROR_ENABLED', '1')
+    mirror = CalendarMirror(refresh_seconds=0)
+    calendar_service = GoogleCalendarService(service=fake_calendar, cache=FreeBusyCache(), mirror=mirror)
+    calendar_service.sync_calendar('alice')
+    
+    calendar_service.create_event('alice', 'Interview', '', next_week(0, 9), next_week(0, 10), [])
+    busy = calendar_service.get_availability_batch(['alice'], next_week(0, 9), next_week(2, 17))['alice']['busy']
+    assert busy == [(next_week(0, 9), next_week(0, 10))]
+    assert fake_calendar.call_count('freebusy.query') == 1
+    
+    calendar_service.sync_calendar('alice')
+    calendar_service.get_availability_batch(['alice'], next_week(0, 9), next_week(2, 17))
+    assert fake_calendar.call_count('freebusy.query') == 1
+
+def test_calendar_mirror_resyncs_after_gone(app, fake_calendar, next_week):
+    """An expired sync token (410 Gone) triggers a full resync"""
+    mirror = CalendarMirror(refresh_seconds=0)
+    for hour in (9, 10, 11):
+        fake_calendar.add_busy('alice', next_week(0, hour, 0), next_week(0, hour, 30))
+    mirror.sync(fake_calendar, 'alice')
+    
+    fake_calendar.add_busy('alice', next_week(1, 9, 0), next_week(1, 10, 0))
+    fake_calendar.expire_sync_tokens('alice')
+    
+    assert mirror.sync(fake_calendar, 'alice') == 4
+    assert len(mirror.busy_periods('alice', next_week(0, 9), next_week(2, 17))) == 4
+    assert CalendarSyncState.query.filter_by(calendar_id='alice').first().sync_token == str(fake_calendar._sequence)
+
+def test_calendar_push_notification_triggers_sync(app, calendar_api, next_week):
+    """A push notification on a watched channel syncs that calendar"""
+    calendar_service = GoogleCalendarService()
+    channel = calendar_service.watch_calendar('alice', 'https://example.com/webhook/calendar')
+    calendar_api.add_busy('alice', next_week(0, 9, 0), next_week(0, 10, 0))
+    
+    client = app.test_client()
+    headers = {'X-Goog-Channel-ID': channel['id'], 'X-Goog-Resource-State': 'exists'}
+    assert client.post('/webhook/calendar', headers=headers).status_code == 200
+    
+    assert calendar_api.call_count('events.list') == 1
+    assert CalendarBusyBlock.query.filter_by(calendar_id='alice').count() == 1
+
+def test_multi_call_event_creation_is_opt_in(fake_calendar, next_week):
+    """The old insert/update/patch sequence is still available on request"""
+    calendar_service = GoogleCalendarService(service=fake_calendar)
+    
+    event = calendar_service.create_event('alice', 'Interview', 'Interview', next_week(0, 9), next_week(0, 10), [],
+                                          multi_call=True)
+    
+    assert fake_calendar.calls == ['events.insert', 'events.update', 'events.patch']
+    assert event['hangoutLink'] in event['description']
+
+def test_calendar_client_shares_credentials_and_services_per_thread(tmp_path):
+    """Token file is read once per process and each thread keeps its own service"""
+    token_path = tmp_path / 'token.pickle'
+    token_path.write_bytes(pickle.dumps(Credentials(token='test-token')))
+    client = CalendarClient(token_path=str(token_path))
+    
+    first = GoogleCalendarService(client=client).get_calendar_service()
+    token_path.unlink()
+    second = GoogleCalendarService(client=client).get_calendar_service()
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(client.get_service()))
+    thread.start()
+    thread.join()
+    
+    assert first is second
+    assert other_thread[0] is not first
+    assert other_thread[0]._http is not first._http
+    assert client.get_credentials().token == 'test-token'
+
+def _interviews_for_bulk(count, recruiter, first_start, calendar_service=None):
+    """Create scheduled interviews on consecutive half hours from first_start"""
+    interviews = []
+    for i in range(count):
+        candidate = Candidate(name=f"Candidate {i}", phone_number=f"+1555000{i:04d}",
+                              email=f"candidate{i}@example.com", position_applied="Engineer")
+        start_time = first_start + timedelta(minutes=30 * i)
+        interview = Interview(start_time=start_time, end_time=start_time + timedelta(minutes=30),
+                              status='scheduled', candidate=candidate, recruiter=recruiter)
+        if calendar_service is not None:
+            event = calendar_service.create_event(recruiter.calendar_id, 'Interview', 'Interview',
+                                                  interview.start_time, interview.end_time, [])
+            interview.calendar_event_id = event['id']
+        interviews.append(interview)
+    db.session.add_all(interviews)
+    db.session.commit()
+    return interviews
+
+def test_bulk_cancel_uses_batched_deletes(app, calendar_api, next_week):
+    """Cancelling a recruiter's day deletes events in batches of 50 and commits once"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    other = Recruiter(name="Other", email="other@example.com", calendar_id="other-cal")
+    interviews = _interviews_for_bulk(60, recruiter, next_week(0, 9), GoogleCalendarService())
+    untouched = _interviews_for_bulk(1, other, next_week(0, 9))[0]
+    calendar_api._delete_event('recruiter-cal', interviews[0].calendar_event_id)
+    calendar_api.calls.clear()
+    
+    day = next_week(0, 0).strftime('%Y-%m-%d')
+    last_day = interviews[-1].start_time.strftime('%Y-%m-%d')
+    response = app.test_client().post('/admin/interviews/bulk/cancel', data={
+        'recruiter_id': recruiter.id, 'start_date': day, 'end_date': last_day})
+    
+    assert response.status_code == 302
+    assert calendar_api.calls == ['batch', 'batch']
+    assert calendar_api.batch_sizes == [50, 10]
+    assert Interview.query.filter_by(recruiter_id=recruiter.id, status='cancelled').count() == 60
+    assert db.session.get(Interview, untouched.id).status == 'scheduled'
+
+def test_bulk_create_missing_calendar_events(app, calendar_api, next_week):
+    """Interviews without a calendar event get one through a single batch request"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    _interviews_for_bulk(5, recruiter, next_week(0, 9))
+    
+    response = app.test_client().post('/admin/interviews/bulk/create_calendar_events')
+    
+    assert response.status_code == 302
+    assert calendar_api.calls == ['batch']
+    for interview in Interview.query.all():
+        assert interview.calendar_event_id in calendar_api.events_by_calendar['recruiter-cal']
+        assert interview.meet_link.startswith('https://meet.google.com/')
+
+def _event_inserted_but_not_recorded(calendar_api, interview):
+    """Insert an interview's event the way a job that died before recording it would have"""
+    calendar_api._insert_event(interview.recruiter.calendar_id, {
+        'id': calendar_event_id(interview), 'summary': 'Interview',
+        'start': {'dateTime': interview.start_time.isoformat()}, 'end': {'dateTime': interview.end_time.isoformat()},
+        'conferenceData': {'createRequest': {}}
+    })
+
+def test_bulk_create_claims_interviews_and_reuses_created_events(app, calendar_api, next_week):
+    """Failed interviews are claimed first and an event a timed-out job created is used instead of a duplicate"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    failed, fresh, in_flight = _interviews_for_bulk(3, recruiter, next_week(0, 9))
+    failed.calendar_status = 'failed'
+    in_flight.calendar_status = 'creating'
+    db.session.commit()
+    _event_inserted_but_not_recorded(calendar_api, failed)
+    
+    response = app.test_client().post('/admin/interviews/bulk/create_calendar_events')
+    
+    assert response.status_code == 302
+    assert len(calendar_api.events_by_calendar['recruiter-cal']) == 2
+    db.session.expire_all()
+    assert failed.calendar_event_id == calendar_event_id(failed) and failed.calendar_status == 'synced'
+    assert failed.meet_link.startswith('https://meet.google.com/')
+    assert fresh.calendar_event_id == calendar_event_id(fresh) and fresh.calendar_status == 'synced'
+    assert in_flight.calendar_event_id is None and in_flight.calendar_status == 'creating'
+
+def test_admin_calendar_retry_uses_the_job_claim_and_event_id(app, calendar_api, sent_messages, next_week):
+    """Retrying from the admin page skips interviews the job is handling and never creates a second event"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    pending, failed = _interviews_for_bulk(2, recruiter, next_week(0, 9))
+    pending.calendar_status = 'pending'
+    failed.calendar_status = 'failed'
+    db.session.commit()
+    _event_inserted_but_not_recorded(calendar_api, failed)
+    client = app.test_client()
+    
+    client.post(f'/admin/interviews/{pending.id}', data={'action': 'create_calendar_event'})
+    client.post(f'/admin/interviews/{failed.id}', data={'action': 'create_calendar_event'})
+    
+    assert len(calendar_api.events_by_calendar['recruiter-cal']) == 1
+    db.session.expire_all()
+    assert pending.calendar_status == 'pending' and pending.calendar_event_id is None
+    assert failed.calendar_status == 'synced' and failed.calendar_event_id == calendar_event_id(failed)
+
+def test_bulk_cancel_leaves_no_orphan_events(app, calendar_api, sent_messages, next_week):
+    """Interviews waiting for their event are cancelled before the job claims them; those being created are skipped"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    pending, in_flight = _interviews_for_bulk(2, recruiter, next_week(0, 9))
+    pending.calendar_status = 'pending'
+    in_flight.calendar_status = 'creating'
+    db.session.commit()
+    
+    day = next_week(0, 0).strftime('%Y-%m-%d')
+    app.test_client().post('/admin/interviews/bulk/cancel', data={
+        'recruiter_id': recruiter.id, 'start_date': day, 'end_date': day})
+    
+    db.session.expire_all()
+    assert (pending.status, in_flight.status) == ('cancelled', 'scheduled')
+    assert SchedulingService().create_interview_calendar_event(pending.id) is None
+    assert calendar_api.calls == []
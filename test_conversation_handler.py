@@ -0,0 +1,159 @@
+import threading
+from sqlalchemy import event as sa_event
+from app.models.database import db
+from app.models.models import Candidate, Interview, ConversationState
+from app.services.background_jobs import submit_job
+from app.services.conversation_dispatch import match_command, normalize_message
+from app.services.conversation_handler import ConversationHandler
+from app.services.conversation_store import ConversationStateStore, conversation_store, normalize_phone_number
+from app.services.keyed_locks import phone_locks
+from app.services.state_backends import StaleConversationState
+
+def _conversation_state_statements(statements):
+    """Split recorded SQL into reads and writes of the conversation_state table"""
+    touching = [sql.lstrip().upper() for sql in statements if 'conversation_state' in sql.lower()]
+    reads = [sql for sql in touching if sql.startswith('SELECT')]
+    return len(reads), len(touching) - len(reads)
+
+def test_conversation_steps_need_one_state_read_and_write(app, calendar_api, sent_messages, next_week, recruiters_with_calendars):
+    """Every message of a conversation reads its state at most once and writes it at most once"""
+    recruiters_with_calendars(1)
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    sa_event.listen(db.engine, 'before_cursor_execute', record)
+    
+    handler = ConversationHandler()
+    next_day = next_week(0, 0).strftime('%A')
+    steps = ['hi', 'Jane Doe', 'jane@example.com', 'Engineer', f"{next_day} 10am-12pm", '1', 'yes']
+    counts = []
+    try:
+        for step, message in enumerate(steps):
+            # Odd steps start with a cold cache, as after a restart or an expired entry
+            if step % 2:
+                conversation_store.clear()
+            statements.clear()
+            handler.handle_message('whatsapp:+15550006666', message)
+            counts.append(_conversation_state_statements(statements))
+    finally:
+        sa_event.remove(db.engine, 'before_cursor_execute', record)
+    
+    assert all(reads <= 1 and writes <= 1 for reads, writes in counts), counts
+    assert [reads for reads, _ in counts[::2]] == [1, 0, 0, 0]  # Only the very first message reads while warm
+    assert Interview.query.count() == 1
+    assert conversation_store.get('+15550006666').current_state == 'initial'
+
+def test_each_message_commits_once(app, calendar_api, sent_messages, next_week, recruiters_with_calendars):
+    """A message is one transaction, and its calendar job is queued only after the commit"""
+    recruiters_with_calendars(1)
+    commits = []
+    record = lambda conn: commits.append(conn)
+    sa_event.listen(db.engine, 'commit', record)
+    
+    handler = ConversationHandler()
+    next_day = next_week(0, 0).strftime('%A')
+    per_message = []
+    try:
+        for message in ['hi', 'Jane Doe', 'jane@example.com', 'Engineer', f"{next_day} 10am-12pm", '1', 'yes']:
+            commits.clear()
+            handler.handle_message('whatsapp:+15550009999', message)
+            per_message.append(len(commits))
+    finally:
+        sa_event.remove(db.engine, 'commit', record)
+    
+    assert per_message == [1] * 7
+    assert Interview.query.one().calendar_status == 'pending'
+    assert app.extensions['background_jobs'].pending_count() == 1
+
+def test_failed_message_rolls_back(app, monkeypatch):
+    """An error while handling a message discards its staged writes and queued jobs"""
+    jobs = []
+    def failing_name_state(self, phone_number, message_body, state):
+        self.scheduling_service.update_conversation_state(phone_number, 'awaiting_email', {'name': message_body})
+        submit_job(jobs.append, 'job')
+        raise RuntimeError("boom")
+    monkeypatch.setattr(ConversationHandler, 'handle_name_state', failing_name_state)
+    handler = ConversationHandler()
+    handler.handle_message('whatsapp:+15550009999', 'hi')
+    
+    response = handler.handle_message('whatsapp:+15550009999', 'Jane Doe')
+    
+    assert "error" in response
+    assert jobs == []
+    assert app.extensions['background_jobs'].pending_count() == 0
+    assert conversation_store.get('+15550009999').current_state == 'awaiting_name'
+    conversation_store.clear()
+    assert ConversationState.query.one().current_state == 'awaiting_name'
+
+def test_commands_and_states_dispatch_through_tables(app, monkeypatch):
+    """One regex recognizes every command and each state reaches its registered handler"""
+    cases = {
+        '  Hello ': 'greeting', 'START OVER': 'reset', 'continue ': 'continue',
+        'did I get the calendar invite?': 'calendar', 'hi there': None, 'Jane Doe': None,
+    }
+    for body, command in cases.items():
+        assert match_command(normalize_message(body)) == command
+    assert set(ConversationHandler.states.handlers) == {
+        'initial', 'awaiting_name', 'awaiting_email', 'awaiting_position',
+        'awaiting_availability', 'awaiting_slot_selection', 'awaiting_confirmation'}
+    
+    monkeypatch.setattr(ConversationHandler, 'handle_email_state', lambda self, phone, body, state: 'patched')
+    handler = ConversationHandler()
+    handler.handle_message('+15550004444', 'hi')
+    handler.handle_message('+15550004444', 'Jane Doe')
+    assert handler.handle_message('+15550004444', ' Continue') == ConversationHandler.CONTINUE_PROMPTS['awaiting_email']
+    assert handler.handle_message('+15550004444', 'jane@example.com') == 'patched'
+
+def test_messages_are_serialized_per_phone_number(app, monkeypatch):
+    """Messages from one number never overlap, while different numbers run in parallel"""
+    running = {}
+    overlaps = []
+    barrier = threading.Barrier(2, timeout=5)
+    lock = threading.Lock()
+    def recording_process_message(self, from_number, message_body):
+        phone_number = normalize_phone_number(from_number)
+        with lock:
+            running[phone_number] = running.get(phone_number, 0) + 1
+            overlaps.append(running[phone_number])
+        if message_body == 'wait':
+            # Only returns when the other number is being handled at the same time
+            barrier.wait()
+        else:
+            threading.Event().wait(0.02)
+        with lock:
+            running[phone_number] -= 1
+        return 'ok'
+    monkeypatch.setattr(ConversationHandler, 'process_message', recording_process_message)
+    handler = ConversationHandler()
+    
+    def send(from_number, body, responses):
+        with app.app_context():
+            responses.append(handler.handle_message(from_number, body))
+    
+    responses = []
+    threads = [threading.Thread(target=send, args=(number, 'hello', responses))
+               for number in ['whatsapp:+15550001111', '+1 555 000 1111', '0015550001111'] * 2]
+    threads += [threading.Thread(target=send, args=(number, 'wait', responses))
+                for number in ['+15550002222', '+15550003333']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert responses == ['ok'] * 8
+    assert max(overlaps) == 1
+    assert phone_locks.active_keys() == 0
+
+def test_failed_state_write_rolls_back_the_message(app, monkeypatch):
+    """A state write that fails after the candidate was created rolls the whole message back"""
+    handler = ConversationHandler()
+    for message in ['hi', 'Jane Doe', 'jane@example.com']:
+        handler.handle_message('whatsapp:+15550003333', message)
+    
+    def lost_update(self, phone_number, *args, **kwargs):
+        raise StaleConversationState(phone_number)
+    monkeypatch.setattr(ConversationStateStore, 'save', lost_update)
+    response = handler.handle_message('whatsapp:+15550003333', 'Engineer')
+    
+    assert "there was an error processing your message" in response
+    assert Candidate.query.count() == 0
+    assert conversation_store.get('+15550003333').current_state == 'awaiting_position'
@@ -0,0 +1,208 @@
+import json
+import pytest
+import threading
+from datetime import datetime
+from app.models.database import db, unit_of_work
+from app.models.models import Candidate, ConversationState, Interview, Recruiter
+from app.services.conversation_context import ConversationContext
+from app.services.conversation_store import ConversationStateStore, normalize_phone_number
+from app.services.state_backends import BACKENDS, MemoryStateBackend, SQLiteFileStateBackend
+from migrate_conversation_states import add_interview_calendar_columns, add_version_column, collapse_conversation_states
+
+def test_phone_numbers_normalize_to_e164():
+    """Every spelling of a number maps to the same E.164 key"""
+    for spelling in ['whatsapp:+15550007777', '+1 (555) 000-7777', '15550007777', '0015550007777',
+                     ' WhatsApp:+1.555.000.7777 ']:
+        assert normalize_phone_number(spelling) == '+15550007777'
+    assert normalize_phone_number('') == ''
+    assert normalize_phone_number(None) == ''
+
+def test_conversation_state_upsert_keeps_one_row(app):
+    """Writers with cold caches upsert into the same row instead of inserting duplicates"""
+    first, second = ConversationStateStore(), ConversationStateStore()
+    first.save('whatsapp:+15550007777', 'awaiting_email', {'name': 'Jane'})
+    second.save('+1 555 000 7777', 'awaiting_position', {'email': 'jane@example.com'})
+    
+    state = ConversationState.query.one()
+    assert state.phone_number == '+15550007777'
+    assert state.current_state == 'awaiting_position'
+    assert state.context == {'n': 'Jane', 'e': 'jane@example.com'}
+    
+    assert second.delete('15550007777')
+    assert ConversationState.query.count() == 0
+
+def _state_backend(name, tmp_path):
+    if name == 'sqlite':
+        return SQLiteFileStateBackend(str(tmp_path / 'conversation_state.db'))
+    return BACKENDS[name]()
+
+@pytest.mark.parametrize('backend_name', ['sql', 'memory', 'sqlite'])
+def test_state_backends_round_trip_and_roll_back(app, tmp_path, backend_name):
+    """Every backend stores, merges and deletes states, and undoes writes of a rolled back message"""
+    store = ConversationStateStore(backend=_state_backend(backend_name, tmp_path), ttl_seconds=0)
+    store.save('whatsapp:+15550007777', 'awaiting_email', {'name': 'Jane'})
+    store.save('+15550007777', 'awaiting_position', {'email': 'jane@example.com'})
+    
+    state = store.get('+15550007777')
+    assert state.current_state == 'awaiting_position'
+    assert state.context == ConversationContext(name='Jane', email='jane@example.com')
+    
+    with pytest.raises(RuntimeError):
+        with unit_of_work():
+            store.save('+15550007777', 'awaiting_availability', {'position': 'Engineer'})
+            store.save('+15550008888', 'awaiting_name', {})
+            raise RuntimeError("boom")
+    
+    assert store.get('+15550007777').current_state == 'awaiting_position'
+    assert store.get('+15550008888').current_state == 'initial'
+    assert store.delete('+15550007777')
+    assert not store.delete('+15550007777')
+    assert store.get('+15550007777').context == ConversationContext()
+
+@pytest.mark.parametrize('backend_name', ['sql', 'memory', 'sqlite'])
+def test_stale_cached_state_is_merged_instead_of_overwriting(app, tmp_path, backend_name):
+    """A process whose cached state is older than the stored one reloads it instead of writing over it"""
+    backend = _state_backend(backend_name, tmp_path)
+    # Two processes with their own caches over the same states
+    first, second = ConversationStateStore(backend=backend), ConversationStateStore(backend=backend)
+    first.save('+15550007777', 'awaiting_email', {'name': 'Jane'})
+    second.get('+15550007777')
+    
+    first.save('+15550007777', 'awaiting_position', {'email': 'jane@example.com'})
+    second.save('+15550007777', 'awaiting_availability', {'position': 'Engineer'})
+    
+    state = ConversationStateStore(backend=backend, ttl_seconds=0).get('+15550007777')
+    assert state.current_state == 'awaiting_availability'
+    assert state.context == ConversationContext(name='Jane', email='jane@example.com', position='Engineer')
+    assert backend.load('+15550007777')[2] == 3
+
+@pytest.mark.parametrize('backend_name', ['memory', 'sqlite'])
+def test_rolled_back_write_keeps_a_later_write_from_elsewhere(app, tmp_path, backend_name):
+    """Undoing a rolled back message does not overwrite a state another writer stored in between"""
+    backend = _state_backend(backend_name, tmp_path)
+    ConversationStateStore(backend=backend).save('+15550007777', 'awaiting_email', {'name': 'Jane'})
+    ConversationStateStore(backend=backend).save('+15550008888', 'awaiting_email', {'name': 'John'})
+    
+    def write_elsewhere(phone_number, current_state):
+        # Another process, outside of this thread's unit of work
+        other = threading.Thread(target=ConversationStateStore(backend=backend, ttl_seconds=0).save,
+                                 args=(phone_number, current_state))
+        other.start()
+        other.join()
+    
+    with pytest.raises(RuntimeError):
+        with unit_of_work():
+            store = ConversationStateStore(backend=backend, ttl_seconds=0)
+            store.save('+15550007777', 'awaiting_position', {'email': 'jane@example.com'})
+            store.save('+15550008888', 'awaiting_position', {'email': 'john@example.com'})
+            store.save('+15550009999', 'awaiting_name', {})
+            write_elsewhere('+15550007777', 'awaiting_availability')
+            raise RuntimeError("boom")
+    
+    # Written again since: kept. Untouched since: put back. New and untouched: removed.
+    assert backend.load('+15550007777')[0] == 'awaiting_availability'
+    current_state, _, version = backend.load('+15550008888')
+    assert (current_state, version) == ('awaiting_email', 1)
+    assert backend.load('+15550009999') is None
+
+def test_conversation_context_is_compact_and_tracks_changes(monkeypatch):
+    """Contexts load the older dict format, serialize compactly and merge only changed fields"""
+    legacy = {
+        'candidate_id': 7, 'name': 'Jane Doe', 'email': 'jane@example.com', 'position': 'Engineer',
+        'available_slots': [['2025-03-03T10:00:00', '2025-03-03T11:00:00', 3],
+                            ['2025-03-03T11:00:00', '2025-03-03T12:00:00', 3]],
+        'selected_slot': ['2025-03-03T11:00:00', '2025-03-03T12:00:00']
+    }
+    context = ConversationContext.from_compact(json.dumps(legacy))
+    assert context.dirty_fields == frozenset()
+    assert context.offered_slot_times()[1] == (datetime(2025, 3, 3, 11), datetime(2025, 3, 3, 12), 3)
+    assert context.selected_slot_times() == (datetime(2025, 3, 3, 11), datetime(2025, 3, 3, 12))
+    compact = context.to_compact()
+    assert len(compact) < len(json.dumps(legacy)) * 0.6
+    assert ConversationContext.from_compact(compact) == context
+    
+    backend = MemoryStateBackend()
+    writes = []
+    monkeypatch.setattr(backend, 'save', lambda *args: writes.append(args) or MemoryStateBackend.save(backend, *args))
+    store = ConversationStateStore(backend=backend)
+    store.save('+15550007777', 'awaiting_email', ConversationContext(name='Jane'))
+    first, second = store.get('+15550007777'), store.get('+15550007777')
+    first.context.email = 'jane@example.com'
+    store.save('+15550007777', 'awaiting_position', first.context)
+    # A copy loaded before that write only contributes the field it changed
+    second.context.position = 'Engineer'
+    store.save('+15550007777', 'awaiting_position', second.context)
+    assert store.get('+15550007777').context == ConversationContext(
+        name='Jane', email='jane@example.com', position='Engineer')
+    
+    # Saving an unchanged state writes nothing
+    store.save('+15550007777', 'awaiting_position', store.get('+15550007777').context)
+    assert len(writes) == 3
+
+def test_migration_collapses_duplicate_conversation_states(app):
+    """The migration keeps the most recently updated state of each number under its E.164 key"""
+    db.session.add_all([
+        ConversationState(phone_number='15550007777', current_state='awaiting_name',
+                          updated_at=datetime(2025, 1, 1)),
+        ConversationState(phone_number='+1 555 000 7777', current_state='awaiting_email',
+                          context={'name': 'Jane'}, updated_at=datetime(2025, 1, 2)),
+        ConversationState(phone_number='+15550007777', current_state='initial',
+                          updated_at=datetime(2024, 12, 31)),
+        ConversationState(phone_number='+15550008888', current_state='awaiting_position',
+                          updated_at=datetime(2025, 1, 1)),
+        Candidate(name="Jane Doe", phone_number='1 555 000 7777', email="jane@example.com",
+                  position_applied="Engineer"),
+    ])
+    db.session.commit()
+    
+    assert collapse_conversation_states() == 2
+    
+    states = {state.phone_number: state for state in ConversationState.query.all()}
+    assert set(states) == {'+15550007777', '+15550008888'}
+    assert states['+15550007777'].current_state == 'awaiting_email'
+    assert states['+15550007777'].context == {'name': 'Jane'}
+    assert Candidate.query.one().phone_number == '+15550007777'
+
+def test_migration_adds_version_column(app):
+    """Conversation state tables created before versioned writes get the column, with existing rows at 0"""
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE conversation_state")
+        connection.exec_driver_sql(
+            "CREATE TABLE conversation_state (id INTEGER PRIMARY KEY, phone_number VARCHAR(20) NOT NULL, "
+            "current_state VARCHAR(50), context JSON, created_at DATETIME, updated_at DATETIME)")
+        connection.exec_driver_sql(
+            "INSERT INTO conversation_state (phone_number, current_state, context) "
+            "VALUES ('+15550007777', 'awaiting_email', '{}')")
+    
+    assert add_version_column()
+    assert not add_version_column()
+    
+    store = ConversationStateStore(ttl_seconds=0)
+    store.save('+15550007777', 'awaiting_position', {'name': 'Jane'})
+    assert ConversationState.query.one().version == 1
+
+def test_migration_adds_interview_calendar_columns(app):
+    """Interview tables from the first release get the calendar columns; rows with an event count as synced"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    candidate = Candidate(name="Jane Doe", phone_number="+15550007777", email="jane@example.com",
+                          position_applied="Engineer")
+    db.session.add_all([recruiter, candidate])
+    db.session.commit()
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE interview")
+        connection.exec_driver_sql(
+            "CREATE TABLE interview (id INTEGER PRIMARY KEY, start_time DATETIME NOT NULL, end_time DATETIME NOT NULL, "
+            "status VARCHAR(50), calendar_event_id VARCHAR(200), calendar_url VARCHAR(500), "
+            "candidate_id INTEGER NOT NULL, recruiter_id INTEGER NOT NULL, created_at DATETIME, updated_at DATETIME)")
+        for event_id in ("'evt-1'", 'NULL'):
+            connection.exec_driver_sql(
+                "INSERT INTO interview (start_time, end_time, status, calendar_event_id, candidate_id, recruiter_id) "
+                f"VALUES ('2025-03-03 10:00:00', '2025-03-03 11:00:00', 'scheduled', {event_id}, "
+                f"{candidate.id}, {recruiter.id})")
+    
+    assert add_interview_calendar_columns() == ['meet_link', 'calendar_status', 'calendar_attempts', 'calendar_error']
+    assert add_interview_calendar_columns() == []
+    
+    interviews = Interview.query.order_by(Interview.id).all()
+    assert [interview.calendar_status for interview in interviews] == ['synced', None]
+    assert [interview.calendar_attempts for interview in interviews] == [0, 0]
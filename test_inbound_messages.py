@@ -0,0 +1,87 @@
+import atexit
+import os
+from twilio.request_validator import RequestValidator
+import app as app_package
+from app.services.background_jobs import BackgroundJobQueue
+from app.services.conversation_handler import ConversationHandler
+from app.services.conversation_store import conversation_store
+from app.services.inbound_messages import InboundMessageQueue
+
+def _signed_post(client, params, url='http://localhost/webhook'):
+    """Post a Twilio form webhook with the signature Twilio would send for it"""
+    signature = RequestValidator(os.environ['TWILIO_AUTH_TOKEN']).compute_signature(url, params)
+    return client.post('/webhook', data=params, headers={'X-Twilio-Signature': signature})
+
+def test_async_webhook_acknowledges_then_replies_in_order(app, sent_messages, monkeypatch):
+    """In async mode the webhook returns empty TwiML and workers answer each number in order"""
+    handled = []
+    def handle_message(from_number, body, message_sid=None):
+        handled.append(body)
+        return ConversationHandler().handle_message(from_number, body, message_sid)
+    inbound_queue = BackgroundJobQueue(app, workers=0, max_attempts=1)
+    inbound_messages = InboundMessageQueue(inbound_queue, handle_message)
+    monkeypatch.setitem(app.extensions, 'inbound_messages', inbound_messages)
+    client = app.test_client()
+    
+    for sid, body in [('SM1', 'hi'), ('SM2', 'Jane Doe'), ('SM2', 'Jane Doe'), ('SM3', 'jane@example.com')]:
+        response = _signed_post(client, {'From': 'whatsapp:+15550005555', 'Body': body, 'MessageSid': sid})
+        assert response.status_code == 200
+        assert '<Message>' not in response.get_data(as_text=True)
+    _signed_post(client, {'From': 'whatsapp:+15550006666', 'Body': 'hello', 'MessageSid': 'SM4'})
+    
+    assert handled == [] and inbound_messages.pending_count() == 5
+    assert inbound_queue.run_pending() == 5
+    
+    # The second number is not stuck behind the first, and the redelivered SM2 is skipped
+    assert handled == ['hi', 'hello', 'Jane Doe', 'jane@example.com']
+    assert inbound_messages.pending_count() == 0
+    assert conversation_store.get('+15550005555').current_state == 'awaiting_position'
+    assert app.extensions['outbound_sender'].run_pending() == 4
+    assert [to for to, _ in sent_messages] == ['whatsapp:+15550005555', 'whatsapp:+15550006666',
+                                               'whatsapp:+15550005555', 'whatsapp:+15550005555']
+    assert 'Jane Doe' in sent_messages[2][1]
+
+def test_async_webhook_only_queues_signed_twilio_requests(app, monkeypatch):
+    """Unsigned, wrongly signed and JSON posts cannot make the workers message a number"""
+    inbound_messages = InboundMessageQueue(BackgroundJobQueue(app, workers=0, max_attempts=1), lambda *args: 'reply')
+    monkeypatch.setitem(app.extensions, 'inbound_messages', inbound_messages)
+    client = app.test_client()
+    message = {'From': 'whatsapp:+15550005555', 'Body': 'hi', 'MessageSid': 'SM1'}
+    
+    assert client.post('/webhook', data=message).status_code == 403
+    assert client.post('/webhook', data=message, headers={'X-Twilio-Signature': 'forged'}).status_code == 403
+    assert client.post('/webhook', json={'from': '+15550005555', 'message': 'hi'}).status_code == 400
+    # Signed for another URL than the one Twilio posts to
+    assert _signed_post(client, message, url='https://example.com/webhook').status_code == 403
+    assert inbound_messages.received == 0
+    
+    # Behind a proxy the signature covers the public URL
+    monkeypatch.setenv('TWILIO_WEBHOOK_URL', 'https://example.com/webhook')
+    assert _signed_post(client, message, url='https://example.com/webhook').status_code == 200
+    assert inbound_messages.received == 1
+
+def test_app_workers_run_outside_testing_and_stop_at_exit(app, monkeypatch):
+    """Worker threads only start outside TESTING, and the exit hook stops them"""
+    exit_hooks = []
+    monkeypatch.setattr(atexit, 'register', lambda func, *args: exit_hooks.append((func, args)))
+    monkeypatch.setattr(app_package, 'configure_logging', lambda background=True: None)
+    monkeypatch.setenv('WEBHOOK_ASYNC', 'true')
+    monkeypatch.setenv('BACKGROUND_JOB_WORKERS', '1')
+    monkeypatch.setenv('TWILIO_SENDER_WORKERS', '1')
+    
+    assert app.extensions['background_jobs']._threads == []
+    assert app.extensions['outbound_sender'].job_queue._threads == []
+    
+    served_app = app_package.create_app()
+    threads = [thread for queue in (served_app.extensions['inbound_messages'].job_queue,
+                                    served_app.extensions['background_jobs'],
+                                    served_app.extensions['outbound_sender'].job_queue)
+               for thread in queue._threads]
+    assert len(threads) == 6 and all(thread.is_alive() for thread in threads)
+    
+    assert exit_hooks == [(app_package.stop_workers, (served_app,))]
+    func, args = exit_hooks[0]
+    func(*args)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in threads)
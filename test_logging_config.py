@@ -0,0 +1,33 @@
+import io
+import logging
+from app.logging_config import mask_phone, parse_levels, queue_handler_for
+
+def test_logging_is_queued_sampled_and_keeps_request_values_out_of_info(app, monkeypatch):
+    """Records reach the stream through the queue listener; DEBUG lines are sampled and INFO hides message bodies"""
+    stream = io.StringIO()
+    handler, listener = queue_handler_for(stream, sample_every=3)
+    app_logger = logging.getLogger('app')
+    sampled = logging.getLogger('app.sampling_test')
+    monkeypatch.setattr(app_logger, 'handlers', [handler])
+    saved_level = app_logger.level
+    app_logger.setLevel(logging.INFO)
+    sampled.setLevel(logging.DEBUG)
+    listener.start()
+    try:
+        app.test_client().post('/webhook', data={'From': 'whatsapp:+15550007777', 'Body': 'hi', 'MessageSid': 'SM1'})
+        for i in range(7):
+            sampled.debug('debug line %s', i)
+        sampled.info('info line')
+    finally:
+        listener.stop()
+        app_logger.setLevel(saved_level)
+        sampled.setLevel(logging.NOTSET)
+    
+    output = stream.getvalue()
+    assert 'INFO app.services.conversation_handler: Greeting detected, resetting conversation for ********7777' in output
+    assert '15550007777' not in output and 'MessageSid' not in output
+    assert [line.rsplit(': ', 1)[1] for line in output.splitlines() if 'sampling_test' in line] == [
+        'debug line 0', 'debug line 3', 'debug line 6', 'info line']
+    assert parse_levels('app.routes.webhook=debug, app.services.google_calendar=WARNING,') == {
+        'app.routes.webhook': 'DEBUG', 'app.services.google_calendar': 'WARNING'}
+    assert mask_phone('+15550007777') == '********7777'
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from app.models.database import db
+from app.models.models import Interview, ProcessedMessage
+from app.services.conversation_store import conversation_store
+from app.services.message_dedupe import processed_messages, purge_processed_messages
+
+def test_redelivered_message_repeats_its_reply(app, awaiting_confirmation, monkeypatch):
+    """A webhook retry with the same MessageSid neither books twice nor touches the conversation"""
+    handler = awaiting_confirmation('+15550001111')
+    monkeypatch.setattr('app.routes.webhook.conversation_handler', handler)
+    client = app.test_client()
+    message = {'From': 'whatsapp:+15550001111', 'Body': 'yes', 'MessageSid': 'SM0001'}
+    
+    first = client.post('/webhook', data=message).get_data(as_text=True)
+    conversation_store.clear()
+    processed_messages.clear()
+    queries = []
+    sa_event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    second = client.post('/webhook', data=message).get_data(as_text=True)
+    
+    assert 'scheduled' in first and second == first
+    assert len(queries) == 1 and 'processed_message' in queries[0]
+    assert Interview.query.count() == 1
+    assert app.extensions['background_jobs'].pending_count() == 1
+    assert processed_messages.duplicates == 1
+    
+    ProcessedMessage.query.update({'created_at': datetime.utcnow() - timedelta(days=2)})
+    db.session.commit()
+    assert processed_messages.get('SM0002') is None
+    assert purge_processed_messages(86400) == 1
+    assert ProcessedMessage.query.count() == 0
@@ -0,0 +1,39 @@
+import pytest
+from twilio.rest import Client
+from app.services.fake_twilio import FakeTwilioHttpClient
+from app.services.rate_limiter import RateLimiter
+from app.services.metrics import metrics
+from app.services.twilio_service import TwilioService
+
+def test_pipeline_stages_and_api_calls_are_exposed_as_metrics(app, calendar_api, awaiting_confirmation, monkeypatch):
+    """Each stage of a webhook is timed, every API call is counted for its conversation and /metrics renders them"""
+    fake_twilio = FakeTwilioHttpClient()
+    monkeypatch.setattr(app.extensions['outbound_sender'], 'twilio_service', TwilioService(
+        client=Client('ACtest', 'test', http_client=fake_twilio), rate_limiter=RateLimiter(rate_per_second=0)))
+    awaiting_confirmation('+15550001111')
+    client = app.test_client()
+    
+    client.post('/webhook', data={'From': 'whatsapp:+15550001111', 'Body': 'yes', 'MessageSid': 'SM1'})
+    assert app.extensions['background_jobs'].run_pending() == 1
+    assert app.extensions['outbound_sender'].run_pending() == 1
+    with pytest.raises(ValueError), metrics.api_call('twilio', 'messages.create'):
+        raise ValueError("Invalid number")
+    
+    for stage in ('webhook_parse', 'state_load', 'handler'):
+        assert metrics.histogram('stage_seconds', stage=stage)[0] == 1
+    assert metrics.histogram('stage_seconds', stage='db_commit')[0] >= 2
+    # The reply went out in the webhook response, so the message itself made no API calls
+    assert metrics.histogram('api_calls_per_message') == (1, 0)
+    assert metrics.counter('api_calls_total', api='google_calendar', method='events.insert') == 1
+    assert metrics.counter('api_calls_total', api='twilio', method='messages.create') == 2
+    assert metrics.counter('api_errors_total', api='twilio', method='messages.create') == 1
+    assert metrics.conversation_calls('whatsapp:+15550001111') == {'google_calendar': 1, 'twilio': 1}
+    assert len(fake_twilio.messages) == 1
+    
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE scheduling_bot_stage_seconds histogram' in text
+    assert 'scheduling_bot_stage_seconds_count{stage="handler"} 1' in text
+    assert 'scheduling_bot_api_call_seconds_bucket{api="google_calendar",method="events.insert",le="+Inf"} 1' in text
+    assert 'scheduling_bot_api_calls_total{api="twilio",method="messages.create"} 2' in text
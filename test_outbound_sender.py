@@ -0,0 +1,63 @@
+import random
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from twilio.base.exceptions import TwilioRestException
+from twilio.rest import Client
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from app.services.background_jobs import BackgroundJobQueue
+from app.services.fake_twilio import FakeTwilioHttpClient
+from app.services.outbound_sender import OutboundSender, is_retryable
+from app.services.rate_limiter import WHATSAPP_MESSAGES_PER_SECOND, RateLimiter
+from app.services.twilio_service import TwilioService
+
+def test_outbound_sender_paces_and_retries_throttled_sends(app, monkeypatch):
+    """Sends share one rate limit per number, 429/5xx are retried and other errors fail at once"""
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    clock = [0.0]
+    now = lambda: clock[0]
+    limiter = RateLimiter(rate_per_second=2, burst=1, clock=now, sleep=lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    fake_twilio = FakeTwilioHttpClient()
+    service = TwilioService(client=Client('ACtest', 'test', http_client=fake_twilio), rate_limiter=limiter)
+    queue = BackgroundJobQueue(app, workers=0, max_attempts=3, base_delay=1, clock=now, retry_on=is_retryable)
+    sender = OutboundSender(queue, twilio_service=service, clock=now)
+    
+    fake_twilio.fail_next(429)
+    fake_twilio.fail_next(503)
+    for i in range(3):
+        sender.send(f"+1555000{i:04d}", f"Message {i}")
+    while sender.pending_count():
+        sender.run_pending()
+        clock[0] += 1
+    
+    assert sorted(message['body'] for message in fake_twilio.messages) == ['Message 0', 'Message 1', 'Message 2']
+    assert fake_twilio.messages[0]['to'] == 'whatsapp:+15550000002'
+    assert fake_twilio.requests == 5
+    # Five requests at two per second from one number
+    assert limiter.waits == 4 and limiter.waited_seconds >= 1.5
+    stats = sender.stats()
+    assert (stats['sent'], stats['retried'], stats['failed']) == (3, 2, 0)
+    assert stats['messages_per_second'] > 0
+    
+    fake_twilio.fail_next(400)
+    sender.send('+15550009999', 'Invalid')
+    sender.run_pending()
+    assert sender.stats()['failed'] == 1 and sender.pending_count() == 0
+    assert fake_twilio.requests == 6
+
+def test_only_failures_before_twilio_got_the_message_are_retried():
+    """Connect failures, 429 and 5xx are retried; read timeouts and dropped connections could send twice"""
+    refused = MaxRetryError(None, '/Messages.json', NewConnectionError(None, 'Connection refused'))
+    assert is_retryable(ConnectionError(refused))
+    assert is_retryable(ConnectTimeout())
+    assert is_retryable(TwilioRestException(429, '/Messages.json'))
+    assert is_retryable(TwilioRestException(503, '/Messages.json'))
+    
+    assert not is_retryable(ReadTimeout())
+    assert not is_retryable(ConnectionError(ProtocolError('Connection aborted.')))
+    assert not is_retryable(TwilioRestException(400, '/Messages.json'))
+
+def test_send_rate_defaults_to_whatsapp_throughput(monkeypatch):
+    """Without configuration, each sender number may send Twilio's default WhatsApp throughput"""
+    monkeypatch.delenv('TWILIO_SEND_RATE', raising=False)
+    monkeypatch.delenv('TWILIO_SEND_BURST', raising=False)
+    limiter = RateLimiter.from_env()
+    assert (limiter.rate_per_second, limiter.burst) == (WHATSAPP_MESSAGES_PER_SECOND, WHATSAPP_MESSAGES_PER_SECOND) == (80, 80)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from app.models.database import db
+from app.models.models import Candidate, Interview
+from app.services.conversation_handler import ConversationHandler
+from app.services.google_calendar import GoogleCalendarService
+from app.services.recruiter_assignment import LeastBookedPolicy, RecruiterAssigner, RoundRobinPolicy
+from app.services.scheduling_service import SchedulingService
+
+def test_recruiter_assigner_merges_earliest_offers(app, fake_calendar, next_week, recruiters_with_calendars):
+    """Offers are the earliest distinct times across recruiters, tie-broken by the policy"""
+    recruiters = recruiters_with_calendars(3)
+    candidate = Candidate(name="Jane Doe", phone_number="+15550004444", email="jane@example.com",
+                          position_applied="Engineer")
+    db.session.add(candidate)
+    db.session.commit()
+    # Recruiter 0 already has an interview this week, recruiter 1 is busy on Monday morning
+    db.session.add(Interview(start_time=next_week(-7, 9), end_time=next_week(-7, 10), status='scheduled',
+                             candidate_id=candidate.id, recruiter_id=recruiters[0].id))
+    db.session.add(Interview(start_time=datetime.now(), end_time=datetime.now() + timedelta(hours=1),
+                             status='scheduled', candidate_id=candidate.id, recruiter_id=recruiters[0].id))
+    db.session.commit()
+    fake_calendar.add_busy('cal-1', next_week(0, 9), next_week(0, 12))
+    fake_calendar.add_busy('cal-2', next_week(0, 9), next_week(0, 10))
+    
+    scheduling_service = SchedulingService()
+    scheduling_service.calendar_service = GoogleCalendarService(service=fake_calendar)
+    assigner = RecruiterAssigner(scheduling_service, LeastBookedPolicy())
+    windows = [(next_week(0, 9), next_week(0, 12))]
+    
+    offers = assigner.find_offers(windows, next_week(0, 0), next_week(5, 0), k=3)
+    
+    assert fake_calendar.call_count('freebusy.query') == 1
+    assert [(start, recruiter.name) for start, _, recruiter in offers] == [
+        (next_week(0, 9), "Recruiter 0"),  # Only recruiter 0 is free at 9
+        (next_week(0, 10), "Recruiter 2"),  # Recruiters 0 and 2 are free, 2 has fewer bookings
+        (next_week(0, 11), "Recruiter 2"),
+    ]
+
+def test_recruiter_assigner_skips_booked_interviews(app, fake_calendar, next_week, recruiters_with_calendars):
+    """Slots taken by interviews whose calendar events do not exist yet are not offered again"""
+    recruiters = recruiters_with_calendars(2)
+    candidate = Candidate(name="Jane Doe", phone_number="+15550004444", email="jane@example.com",
+                          position_applied="Engineer")
+    db.session.add(candidate)
+    db.session.commit()
+    db.session.add(Interview(start_time=next_week(0, 9), end_time=next_week(0, 10), status='scheduled',
+                             calendar_status='pending', candidate_id=candidate.id, recruiter_id=recruiters[0].id))
+    db.session.add(Interview(start_time=next_week(0, 9), end_time=next_week(0, 10), status='scheduled',
+                             calendar_status='creating', candidate_id=candidate.id, recruiter_id=recruiters[1].id))
+    db.session.add(Interview(start_time=next_week(0, 10), end_time=next_week(0, 11), status='cancelled',
+                             candidate_id=candidate.id, recruiter_id=recruiters[0].id))
+    db.session.commit()
+    
+    scheduling_service = SchedulingService()
+    scheduling_service.calendar_service = GoogleCalendarService(service=fake_calendar)
+    assigner = RecruiterAssigner(scheduling_service, RoundRobinPolicy())
+    windows = [(next_week(0, 9), next_week(0, 11))]
+    
+    offers = assigner.find_offers(windows, next_week(0, 0), next_week(5, 0), k=3)
+    
+    assert [(start, recruiter.name) for start, _, recruiter in offers] == [(next_week(0, 10), "Recruiter 0")]
+
+def test_round_robin_policy_rotates(app, recruiters_with_calendars):
+    """Round robin prefers a different recruiter for each assignment"""
+    recruiters = recruiters_with_calendars(3)
+    policy = RoundRobinPolicy()
+    
+    preferred = []
+    for _ in range(4):
+        ranks = policy.rank(recruiters)
+        preferred.append(min(ranks, key=ranks.get))
+    
+    ids = [recruiter.id for recruiter in recruiters]
+    assert preferred == [ids[0], ids[1], ids[2], ids[0]]
+
+def test_offered_recruiter_is_used_for_confirmation(app, calendar_api, sent_messages, recruiters_with_calendars):
+    """The recruiter an offer was made with is kept in the context through confirmation"""
+    recruiters = recruiters_with_calendars(3)
+    next_day = datetime.now() + timedelta(days=1)
+    while next_day.weekday() >= 5:
+        next_day += timedelta(days=1)
+    day_start = next_day.replace(hour=0, minute=0, second=0, microsecond=0)
+    calendar_api.add_busy('cal-0', day_start, day_start + timedelta(days=1))
+    calendar_api.add_busy('cal-1', day_start, day_start + timedelta(days=1))
+    
+    candidate = Candidate(name="Jane Doe", phone_number="+15550005555", email="jane@example.com",
+                          position_applied="Engineer")
+    db.session.add(candidate)
+    db.session.commit()
+    handler = ConversationHandler()
+    handler.scheduling_service.update_conversation_state('+15550005555', 'awaiting_availability', {
+        'candidate_id': candidate.id, 'name': candidate.name, 'email': candidate.email,
+        'position': candidate.position_applied
+    })
+    
+    response = handler.handle_message('whatsapp:+15550005555', f"{next_day.strftime('%A')} 10am-12pm")
+    assert "with Recruiter 2" in response
+    handler.handle_message('whatsapp:+15550005555', '2')
+    handler.handle_message('whatsapp:+15550005555', 'yes')
+    
+    interview = Interview.query.one()
+    assert interview.recruiter_id == recruiters[2].id
+    assert interview.start_time == day_start.replace(hour=11)
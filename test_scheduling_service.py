@@ -0,0 +1,155 @@
+import random
+from datetime import datetime, timedelta
+from app.models.database import db
+from app.models.models import Candidate, Interview, Recruiter
+from app.services.background_jobs import BackgroundJobQueue
+from app.services.google_calendar import GoogleCalendarService
+from app.services.scheduling_service import SchedulingService, calendar_event_id
+from retry_calendar_events import retry_pending_calendar_events
+
+# A Monday, so the whole window falls on working days
+WINDOW_START = datetime(2025, 3, 3, 9, 0)
+WINDOW_END = datetime(2025, 3, 5, 17, 0)
+
+def test_recruiter_availability_batch(app, fake_calendar, recruiters_with_calendars):
+    """Scheduling service returns per-recruiter busy sets and free slots from one query"""
+    recruiters = recruiters_with_calendars(5)
+    recruiters.append(Recruiter(name="No Calendar", email="nocal@example.com"))
+    db.session.add(recruiters[-1])
+    db.session.commit()
+    fake_calendar.add_busy('cal-2', datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 5, 17, 0))
+    
+    scheduling_service = SchedulingService()
+    scheduling_service.calendar_service = GoogleCalendarService(service=fake_calendar)
+    availability = scheduling_service.get_recruiters_availability_from_calendar(
+        [recruiter.id for recruiter in recruiters], WINDOW_START, WINDOW_END)
+    
+    assert fake_calendar.call_count('freebusy.query') == 1
+    assert set(availability) == {recruiter.id for recruiter in recruiters[:5]}
+    assert availability[recruiters[2].id]['slots'] == []
+    assert len(availability[recruiters[0].id]['slots']) == 24
+
+def test_match_slots_packs_overlaps(app):
+    """Candidate windows and recruiter slots are intersected and packed into whole slots"""
+    scheduling_service = SchedulingService()
+    recruiter_slots = [(datetime(2025, 3, 3, hour), datetime(2025, 3, 3, hour + 1)) for hour in (9, 10, 11, 14)]
+    candidate_windows = [(datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 12, 0)),
+                         (datetime(2025, 3, 3, 14, 30), datetime(2025, 3, 3, 16, 0))]
+    
+    slots = scheduling_service.match_slots(recruiter_slots, candidate_windows, WINDOW_START, WINDOW_END)
+    
+    assert slots == [(datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 10, 30)),
+                     (datetime(2025, 3, 3, 10, 30), datetime(2025, 3, 3, 11, 30))]
+
+def test_confirmation_makes_one_calendar_call(app, calendar_api, sent_messages, awaiting_confirmation):
+    """Confirming replies before any calendar call; the job creates the event with a single insert"""
+    handler = awaiting_confirmation('+15550001111')
+    
+    response = handler.handle_message('whatsapp:+15550001111', 'yes')
+    
+    assert calendar_api.calls == []
+    interview = Interview.query.one()
+    assert interview.calendar_status == 'pending'
+    assert 'scheduled' in response
+    
+    assert app.extensions['background_jobs'].run_pending() == 1
+    
+    db.session.refresh(interview)
+    assert calendar_api.calls == ['events.insert']
+    assert interview.calendar_status == 'synced'
+    assert interview.calendar_attempts == 1
+    assert interview.calendar_url.startswith('https://calendar.google.com/')
+    assert interview.meet_link.startswith('https://meet.google.com/')
+    assert app.extensions['outbound_sender'].run_pending() == 1
+    assert len(sent_messages) == 1 and sent_messages[0][0] == '+15550001111'
+    assert interview.meet_link in sent_messages[0][1]
+    event = calendar_api._get_event('recruiter-cal', interview.calendar_event_id)
+    assert event['reminders']['overrides'][0] == {'method': 'email', 'minutes': 24 * 60}
+
+def test_calendar_event_job_retries_then_fails(app, awaiting_confirmation, monkeypatch):
+    """Failed event creation is retried with backoff and marked failed after the last attempt"""
+    def unavailable(self, *args, **kwargs):
+        raise RuntimeError("Calendar API unavailable")
+    monkeypatch.setattr(GoogleCalendarService, 'create_event', unavailable)
+    monkeypatch.setattr(random, 'uniform', lambda low, high: high)
+    clock = [0.0]
+    queue = BackgroundJobQueue(app, workers=0, max_attempts=3, base_delay=10, clock=lambda: clock[0])
+    monkeypatch.setitem(app.extensions, 'background_jobs', queue)
+    handler = awaiting_confirmation('+15550003333')
+    handler.handle_message('whatsapp:+15550003333', 'yes')
+    interview = Interview.query.one()
+    
+    assert queue.run_pending() == 1
+    assert queue.run_pending() == 0  # The retry is not due yet
+    clock[0] += 10
+    assert queue.run_pending() == 1
+    clock[0] += 20
+    assert queue.run_pending() == 1
+    
+    db.session.refresh(interview)
+    assert queue.pending_count() == 0
+    assert (queue.retried, queue.failed) == (2, 1)
+    assert interview.calendar_status == 'failed'
+    assert interview.calendar_attempts == 3
+    assert interview.calendar_error == "Calendar API unavailable"
+
+def test_schedule_interview_round_trips(app, fake_calendar, sent_messages, next_week):
+    """schedule_interview no longer re-reads the event it just created"""
+    recruiter = Recruiter(name="Recruiter", email="recruiter@example.com", calendar_id="recruiter-cal")
+    candidate = Candidate(name="Jane Doe", phone_number="+15550002222", email="jane@example.com",
+                          position_applied="Engineer")
+    db.session.add_all([recruiter, candidate])
+    db.session.commit()
+    scheduling_service = SchedulingService()
+    scheduling_service.calendar_service = GoogleCalendarService(service=fake_calendar)
+    
+    interview = scheduling_service.schedule_interview(candidate.id, recruiter.id, next_week(0, 14), next_week(0, 15))
+    
+    assert fake_calendar.calls == ['events.insert']
+    # The confirmation goes through the rate-limited outbound sender
+    assert sent_messages == []
+    assert app.extensions['outbound_sender'].run_pending() == 1
+    assert len(sent_messages) == 1
+    assert interview.meet_link in sent_messages[0][1]
+
+def test_calendar_event_is_created_once_per_interview(app, calendar_api, sent_messages, awaiting_confirmation):
+    """A second runner finds the interview claimed, and a retry after a lost result reuses the created event"""
+    handler = awaiting_confirmation('+15550001111')
+    handler.handle_message('whatsapp:+15550001111', 'yes')
+    interview = Interview.query.one()
+    scheduling_service = SchedulingService()
+    
+    # Another process claimed the interview after this one loaded it
+    Interview.query.filter_by(id=interview.id).update({'calendar_status': 'creating'})
+    assert scheduling_service.create_interview_calendar_event(interview.id) is None
+    assert calendar_api.calls == []
+    
+    # That process inserted the event but died before recording it
+    Interview.query.filter_by(id=interview.id).update({'calendar_status': 'pending'})
+    db.session.commit()
+    calendar_api._insert_event('recruiter-cal', {'id': calendar_event_id(interview), 'summary': 'Interview'})
+    assert scheduling_service.create_interview_calendar_event(interview.id) is not None
+    
+    db.session.refresh(interview)
+    assert calendar_api.calls == ['events.insert', 'events.get']
+    assert list(calendar_api.events_by_calendar['recruiter-cal']) == [interview.calendar_event_id]
+    assert interview.calendar_status == 'synced'
+
+def test_pending_calendar_events_are_retried_by_one_runner(app, calendar_api, sent_messages, awaiting_confirmation):
+    """The retry script creates pending events and releases claims of runners that died"""
+    handler = awaiting_confirmation('+15550001111')
+    handler.handle_message('whatsapp:+15550001111', 'yes')
+    interview = Interview.query.one()
+    stuck = Interview(start_time=interview.start_time, end_time=interview.end_time, status='scheduled',
+                      candidate_id=interview.candidate_id, recruiter_id=interview.recruiter_id,
+                      calendar_status='creating', updated_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(stuck)
+    db.session.commit()
+    
+    assert retry_pending_calendar_events(stale_minutes=10) == (2, 0)
+    assert retry_pending_calendar_events(stale_minutes=10) == (0, 0)
+    assert calendar_api.call_count('events.insert') == 2
+    assert {interview.calendar_status for interview in Interview.query.all()} == {'synced'}
+    # The script sends the notifications before it exits
+    app.extensions['outbound_sender'].drain()
+    assert [to for to, _ in sent_messages] == ['+15550001111', '+15550001111']